@@ -1,71 +1,128 @@
+import argparse
+import contextlib
+import hashlib
+import html
 import json
 import os.path
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 
+try:
+    from lifecycle_anslysis.instrumentation import count, span
+except ImportError:
+    # the repository root is not on the path, run without instrumentation
+    def span(name, category=None, **args):
+        return contextlib.nullcontext()
+
+    def count(name, value=1):
+        pass
+
 DL325_g_10 = 'dl325g10'
 DL325_g_11 = 'dl325g11'
 
+LABEL_COLUMN = 'Unnamed: 0'
+VALUE_COLUMN = 'Unnamed: 1'
+
+# output field: (label in the advisor export with normalized whitespace, unit suffix to strip)
+FIELDS = {
+    'line_voltage': ('Line Voltage', 'VAC'),
+    'total_max_load_input_power': ('Total Max Load Input Power', 'W'),
+    'total_idle_input_power': ('Total Idle Input Power', 'W'),
+    'power_hardware_and_cooling': ('Total Utilization Input Power', 'W'),
+    'total_utilization_carbon_emissions': ('Total Utilization Carbon Emissions', 'kg CO2e'),
+    'total_wattage_estimate_hardware_and_cooling': ('Total Wattage Estimate (Hardware + Cooling)', None),
+    'cooling_watts': ('Number of cooling watts required for each watt generated', None),
+    'utilization': ('Utilization (%)', '%'),
+    'server_lifecycle': ('Server Lifecycle', None),
+    'power_hardware': ('Utilization Input Power total', None),
+}
+
+# some exports are HTML tables saved with an .xls extension, rows with two cells hold a label and its value
+HTML_ROW_PATTERN = re.compile(r"<tr[^>]*>", re.IGNORECASE)
+HTML_CELL_PATTERN = re.compile(r"<td[^>]*>", re.IGNORECASE)
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+FILE_COLUMNS = ['server_type', 'file', 'sha256']
+
+# size, mtime and content hash of every parsed export. They depend on the checkout, so they are kept out of the
+# table, which is committed, in the ignored cache directory of the repository.
+DEFAULT_FINGERPRINT_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache',
+                                         'extract_numbers', 'fingerprints.json')
+
+
+def read_html_export(file_path):
+    with open(file_path, encoding='utf-8', errors='replace') as file:
+        content = file.read()
+
+    rows = []
+    for row in HTML_ROW_PATTERN.split(content)[1:]:
+        cells = [html.unescape(HTML_TAG_PATTERN.sub(" ", cell)).strip() for cell in HTML_CELL_PATTERN.split(row)[1:]]
+        if len(cells) == 2:
+            rows.append(cells)
+
+    return pd.DataFrame(rows, columns=[LABEL_COLUMN, VALUE_COLUMN])
+
 
 def read_xls_file(file_path):
-    try:
-        df = pd.read_excel(file_path, engine='xlrd')
+    with open(file_path, 'rb') as file:
+        is_html = file.read(1) == b'<'
 
-        print("DataFrame loaded successfully. Here are the first few rows:")
+    if is_html:
+        return read_html_export(file_path)
+    return pd.read_excel(file_path, engine='xlrd')
 
-        # Return the DataFrame for further processing if needed
-        return df
-    except FileNotFoundError:
-        print(f"Error: The file at {file_path} was not found.")
-    except ValueError:
-        print("Error: The file is not a valid .xls file or could not be read.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
 
+def _normalize_label(label):
+    # labels contain trailing and non-breaking spaces, str.split handles both
+    return " ".join(label.split())
 
-def get_field(df, field_name):
-    print(field_name)
-    return df.loc[df['Unnamed: 0'] == field_name, 'Unnamed: 1'].values[0]
 
+def build_field_index(df):
+    labeled = df[[LABEL_COLUMN, VALUE_COLUMN]].dropna(subset=[LABEL_COLUMN])
+    labels = labeled[LABEL_COLUMN].astype(str).map(_normalize_label)
 
-def extract_values(df):
-    line_voltage = get_field(df, 'Line Voltage')
-    total_max_load_input_power = get_field(df, 'Total Max Load Input Power')
-    total_idle_input_power = get_field(df, 'Total Idle Input Power')
-    power_hardware_and_cooling = get_field(df, 'Total Utilization Input Power')
-    utilization_input_power_total = get_field(df, 'Utilization Input Power total ')
-    total_utilization_carbon_emissions = get_field(df, 'Total Utilization Carbon Emissions')
-    total_wattage_estimate = get_field(df, 'Total Wattage Estimate (Hardware + Cooling)')
-    cooling_watts = get_field(df, 'Number of cooling watts required for each watt generated  ')
-    utilization = get_field(df, 'Utilization (%)')
-    server_lifecycle = get_field(df, 'Server Lifecycle')
-
-    result = {
-        'line_voltage': float(line_voltage.replace("VAC", "")),
-        'total_max_load_input_power': float(total_max_load_input_power.replace("W", "")),
-        'total_idle_input_power': float(total_idle_input_power.replace("W", "")),
-        'power_hardware_and_cooling': float(power_hardware_and_cooling.replace("W", "")),
-        'total_utilization_carbon_emissions': float(total_utilization_carbon_emissions.replace("kg CO2e", "")),
-        'total_wattage_estimate_hardware_and_cooling': float(total_wattage_estimate),
-        'cooling_watts': float(cooling_watts),
-        'utilization': float(utilization),
-        'server_lifecycle': float(server_lifecycle),
-        'power_hardware': float(utilization_input_power_total)
-    }
+    # the first occurrence of a label wins, e.g. 'Line Voltage' appears in the data center and the server summary
+    field_index = {}
+    for label, value in zip(labels, labeled[VALUE_COLUMN]):
+        field_index.setdefault(label, value)
+    return field_index
 
-    return result
 
+def extract_values(df):
+    field_index = build_field_index(df)
 
-def parse_list_of_files(root_path, list_of_files):
     result = {}
-    for file in list_of_files:
-        file_path = os.path.join(root_path, file)
-        df = read_xls_file(file_path)
-        result[file] = extract_values(df)
+    for field, (label, unit) in FIELDS.items():
+        if label not in field_index:
+            raise ValueError(f"Field '{label}' is missing")
+        value = field_index[label]
+        if isinstance(value, str):
+            # the HTML exports report the utilization in percent, the Excel exports as a fraction
+            value = float(value.replace(unit, "")) / 100 if unit == '%' else float(value.replace(unit or "", ""))
+        result[field] = float(value)
 
     return result
 
 
+def file_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_sha256(file_path):
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def parse_file(file_path):
+    with span("extract_numbers.parse_file", path=file_path):
+        values = extract_values(read_xls_file(file_path))
+    count("extract_numbers.files_parsed")
+    return values
+
+
 def list_files(directory):
     # Get a list of all files and directories in the specified directory
     all_files = os.listdir(directory)
@@ -76,25 +133,81 @@ def list_files(directory):
     return files
 
 
-if __name__ == '__main__':
-    input_data_path = './raw_data_no_image/'
-    parsed_data_dir = './parsed_data'
-    types = [DL325_g_10, DL325_g_11]
-
-    additional_fields = {
-        DL325_g_10: {"example1": "42"},
-        DL325_g_11: {"example1": "42"},
-    }
-
+def ingest(input_data_path, types, output_path, max_workers=None, fingerprint_cache=DEFAULT_FINGERPRINT_CACHE):
+    """
+    Parses the advisor exports of the server types into one table at output_path, the rows of other server types
+    already in the table are kept. Files whose content hash matches the previous run are taken over from the existing
+    table instead of being parsed. The hash is only computed for files whose size or mtime changed since the last run
+    on this checkout, see fingerprint_cache.
+
+    :return: dict of file path -> exception for the files that could not be parsed, they are left out of the table
+             and retried on the next run
+    """
+    previous = {}
+    if os.path.exists(output_path):
+        previous_df = pd.read_csv(output_path)
+        previous = {(row['server_type'], row['file']): row for row in previous_df.to_dict('records')}
+
+    fingerprints = {}
+    if os.path.exists(fingerprint_cache):
+        with open(fingerprint_cache) as file:
+            fingerprints = json.load(file)
+
+    # only the server types passed are rebuilt
+    rows = [row for (server_type, _), row in previous.items() if server_type not in types]
+    to_parse = []
     for _type in types:
         root_path = os.path.join(input_data_path, _type)
-        list_of_files = list_files(root_path)
-        parsed_data = parse_list_of_files(root_path, list_of_files)
+        for file in sorted(list_files(root_path)):
+            file_path = os.path.join(root_path, file)
+            fingerprint = file_fingerprint(file_path)
+            known = fingerprints.get(os.path.abspath(file_path), {})
+            if (known.get('size'), known.get('mtime_ns')) == (fingerprint['size'], fingerprint['mtime_ns']):
+                fingerprint['sha256'] = known['sha256']
+            else:
+                fingerprint['sha256'] = file_sha256(file_path)
+            fingerprints[os.path.abspath(file_path)] = fingerprint
+
+            metadata = {'server_type': _type, 'file': file, 'sha256': fingerprint['sha256']}
+            cached = previous.get((_type, file))
+            if cached is not None and cached['sha256'] == metadata['sha256']:
+                rows.append(cached)
+                count("extract_numbers.cache_hits")
+            else:
+                to_parse.append((file_path, metadata))
+
+    errors = {}
+    if to_parse:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(file_path, metadata, executor.submit(parse_file, file_path))
+                       for file_path, metadata in to_parse]
+            for file_path, metadata, future in futures:
+                try:
+                    rows.append({**metadata, **future.result()})
+                except Exception as e:
+                    errors[file_path] = e
+
+    result = pd.DataFrame(rows, columns=FILE_COLUMNS + list(FIELDS))
+    result = result.astype({field: 'float64' for field in FIELDS})
+    result = result.sort_values(['server_type', 'file'], ignore_index=True)
+    with span("csv.write", path=output_path):
+        result.to_csv(output_path, index=False)
+
+    os.makedirs(os.path.dirname(fingerprint_cache), exist_ok=True)
+    with open(fingerprint_cache, 'w') as file:
+        json.dump(fingerprints, file)
+
+    return errors
 
-        for k, v in additional_fields[_type].items():
-            parsed_data[k] = v
 
-        print(parsed_data)
-        output_file_path = os.path.join(parsed_data_dir, f'{_type}.json')
-        with open(output_file_path, 'w') as file:
-            json.dump(parsed_data, file)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parse HPE Power Advisor exports into one table.")
+    parser.add_argument('--input', default='./raw_data_no_image/', help="directory with one folder per server type")
+    parser.add_argument('--output', default='./parsed_data/advisor_exports.csv')
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument('types', nargs='*', default=[DL325_g_10, DL325_g_11])
+    args = parser.parse_args()
+
+    errors = ingest(args.input, args.types, args.output, max_workers=args.workers)
+    for file_path, error in errors.items():
+        print(f"Error: could not parse {file_path}: {error}")
@@ -1,10 +1,13 @@
-import { createContext, useState, useContext, ReactNode } from 'react';
+import { createContext, useState, useContext, useEffect, ReactNode } from 'react';
 import { WorkloadType, WORKLOAD_TYPES, WORKLOAD_MAPPING } from '../partials/BenchmarkSettings';
 import { Country } from '../assets/grid_intensities';
 import { CPU_LIST, HDD_CAPACITIES } from '../partials/Compare';
 import { CapexType, OpexType, System } from './lifecycle_analysis/system';
 import { generateSystemsComparison, ComparisonType } from './lifecycle_analysis/comparison';
 import { GUPTA_MODEL } from './lifecycle_analysis/constants';
+import {
+  LookupTables, loadLookupTables, coversStorage, lookupSystemsComparison, lookupBreakEven,
+} from './lifecycle_analysis/lookup';
 import CPU_DATA from '../assets/data';
 import { lineIntersect } from '../charts/lineChart';
 import { RAM_CAPACITIES, SSD_CAPACITIES } from '../partials/Compare';
@@ -109,7 +112,27 @@ export const BenchmarkProvider: React.FC<BenchmarkProviderProps> = ({ children }
     CPU_DATA[newCPU].TDP// cpuTdp in Watts
   );
 
-  const comparison :ComparisonType = generateSystemsComparison(
+  // Precomputed tables, used instead of recomputing the comparison while both systems have the default storage
+  const [lookupTables, setLookupTables] = useState<LookupTables | null>(null);
+  useEffect(() => {
+    loadLookupTables().then(setLookupTables).catch(() => setLookupTables(null));
+  }, []);
+
+  const tables = lookupTables !== null
+    && coversStorage(lookupTables, currentRAM, currentSSD, currentHDD)
+    && (singleComparison || coversStorage(lookupTables, newRAM, newSSD, newHDD)) ? lookupTables : null;
+  const useLookup = tables !== null;
+
+  const comparison :ComparisonType = (tables && lookupSystemsComparison(
+    tables,
+    singleComparison ? currentCPU : newCPU,
+    currentCPU,
+    singleComparison ? oldPerformanceIndicator : newPerformanceIndicator,
+    oldPerformanceIndicator,
+    timeHorizon,
+    country,
+    utilization
+  )) || generateSystemsComparison(
     (singleComparison ? oldSystem : newSystem), // new system object
     oldSystem, // old system object
     timeHorizon, // time horizon
@@ -118,12 +141,32 @@ export const BenchmarkProvider: React.FC<BenchmarkProviderProps> = ({ children }
     GUPTA_MODEL // OPEX calculation model
   );
 
-  const calculateIntersect = (singleComparison: boolean, oldSystemOpex: number[], newSystemOpex: number[]): { x:number, y:number } | false => {
+  // Break-even of two CPUs from the tables, fetched per pair and kept with the selection it belongs to
+  const breakEvenKey = `${currentCPU}/${newCPU}/${workload}/${country}/${utilization}`;
+  const [lookedUpBreakEven, setLookedUpBreakEven] = useState<{ key: string, years: number | null } | null>(null);
+  useEffect(() => {
+    if (!useLookup || singleComparison) return;
+    let cancelled = false;
+    lookupBreakEven(currentCPU, newCPU, workload, country, utilization)
+      .then((years) => { if (!cancelled) setLookedUpBreakEven({ key: breakEvenKey, years }); })
+      .catch(() => { if (!cancelled) setLookedUpBreakEven({ key: breakEvenKey, years: null }); });
+    return () => { cancelled = true; };
+  }, [useLookup, singleComparison, currentCPU, newCPU, workload, country, utilization, breakEvenKey]);
+
+  const calculateIntersect = (
+    singleComparison: boolean, oldSystemOpex: number[], newSystemOpex: number[]
+  ): { x:number, y:number } | false => {
     const embodiedLine = newSystemOpex[0];
     const l = oldSystemOpex.length;
 
     let intersect: { x:number, y:number } | false  = false;
-    if (singleComparison) {
+    const breakEvenYears = useLookup && lookedUpBreakEven?.key === breakEvenKey ? lookedUpBreakEven.years : null;
+    if (!singleComparison && breakEvenYears !== null) {
+      // the same intersect, looked up instead of computed
+      intersect = Number.isFinite(breakEvenYears) && breakEvenYears <= l - 1
+        ? { x: breakEvenYears, y: oldSystemOpex[1] * breakEvenYears }
+        : false;
+    } else if (singleComparison) {
       // calculate the intersect between oldSystemOpex line and embodied line
       intersect = lineIntersect(
         0, oldSystemOpex[0],
@@ -0,0 +1,175 @@
+import { GRID_INTENSITY, Country } from "../../assets/grid_intensities";
+import { WorkloadType } from "../../partials/BenchmarkSettings";
+import { ComparisonType } from "./comparison";
+import { CapexType, OpexType } from "./system";
+
+// Precomputed by lifecycle_anslysis/lookup_tables.py, see build_lookup_tables there for the layout
+const LOOKUP_URL = `${import.meta.env.BASE_URL}lookup`;
+const LOOKUP_TABLES_VERSION = 1;
+
+export interface LookupIndex {
+  version: number;
+  cpus: string[];
+  workloads: WorkloadType[];
+  utilizations: number[];
+  storage: { ram: number; ssd: number; hdd: number };
+  hours_per_year: number;
+  power_components: string[];
+  capex_components: string[];
+  capex: number[][];
+  pair_bytes: number;
+}
+
+export interface LookupTables {
+  index: LookupIndex;
+  cpuIndex: Map<string, number>;
+  power: Float32Array;
+}
+
+let tablesPromise: Promise<LookupTables> | null = null;
+const pairCache = new Map<string, Promise<Float32Array>>();
+
+export function loadLookupTables(): Promise<LookupTables> {
+  if (tablesPromise === null) {
+    tablesPromise = (async () => {
+      const [indexResponse, powerResponse] = await Promise.all([
+        fetch(`${LOOKUP_URL}/index.json`),
+        fetch(`${LOOKUP_URL}/power.bin`),
+      ]);
+      const index: LookupIndex = await indexResponse.json();
+      if (index.version !== LOOKUP_TABLES_VERSION) {
+        throw new Error(`Unsupported lookup tables version ${index.version}`);
+      }
+      return {
+        index,
+        cpuIndex: new Map(index.cpus.map((cpu, i) => [cpu, i])),
+        power: new Float32Array(await powerResponse.arrayBuffer()),
+      };
+    })();
+  }
+  return tablesPromise;
+}
+
+// The tables only hold the default storage configuration, other configurations are computed directly
+export function coversStorage(tables: LookupTables, ram: number, ssd: number, hdd: number): boolean {
+  const storage = tables.index.storage;
+  return storage.ram === ram && storage.ssd === ssd && storage.hdd === hdd;
+}
+
+function utilizationIndex(tables: LookupTables, utilization: number): number {
+  const utilizations = tables.index.utilizations;
+  const step = utilizations.length > 1 ? utilizations[1] - utilizations[0] : 1;
+  const i = Math.round((utilization - utilizations[0]) / step);
+  return Math.min(Math.max(i, 0), utilizations.length - 1);
+}
+
+// Break-even block (workloads x utilizations) of one pair, fetched once with a range request
+function loadPair(tables: LookupTables, currentCPU: number, newCPU: number): Promise<Float32Array> {
+  const key = `${currentCPU}/${newCPU}`;
+  let pair = pairCache.get(key);
+  if (pair === undefined) {
+    const pairBytes = tables.index.pair_bytes;
+    const offset = newCPU * pairBytes;
+    pair = fetch(`${LOOKUP_URL}/break_even/${currentCPU}.bin`, {
+      headers: { Range: `bytes=${offset}-${offset + pairBytes - 1}` },
+    })
+      .then((response) => response.arrayBuffer().then((buffer) => ({ status: response.status, buffer })))
+      .then(({ status, buffer }) =>
+        // servers without range support answer 200 with the whole file
+        status === 206 ? new Float32Array(buffer) : new Float32Array(buffer, offset, pairBytes / 4)
+      );
+    pairCache.set(key, pair);
+  }
+  return pair;
+}
+
+// Break-even time in years, Infinity if the new CPU never breaks even, null if it is unknown
+export async function lookupBreakEven(
+  currentCPU: string,
+  newCPU: string,
+  workload: WorkloadType,
+  country: Country,
+  utilization: number
+): Promise<number | null> {
+  const tables = await loadLookupTables();
+  const currentIndex = tables.cpuIndex.get(currentCPU);
+  const newIndex = tables.cpuIndex.get(newCPU);
+  const gci = (GRID_INTENSITY[country] || 0) / 1000; // kg CO2 per kWh
+  if (currentIndex === undefined || newIndex === undefined || gci === 0) return null;
+
+  const pair = await loadPair(tables, currentIndex, newIndex);
+  const nUtilizations = tables.index.utilizations.length;
+  const workloadIndex = tables.index.workloads.indexOf(workload);
+  const breakEven = pair[workloadIndex * nUtilizations + utilizationIndex(tables, utilization)];
+  return Number.isNaN(breakEven) ? null : breakEven / gci;
+}
+
+// Power draw per component in kW, in the order of index.power_components
+export function lookupPower(tables: LookupTables, cpu: string, utilization: number): Float32Array | null {
+  const i = tables.cpuIndex.get(cpu);
+  if (i === undefined) return null;
+
+  const nComponents = tables.index.power_components.length;
+  const offset = (i * tables.index.utilizations.length + utilizationIndex(tables, utilization)) * nComponents;
+  return tables.power.subarray(offset, offset + nComponents);
+}
+
+// OPEX per year in kg CO2
+export function lookupOpexPerYear(
+  tables: LookupTables, cpu: string, country: Country, utilization: number
+): number | null {
+  const power = lookupPower(tables, cpu, utilization);
+  if (power === null) return null;
+
+  const gci = (GRID_INTENSITY[country] || 0) / 1000;
+  return power[power.length - 1] * tables.index.hours_per_year * gci;
+}
+
+function breakdown<T = Record<string, number>>(components: string[], values: ArrayLike<number>): T {
+  return Object.fromEntries(components.map((component, i) => [component, values[i]])) as T;
+}
+
+// generateSystemsComparison with the default storage from the tables, null if a CPU is not in the tables
+export function lookupSystemsComparison(
+  tables: LookupTables,
+  newCPU: string,
+  currentCPU: string,
+  newPerformanceIndicator: number,
+  oldPerformanceIndicator: number,
+  timeHorizon: number,
+  country: Country,
+  utilization: number
+): ComparisonType | null {
+  const newIndex = tables.cpuIndex.get(newCPU);
+  const newPower = lookupPower(tables, newCPU, utilization);
+  const oldPower = lookupPower(tables, currentCPU, utilization);
+  if (newIndex === undefined || newPower === null || oldPower === null) return null;
+
+  const gci = (GRID_INTENSITY[country] || 0) / 1000;
+  const newOpexPerYear = newPower[newPower.length - 1] * tables.index.hours_per_year * gci;
+  const oldOpexPerYear = oldPower[oldPower.length - 1] * tables.index.hours_per_year * gci;
+  const capexBreakdown = breakdown<CapexType>(tables.index.capex_components, tables.index.capex[newIndex]);
+  const opexBreakdown = {
+    ...breakdown(tables.index.power_components, newPower),
+    opexPerYear: newOpexPerYear,
+  } as OpexType;
+
+  const performanceFactor = oldPerformanceIndicator / newPerformanceIndicator;
+  const oldSystemOpex = Array.from({ length: timeHorizon }, (_, i) => i * oldOpexPerYear);
+  const newSystemOpex = Array.from(
+    { length: timeHorizon },
+    (_, i) => i * newOpexPerYear * performanceFactor + capexBreakdown.TOTAL
+  );
+
+  return {
+    newSystemOpex,
+    oldSystemOpex,
+    absSavings: newSystemOpex.map((newOpex, i) => newOpex - oldSystemOpex[i]),
+    relativeSavings: newSystemOpex.map((newOpex, i) => 1 - oldSystemOpex[i] / newOpex),
+    ratio: newSystemOpex.map((newOpex, i) => newOpex / oldSystemOpex[i]),
+    capexBreakdown,
+    opexBreakdown,
+    oldPowerConsumption: oldPower[oldPower.length - 1],
+    newPowerConsumption: newPower[newPower.length - 1],
+  };
+}
@@ -0,0 +1,611 @@
+import argparse
+import asyncio
+import csv
+import email.utils
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import ssl
+import time
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from lifecycle_anslysis.cpu_catalog import REPO_ROOT
+from lifecycle_anslysis.instrumentation import count, span
+
+DEFAULT_CSV_PATH = os.path.join(REPO_ROOT, "intel_cpus.csv")
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, ".cache", "ark")
+
+CSV_DELIMITER = ";"
+# leading columns of intel_cpus.csv, followed by one column per ARK attribute
+KEY_COLUMNS = ["id", "name", "number", "URL", "socket"]
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF_S = 0.5
+DEFAULT_TIMEOUT_S = 30
+MAX_REDIRECTS = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "tco2-ark-crawler/1.0 (+https://github.com/hpides/tco2)"
+
+PRODUCT_URL_PATTERN = re.compile(r"/content/www/us/en/ark/products/\d+/[^\"'#?]+\.html")
+
+# "Intel® Deep Learning Boost (Intel® DL Boost) on CPU" is stored as "Deep Learning Boost ( DL Boost) on CPU"
+_TRADEMARKS = re.compile(r"Intel\s*(?:®|\(R\))|®|™|\(R\)|\(TM\)")
+_FREQUENCY = re.compile(r"^(\d+(?:\.\d+)?)\s*(GHz|MHz)$")
+_SIZE = re.compile(r"^(\d+(?:\.\d+)?)\s*(KB|MB|GB|TB)(?:/s)?\b")
+_POWER = re.compile(r"^(\d+(?:\.\d+)?)\s*W$")
+_LITHOGRAPHY = re.compile(r"^(?:Intel\s+)?(\d+)(?:\s*nm)?$")
+_QUARTER = re.compile(r"^Q([1-4])'(\d{2})$")
+_SIZE_FACTORS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, url) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+##############################
+# HTTP
+##############################
+
+class ConnectionPool:
+    """
+    HTTP/1.1 client on asyncio streams. Connections are kept alive and reused per host, at most max_connections
+    requests are in flight at once.
+    """
+
+    def __init__(self, max_connections=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT_S) -> None:
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._idle = {}
+        self._timeout = timeout
+        self._ssl_context = ssl.create_default_context()
+
+    async def request(self, url, headers=None):
+        """
+        :return: status, lower-case headers and the decoded body
+        """
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        request_headers = {"Host": parts.netloc, "User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate",
+                           "Connection": "keep-alive", **(headers or {})}
+        message = f"GET {path or '/'} HTTP/1.1\r\n" + "".join(f"{name}: {value}\r\n"
+                                                            for name, value in request_headers.items()) + "\r\n"
+
+        async with self._semaphore:
+            idle = self._idle.setdefault(key, [])
+            while True:
+                reused = bool(idle)
+                reader, writer = idle.pop() if reused else await asyncio.wait_for(
+                    asyncio.open_connection(key[1], key[2], ssl=self._ssl_context if https else None), self._timeout)
+                count("ark_crawler.connections_reused" if reused else "ark_crawler.connections_opened")
+                try:
+                    writer.write(message.encode("latin-1"))
+                    await writer.drain()
+                    status, response_headers, body, keep_alive = await asyncio.wait_for(
+                        self._read_response(reader), self._timeout)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    writer.close()
+                    # the server closed an idle connection in the meantime, retry on the next one within this slot
+                    if not reused:
+                        raise
+
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+        return status, response_headers, body
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        version, status = status_line.decode("latin-1").split()[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if int(status) == 304 or int(status) < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        encoding = headers.get("content-encoding", "").lower()
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+        return int(status), headers, body, keep_alive
+
+    async def close(self):
+        writers = [writer for connections in self._idle.values() for _, writer in connections]
+        self._idle.clear()
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*[writer.wait_closed() for writer in writers], return_exceptions=True)
+
+
+class ResponseCache:
+    """
+    On-disk cache of product pages with their ETag and Last-Modified validators, one body and one metadata file per
+    URL.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, extension):
+        return os.path.join(self.directory, f"{hashlib.sha1(url.encode()).hexdigest()}.{extension}")
+
+    def get(self, url):
+        """
+        :return: metadata and body, None if the URL was never fetched
+        """
+        try:
+            with open(self._path(url, "json")) as file:
+                metadata = json.load(file)
+            with open(self._path(url, "html"), "rb") as file:
+                return metadata, file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, headers, body):
+        with open(self._path(url, "html"), "wb") as file:
+            file.write(body)
+        metadata = {"url": url, "etag": headers.get("etag"), "last_modified": headers.get("last-modified"),
+                    "sha256": hashlib.sha256(body).hexdigest(), "fetched_at": time.time()}
+        # the metadata is written last, an interrupted write is therefore refetched
+        with open(self._path(url, "json"), "w") as file:
+            json.dump(metadata, file)
+
+
+class ArkCrawler:
+    """
+    Fetches ARK pages concurrently. Cached pages are revalidated with If-None-Match / If-Modified-Since, so unchanged
+    pages cost a 304 without body. Connection errors, 429 and 5xx responses are retried with exponential backoff.
+
+    :param base_url: scheme and host to fetch from instead of the ones in the URLs, e.g. a local stand-in serving
+                     saved pages (see serve_saved_pages)
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF_S, base_url=None) -> None:
+        self.cache = ResponseCache(cache_dir)
+        self.pool = ConnectionPool(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = base_url
+        # responses fetched but not yet written to the cache, see commit
+        self._pending = {}
+
+    def _location(self, url):
+        if self.base_url is None:
+            return url
+        parts = urlsplit(url)
+        return urljoin(self.base_url, parts.path + (f"?{parts.query}" if parts.query else ""))
+
+    async def _get(self, url, headers):
+        location = self._location(url)
+        for attempt in range(self.retries + 1):
+            try:
+                for _ in range(MAX_REDIRECTS):
+                    status, response_headers, body = await self.pool.request(location, headers)
+                    if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                        location = urljoin(location, response_headers["location"])
+                        continue
+                    break
+                if status not in RETRY_STATUSES:
+                    return status, response_headers, body
+                retry_after = response_headers.get("retry-after", "")
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            count("ark_crawler.retries")
+            await asyncio.sleep(delay * (1 + random.random() / 2))
+        raise HttpError(status, url)
+
+    async def fetch(self, url):
+        """
+        New responses are only written to the cache on commit, so a page stays changed until its content was
+        processed.
+
+        :return: page body and whether it changed since the last commit
+        """
+        cached = self.cache.get(url)
+        headers = {}
+        if cached is not None:
+            metadata, _ = cached
+            if metadata["etag"]:
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata["last_modified"]:
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        status, response_headers, body = await self._get(url, headers)
+        if status == 304 and cached is not None:
+            count("ark_crawler.not_modified")
+            return cached[1], False
+        if status != 200:
+            raise HttpError(status, url)
+
+        count("ark_crawler.fetched")
+        changed = cached is None or cached[0]["sha256"] != hashlib.sha256(body).hexdigest()
+        self._pending[url] = (response_headers, body)
+        return body, changed
+
+    def commit(self, urls=None):
+        """
+        Writes the pending responses of urls, all if None, to the cache.
+        """
+        for url in list(self._pending) if urls is None else urls:
+            if url in self._pending:
+                self.cache.put(url, *self._pending.pop(url))
+
+    async def fetch_all(self, urls):
+        """
+        :return: dict of URL to (body, changed), pages that could not be fetched are reported as the exception
+        """
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*[self.fetch(url) for url in urls], return_exceptions=True)
+        return dict(zip(urls, results))
+
+    async def close(self):
+        await self.pool.close()
+
+
+##############################
+# Parsing
+##############################
+
+class _ArkPageParser(HTMLParser):
+    # collects the text of the page title and of the tech-label / tech-data cells of the specification table
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.cells = []
+        self.links = []
+        self._stack = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "a" and attributes.get("href"):
+            self.links.append(attributes["href"])
+        classes = (attributes.get("class") or "").split()
+        role = "label" if "tech-label" in classes else "data" if "tech-data" in classes else \
+            "title" if tag == "h1" else None
+        if role is not None:
+            self._stack.append([tag, role, [], 0])
+        elif self._stack and tag == self._stack[-1][0]:
+            self._stack[-1][3] += 1
+
+    def handle_endtag(self, tag):
+        if not self._stack or tag != self._stack[-1][0]:
+            return
+        if self._stack[-1][3] > 0:
+            self._stack[-1][3] -= 1
+            return
+        _, role, text, _ = self._stack.pop()
+        text = re.sub(r"\s+", " ", _TRADEMARKS.sub("", "".join(text))).strip()
+        if role == "title":
+            self.title = self.title or text
+        else:
+            self.cells.append((role, text))
+
+    def handle_data(self, data):
+        if self._stack:
+            self._stack[-1][2].append(data)
+
+
+def normalize_ark_value(label, value):
+    """
+    Converts ARK values to the representation in intel_cpus.csv: frequencies in Hz, cache and memory sizes in bytes,
+    memory bandwidth in bytes/s, power in W, launch quarters as the first day of the quarter, Yes / No as True / False.
+    """
+    if value in ("Yes", "No"):
+        return str(value == "Yes")
+    if label == "Launch Date":
+        quarter = _QUARTER.match(value)
+        if quarter:
+            return f"20{quarter.group(2)}-{3 * int(quarter.group(1)) - 2:02d}-01"
+        return value
+    if label == "Lithography":
+        lithography = _LITHOGRAPHY.match(value)
+        return lithography.group(1) if lithography else value
+
+    frequency = _FREQUENCY.match(value)
+    if frequency:
+        return str(round(float(frequency.group(1)) * (1e9 if frequency.group(2) == "GHz" else 1e6)))
+    power = _POWER.match(value)
+    if power:
+        return power.group(1)
+    if label == "Cache" or label.startswith(("Max Memory Size", "Max Memory Bandwidth")):
+        size = _SIZE.match(value)
+        if size:
+            return str(round(float(size.group(1)) * _SIZE_FACTORS[size.group(2)]))
+    return value
+
+
+def processor_id(processor_number):
+    # "E5-2609 v3" is stored as "E5-2609V3"
+    return re.sub(r"\s+v(\d+)$", r"V\1", processor_number.strip()).replace(" ", "")
+
+
+def parse_product_page(html, url):
+    """
+    :return: dict of the KEY_COLUMNS and a list of (attribute, value) pairs in page order, attributes can repeat
+    """
+    parser = _ArkPageParser()
+    parser.feed(html.decode("utf-8", errors="replace") if isinstance(html, bytes) else html)
+
+    attributes = []
+    label = None
+    for role, text in parser.cells:
+        if role == "label":
+            label = text
+        elif label is not None:
+            attributes.append((label, normalize_ark_value(label, text)))
+            label = None
+
+    values = dict(attributes)
+    if "Processor Number" not in values:
+        raise ValueError(f"{url} is not an ARK product page")
+    name = parser.title
+    record = {"id": processor_id(values["Processor Number"]), "name": name, "number": "number", "URL": url,
+              "socket": values.get("Sockets Supported", "")}
+    # the processor number is the id, the column itself stays empty as in the crawled data
+    attributes = [(label, value) for label, value in attributes if label not in ("Processor Number",
+                                                                                 "Sockets Supported")]
+    return record, attributes
+
+
+def discover_product_urls(html, base_url):
+    """
+    Product page URLs linked from an ARK series or product list page.
+    """
+    parser = _ArkPageParser()
+    parser.feed(html.decode("utf-8", errors="replace") if isinstance(html, bytes) else html)
+    return list(dict.fromkeys(urljoin(base_url, link) for link in parser.links if PRODUCT_URL_PATTERN.search(link)))
+
+
+##############################
+# CSV
+##############################
+
+def read_csv_rows(csv_path):
+    """
+    intel_cpus.csv repeats some attribute names, so it is read as plain rows instead of a DataFrame.
+
+    :return: header and rows
+    """
+    if not os.path.exists(csv_path):
+        return list(KEY_COLUMNS), []
+    with open(csv_path, newline="") as file:
+        rows = list(csv.reader(file, delimiter=CSV_DELIMITER))
+    return rows[0], rows[1:]
+
+
+def write_csv_rows(csv_path, header, rows):
+    temporary_path = f"{csv_path}.tmp"
+    with open(temporary_path, "w", newline="") as file:
+        csv.writer(file, delimiter=CSV_DELIMITER, lineterminator="\n").writerows([header] + rows)
+    os.replace(temporary_path, csv_path)
+
+
+def merge_records(header, rows, records):
+    """
+    Patches the rows of the parsed pages in place, matched by URL, and appends rows for new pages. Only attributes
+    listed on a page are overwritten, so a page layout the parser misses never clears a row. Attributes not yet in the
+    header are added as columns. The n-th occurrence of an attribute on a page goes to the n-th column of that
+    name.
+
+    :param records: parse_product_page results
+    :return: header, rows and the number of patched and added rows
+    """
+    header = list(header)
+    url_column = header.index("URL")
+    row_by_url = {row[url_column]: position for position, row in enumerate(rows)}
+    patched = added = 0
+
+    for record, attributes in records:
+        columns_by_name = {}
+        for position, name in enumerate(header):
+            columns_by_name.setdefault(name, []).append(position)
+
+        values = {}
+        for name, value in record.items():
+            values[columns_by_name[name][0]] = value
+        occurrences = {}
+        for name, value in attributes:
+            occurrence = occurrences.get(name, 0)
+            occurrences[name] = occurrence + 1
+            positions = columns_by_name.setdefault(name, [])
+            if occurrence >= len(positions):
+                header.append(name)
+                positions.append(len(header) - 1)
+            values[positions[occurrence]] = value
+
+        position = row_by_url.get(record["URL"])
+        if position is None:
+            row_by_url[record["URL"]] = len(rows)
+            rows.append([""] * len(header))
+            position = len(rows) - 1
+            added += 1
+        else:
+            patched += 1
+        row = rows[position] + [""] * (len(header) - len(rows[position]))
+        for column, value in values.items():
+            row[column] = value
+        rows[position] = row
+
+    rows = [row + [""] * (len(header) - len(row)) for row in rows]
+    return header, rows, patched, added
+
+
+async def refresh(csv_path=DEFAULT_CSV_PATH, urls=(), series_urls=(), cache_dir=DEFAULT_CACHE_DIR,
+                  concurrency=DEFAULT_CONCURRENCY, base_url=None):
+    """
+    Refetches the product pages in csv_path, the pages linked from series_urls and urls, and patches or appends the
+    rows of the pages that changed. The CSV is only rewritten if a row changed.
+
+    :return: dict with the number of pages fetched, changed and failed, and of rows patched and added
+    """
+    header, rows = read_csv_rows(csv_path)
+    url_column = header.index("URL")
+    known_urls = [row[url_column] for row in rows]
+
+    crawler = ArkCrawler(cache_dir, concurrency, base_url=base_url)
+    try:
+        with span("ark_crawler.discover"):
+            series_pages = await crawler.fetch_all(series_urls)
+        new_urls = list(urls)
+        for series_url, result in series_pages.items():
+            if isinstance(result, Exception):
+                raise result
+            new_urls.extend(discover_product_urls(result[0], series_url))
+        crawler.commit(series_pages)
+
+        with span("ark_crawler.fetch"):
+            pages = await crawler.fetch_all(known_urls + new_urls)
+    finally:
+        await crawler.close()
+
+    known = set(known_urls)
+    failed = {url: result for url, result in pages.items() if isinstance(result, Exception)}
+    records = []
+    for url, result in pages.items():
+        if url in failed:
+            continue
+        body, changed = result
+        if changed or url not in known:
+            try:
+                records.append(parse_product_page(body, url))
+            except ValueError as error:
+                count("ark_crawler.parse_errors")
+                failed[url] = error
+
+    header, rows, patched, added = merge_records(header, rows, records)
+    if records:
+        write_csv_rows(csv_path, header, rows)
+    # only now the pages count as processed, pages that failed to parse are refetched as changed next time
+    crawler.commit([url for url in pages if url not in failed])
+    return {"pages": len(pages), "changed": len(records), "failed": len(failed), "patched": patched,
+            "added": added, "errors": {url: str(error) for url, error in failed.items()}}
+
+
+##############################
+# Local stand-in
+##############################
+
+_REASONS = {200: "OK", 304: "Not Modified", 404: "Not Found"}
+
+
+async def serve_saved_pages(directory, host="127.0.0.1", port=8000):
+    """
+    Serves the files in directory under their relative path, with ETag and Last-Modified and 304 responses to
+    conditional requests, so the crawler can run against saved pages (see ArkCrawler base_url).
+    """
+    root = os.path.abspath(directory)
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                path = os.path.abspath(os.path.join(root, urlsplit(request_line.split()[1].decode()).path.lstrip("/")))
+                if not path.startswith(root + os.sep) or not os.path.isfile(path):
+                    status, body, response_headers = 404, b"", {}
+                else:
+                    with open(path, "rb") as file:
+                        body = file.read()
+                    response_headers = {"ETag": f'"{hashlib.sha1(body).hexdigest()}"',
+                                        "Last-Modified": email.utils.formatdate(os.stat(path).st_mtime, usegmt=True),
+                                        "Content-Type": "text/html; charset=utf-8"}
+                    status = 304 if headers.get("if-none-match") == response_headers["ETag"] else 200
+                    if status == 304:
+                        body = b""
+
+                writer.write((f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                              + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+                              + f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def _serve_forever(directory, host, port):
+    server = await serve_saved_pages(directory, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refresh intel_cpus.csv from Intel ARK.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = subparsers.add_parser("refresh", help="refetch changed product pages and patch the CSV")
+    refresh_parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    refresh_parser.add_argument("--url", nargs="*", default=[], help="additional product pages")
+    refresh_parser.add_argument("--series", nargs="*", default=[], help="series pages listing product pages")
+    refresh_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    refresh_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    refresh_parser.add_argument("--base-url", default=None, help="fetch from this host instead, e.g. a stand-in")
+
+    serve_parser = subparsers.add_parser("serve", help="serve saved pages as a local stand-in for ARK")
+    serve_parser.add_argument("directory")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+
+    args = parser.parse_args()
+    if args.command == "refresh":
+        summary = asyncio.run(refresh(args.csv, args.url, args.series, args.cache_dir, args.concurrency,
+                                      args.base_url))
+        print(json.dumps(summary, indent=1))
+    else:
+        asyncio.run(_serve_forever(args.directory, args.host, args.port))
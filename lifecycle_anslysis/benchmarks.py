@@ -0,0 +1,379 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import generate_systems_comparison, generate_batch_systems_comparison, \
+    compute_systems_break_even
+from lifecycle_anslysis.constants import NEW_SYSTEM, GERMANY, GUPTA_MODEL
+from lifecycle_anslysis.cpu_catalog import REPO_ROOT, build_catalog_frame
+from lifecycle_anslysis.extend_intel_cpu_info import add_package_size_cm2
+from lifecycle_anslysis.system import SystemBatch
+
+# co2-footprint is not a package, its scripts are imported from their directory
+sys.path.insert(0, os.path.join(REPO_ROOT, "co2-footprint"))
+import extract_numbers  # noqa: E402
+
+DEFAULT_HISTORY_PATH = os.path.join(REPO_ROOT, ".benchmarks", "history.jsonl")
+
+SIZES = {"1": 1, "1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+# a tracked benchmark fails the run if its best time exceeds the median of the last BASELINE_WINDOW runs on the same
+# machine by more than the threshold
+DEFAULT_THRESHOLD = 0.25
+BASELINE_WINDOW = 5
+# and by more than this many seconds, the smallest sizes take microseconds and vary by more than the threshold
+DEFAULT_MIN_DELTA_S = 1e-3
+
+TIME_HORIZON = 20
+UTILIZATION = 60
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes, tracked=True):
+    """
+    Registers a benchmark. The decorated function is called as setup(size, work_dir) outside the measurement and
+    returns the function that is measured.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = {"setup": setup, "sizes": sizes, "tracked": tracked}
+        return setup
+
+    return register
+
+
+##############################
+# Synthetic data
+##############################
+
+def synthetic_fleet(n, seed=0):
+    """
+    SystemBatch of n servers with die sizes, TDPs and memory in the range of the CPUs in the catalog.
+    """
+    rng = np.random.default_rng(seed)
+    return SystemBatch(
+        die_size=rng.uniform(1.5, 20, n),
+        performance_indicator=rng.uniform(1, 15, n),
+        lifetime=rng.integers(4, 21, n),
+        dram_capacity=rng.choice([128, 256, 512, 1024], n),
+        ssd_capacity=rng.choice([0, 512, 1024, 3200], n),
+        hdd_capacity=rng.choice([0, 1024, 4096], n),
+        cpu_tdp=rng.uniform(65, 400, n),
+    )
+
+
+def synthetic_catalog_sources(n, directory, seed=0):
+    """
+    Writes ARK-style sources of n CPUs to directory, in the layout of the files in DEFAULT_SOURCES.
+
+    :return: sources for build_catalog_frame and the path of the filtered CSV read by add_package_size_cm2
+    """
+    rng = np.random.default_rng(seed)
+    ids = [f"X{i:07d}" for i in range(n)]
+    cores = rng.choice([8, 16, 24, 32, 48, 64], n)
+
+    ark = pd.DataFrame({
+        "id": ids,
+        "name": [f"Xeon {cpu_id} Processor" for cpu_id in ids],
+        "socket": rng.choice(["FCLGA3647", "FCLGA4189", "FCLGA4677"], n),
+        "Launch Date": [f"{year}-01-01" for year in rng.integers(2010, 2025, n)],
+        "Total Cores": cores,
+        "Total Threads": cores * 2,
+        "TDP": rng.uniform(65, 400, n).round(),
+    })
+    width = rng.choice([45.0, 52.5, 76.0, 77.5], n)
+    filtered = ark.assign(**{
+        "Package Size": [f"['{w}mm', '{h}mm']" for w, h in zip(width, rng.choice([45.0, 56.5], n))],
+        "sort_tuples_per_s": rng.uniform(5_000, 15_000, n),
+    })
+    spec_medians = pd.DataFrame({"Processor": ark["name"], "median_spec_int_perf": rng.uniform(5, 15, n)})
+
+    sources = {
+        "ark": os.path.join(directory, "ark.csv"),
+        "ark_extended": os.path.join(directory, "ark_filtered-extended.csv"),
+        "spec_medians": os.path.join(directory, "spec_medians.csv"),
+        "frontend": os.path.join(directory, "missing-data.ts"),
+    }
+    ark.to_csv(sources["ark"], sep=";", index=False)
+    filtered_path = os.path.join(directory, "ark_filtered.csv")
+    filtered.to_csv(filtered_path, index=False)
+    spec_medians.to_csv(sources["spec_medians"], index=False)
+
+    return sources, filtered_path
+
+
+def synthetic_advisor_exports(n, directory, seed=0):
+    """
+    Writes n HPE Power Advisor exports in the HTML format read by extract_numbers.read_html_export.
+
+    :return: input directory and server type folder, as expected by extract_numbers.ingest
+    """
+    rng = np.random.default_rng(seed)
+    server_type = "synthetic"
+    os.makedirs(os.path.join(directory, server_type), exist_ok=True)
+
+    for i in range(n):
+        rows = []
+        for label, unit in extract_numbers.FIELDS.values():
+            value = rng.uniform(1, 100) if unit == "%" else rng.uniform(100, 5000)
+            rows.append(f"<tr><td>{label}</td><td>{value:.2f}{unit or ''}</td></tr>")
+        with open(os.path.join(directory, server_type, f"export-{i}.xls"), "w") as file:
+            file.write(f"<html><body><table>{''.join(rows)}</table></body></html>")
+
+    return directory, server_type
+
+
+##############################
+# Benchmarks
+##############################
+
+def _systems(fleet):
+    return [fleet[i] for i in range(len(fleet))]
+
+
+# System memoizes its CAPEX and OPEX, so the System benchmarks build fresh instances in every run to measure the
+# computation instead of the cache lookup. Building them is included in the measured time.
+
+@benchmark("system.calculate_capex_emissions", ["1", "1k", "100k"])
+def _capex(size, work_dir):
+    fleet = synthetic_fleet(size)
+    return lambda: [system.calculate_capex_emissions() for system in _systems(fleet)]
+
+
+@benchmark("system.calculate_opex_emissions", ["1", "1k", "100k"])
+def _opex(size, work_dir):
+    fleet = synthetic_fleet(size)
+    return lambda: [system.calculate_opex_emissions(UTILIZATION, GERMANY) for system in _systems(fleet)]
+
+
+@benchmark("system.generate_accumm_projected_opex_emissions", ["1", "1k", "100k"])
+def _accumm_projected_opex(size, work_dir):
+    fleet = synthetic_fleet(size)
+    return lambda: [system.generate_accumm_projected_opex_emissions(TIME_HORIZON, NEW_SYSTEM, GERMANY, UTILIZATION,
+                                                                    GUPTA_MODEL) for system in _systems(fleet)]
+
+
+@benchmark("comparison.generate_systems_comparison", ["1", "1k", "100k"])
+def _systems_comparison(size, work_dir):
+    new_fleet, old_fleet = synthetic_fleet(size), synthetic_fleet(size, seed=1)
+    return lambda: [generate_systems_comparison(new_system, old_system, TIME_HORIZON, GERMANY, UTILIZATION, GUPTA_MODEL)
+                    for new_system, old_system in zip(_systems(new_fleet), _systems(old_fleet))]
+
+
+@benchmark("system_batch.calculate_opex_emissions", ["1", "1k", "100k", "1M"])
+def _batch_opex(size, work_dir):
+    fleet = synthetic_fleet(size)
+    return lambda: fleet.calculate_opex_emissions(UTILIZATION, GERMANY)
+
+
+@benchmark("comparison.compute_systems_break_even", ["1", "1k", "100k", "1M"])
+def _batch_break_even(size, work_dir):
+    new_systems, old_systems = synthetic_fleet(size), synthetic_fleet(size, seed=1)
+    return lambda: compute_systems_break_even(new_systems, old_systems, GERMANY, UTILIZATION, GUPTA_MODEL)
+
+
+@benchmark("comparison.generate_batch_systems_comparison", ["1", "1k", "100k"])
+def _batch_comparison(size, work_dir):
+    # size pairs as 1k new systems against size / 1k old systems, 1M pairs would hold several (N, M, time_horizon)
+    # arrays of 160 MB each
+    new_systems = synthetic_fleet(min(size, 1000))
+    old_systems = synthetic_fleet(max(size // 1000, 1), seed=1)
+    return lambda: generate_batch_systems_comparison(new_systems, old_systems, TIME_HORIZON, GERMANY, UTILIZATION,
+                                                     GUPTA_MODEL)
+
+
+@benchmark("cpu_catalog.build_catalog_frame", ["1k", "100k"])
+def _catalog_frame(size, work_dir):
+    sources, filtered_path = synthetic_catalog_sources(size, work_dir)
+    add_package_size_cm2(filtered_path)
+    return lambda: build_catalog_frame(sources)
+
+
+@benchmark("extend_intel_cpu_info.add_package_size_cm2", ["1k", "100k"])
+def _package_size(size, work_dir):
+    _, filtered_path = synthetic_catalog_sources(size, work_dir)
+    extended_path = filtered_path.replace(".csv", "-extended.csv")
+
+    def run():
+        # from scratch, the incremental path is the cheap one
+        if os.path.exists(extended_path):
+            os.remove(extended_path)
+        add_package_size_cm2(filtered_path)
+
+    return run
+
+
+@benchmark("extract_numbers.ingest", ["1", "1k"])
+def _ingest(size, work_dir):
+    # advisor exports are counted in files, 1k exports is the size of a full parameter study
+    input_dir, server_type = synthetic_advisor_exports(size, work_dir)
+    output_path = os.path.join(work_dir, "advisor_exports.csv")
+    fingerprint_cache = os.path.join(work_dir, "fingerprints.json")
+
+    def run():
+        for path in (output_path, fingerprint_cache):
+            if os.path.exists(path):
+                os.remove(path)
+        extract_numbers.ingest(input_dir, [server_type], output_path, fingerprint_cache=fingerprint_cache)
+
+    return run
+
+
+@benchmark("plotting.create_projections_plot", ["1"], tracked=False)
+def _projections_plot(size, work_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    from lifecycle_anslysis.plotting import create_projections_plot
+
+    new_system, old_system = _systems(synthetic_fleet(2))
+    new_system_opex, old_system_opex, _, _, ratio = generate_systems_comparison(
+        new_system, old_system, TIME_HORIZON, GERMANY, UTILIZATION, GUPTA_MODEL)
+    save_path = os.path.join(work_dir, "projections")
+    # the draft style, TeX rendering depends on the TeX installation more than on this code
+    return lambda: create_projections_plot(new_system_opex, old_system_opex, ratio, save_path, draft=True, show=False)
+
+
+##############################
+# Runner
+##############################
+
+def measure(run, repeat):
+    """
+    :return: wall times of repeat runs in seconds and the peak of memory allocated by Python and NumPy during one
+             further run in bytes, allocations in worker processes are not included
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return times, peak
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, sizes=None, repeat=5):
+    """
+    :return: one record per benchmark and size
+    """
+    run_info = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+    records = []
+    for name, spec in BENCHMARKS.items():
+        if names is not None and name not in names:
+            continue
+        for size in spec["sizes"]:
+            if sizes is not None and size not in sizes:
+                continue
+            with tempfile.TemporaryDirectory() as work_dir:
+                run = spec["setup"](SIZES[size], work_dir)
+                times, peak = measure(run, repeat)
+            records.append({**run_info, "name": name, "size": size, "tracked": spec["tracked"], "repeat": repeat,
+                            "min_s": min(times), "median_s": float(np.median(times)), "peak_bytes": peak})
+    return records
+
+
+def read_history(history_path):
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def append_history(history_path, records):
+    os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    with open(history_path, "a") as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+
+
+def find_regressions(records, history, threshold=DEFAULT_THRESHOLD, window=BASELINE_WINDOW,
+                     min_delta=DEFAULT_MIN_DELTA_S):
+    """
+    Compares the best time of every tracked record with the median best time of the last window runs of the same
+    benchmark and size on the same machine. Records marked as regressed are not part of the baseline, so a
+    regression does not become the new normal by running the benchmarks again. Marks the records with "regressed".
+
+    :return: list of (record, baseline in seconds) for records slower than baseline * (1 + threshold) and
+             baseline + min_delta
+    """
+    regressions = []
+    for record in records:
+        record["regressed"] = False
+        if not record["tracked"]:
+            continue
+        previous = [entry["min_s"] for entry in history if (entry["name"], entry["size"], entry["machine"]) == (
+            record["name"], record["size"], record["machine"]) and not entry.get("regressed", False)][-window:]
+        if not previous:
+            continue
+        baseline = float(np.median(previous))
+        if record["min_s"] > baseline * (1 + threshold) and record["min_s"] - baseline > min_delta:
+            record["regressed"] = True
+            regressions.append((record, baseline))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the lifecycle model, ingestion and plotting.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all), one of {list(BENCHMARKS)}")
+    parser.add_argument("--sizes", nargs="*", help=f"sizes to run (default: all of a benchmark), e.g. {list(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of tracked benchmarks, 0.25 = 25%%")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA_S,
+                        help="slowdowns of at most this many seconds are noise, not regressions")
+    parser.add_argument("--no-record", action="store_true", help="do not append the results to the history")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks {sorted(unknown)}")
+
+    benchmark_records = run_benchmarks(args.names or None, args.sizes, args.repeat)
+    history_records = read_history(args.history)
+    found_regressions = find_regressions(benchmark_records, history_records, args.threshold,
+                                         min_delta=args.min_delta)
+    if not args.no_record:
+        append_history(args.history, benchmark_records)
+
+    summary = pd.DataFrame(benchmark_records)[["name", "size", "min_s", "median_s", "peak_bytes"]]
+    summary["peak_mib"] = (summary.pop("peak_bytes") / 2 ** 20).round(1)
+    print(summary.to_string(index=False))
+
+    for regressed, regression_baseline in found_regressions:
+        print(f"Regression: {regressed['name']} [{regressed['size']}] took {regressed['min_s'] * 1000:.3f} ms, "
+              f"baseline {regression_baseline * 1000:.3f} ms")
+    sys.exit(1 if found_regressions else 0)
@@ -1,11 +1,13 @@
 import numpy as np
 
 from lifecycle_anslysis.constants import NEW_SYSTEM, OLD_SYSTEM
-from lifecycle_anslysis.system import System
+from lifecycle_anslysis.instrumentation import count, traced
+from lifecycle_anslysis.system import System, SystemBatch
 
 
 def generate_systems_comparison(new_system: System, old_system: System, time_horizon: int, country: str,
                                 utilization: int, opex_calculation: str):
+    count("comparisons")
     new_system_opex = new_system.generate_accumm_projected_opex_emissions(
         time_horizon, system_id=NEW_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
     new_system_capex = new_system.calculate_capex_emissions()
@@ -24,3 +26,75 @@ def generate_systems_comparison(new_system: System, old_system: System, time_hor
     ratio = new_system_opex / old_system_opex
 
     return new_system_opex, old_system_opex, abs_savings, relative_savings, ratio
+
+
+@traced("comparison.generate_batch_systems_comparison")
+def generate_batch_systems_comparison(new_systems: SystemBatch, old_systems: SystemBatch, time_horizon: int,
+                                      country: str, utilization: int, opex_calculation: str):
+    """
+    Compares every new system against every old system (N x M pairs) without a per-pair Python loop.
+
+    :return: new_system_opex, abs_savings, relative_savings and ratio of shape (N, M, time_horizon),
+             old_system_opex of shape (M, time_horizon) and break_even of shape (N, M), see compute_break_even
+    """
+    count("comparisons", len(new_systems) * len(old_systems))
+    years = np.arange(1, time_horizon + 1, dtype=np.float64)
+
+    new_system_opex_per_year = new_systems.calculate_opex_per_year(
+        NEW_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+    new_system_capex = new_systems.calculate_capex_emissions()
+    old_system_opex_per_year = old_systems.calculate_opex_per_year(
+        OLD_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+
+    performance_factor = \
+        old_systems.performance_indicator[np.newaxis, :] / new_systems.performance_indicator[:, np.newaxis]
+
+    new_system_opex = (performance_factor * new_system_opex_per_year[:, np.newaxis])[:, :, np.newaxis] * years
+    new_system_opex += new_system_capex[:, np.newaxis, np.newaxis]
+    old_system_opex = old_system_opex_per_year[:, np.newaxis] * years
+
+    abs_savings = new_system_opex - old_system_opex
+    relative_savings = 1 - (old_system_opex / new_system_opex)
+    ratio = new_system_opex / old_system_opex
+
+    break_even = compute_break_even(new_system_capex[:, np.newaxis], new_system_opex_per_year[:, np.newaxis],
+                                    old_system_opex_per_year[np.newaxis, :], performance_factor)
+
+    return new_system_opex, old_system_opex, abs_savings, relative_savings, ratio, break_even
+
+
+def compute_break_even(new_system_capex, new_system_opex_per_year, old_system_opex_per_year, performance_factor=1.0):
+    """
+    Solves capex + performance_factor * new_opex_per_year * t = old_opex_per_year * t for t. The accumulated emissions
+    of both systems are linear in t, so the crossover has a closed form and does not depend on a time horizon.
+    All arguments broadcast against each other, so many pairs are solved at once.
+
+    :return: fractional break-even time in years, np.inf if the new system never breaks even
+    """
+    new_system_capex, new_system_opex_per_year, old_system_opex_per_year, performance_factor = np.broadcast_arrays(
+        *[np.asarray(value, dtype=np.float64) for value in (new_system_capex, new_system_opex_per_year,
+                                                             old_system_opex_per_year, performance_factor)])
+
+    opex_savings_per_year = old_system_opex_per_year - performance_factor * new_system_opex_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        break_even = new_system_capex / opex_savings_per_year
+
+    break_even = np.where(opex_savings_per_year > 0, break_even, np.inf)
+    break_even = np.where(new_system_capex <= 0, 0.0, break_even)
+
+    return break_even[()]
+
+
+def compute_systems_break_even(new_system, old_system, country: str, utilization: int, opex_calculation: str):
+    """
+    Break-even time of new_system replacing old_system. Accepts either two System instances or two SystemBatch
+    instances of equal length (compared element-wise).
+    """
+    new_system_opex_per_year = new_system.calculate_opex_per_year(
+        NEW_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+    old_system_opex_per_year = old_system.calculate_opex_per_year(
+        OLD_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+    performance_factor = np.divide(old_system.performance_indicator, new_system.performance_indicator)
+
+    return compute_break_even(new_system.calculate_capex_emissions(), new_system_opex_per_year,
+                              old_system_opex_per_year, performance_factor)
@@ -0,0 +1,258 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import compute_break_even
+from lifecycle_anslysis.fleet import INVENTORY_COLUMNS, load_inventory, _opex_per_year
+from lifecycle_anslysis.instrumentation import count, span, traced
+from lifecycle_anslysis.system import SystemBatch
+
+# optional inventory columns, the DRAM and storage in GB the workload of an old server needs on its new host,
+# default to the capacities of the old server
+DRAM_DEMAND = "dram_demand"
+STORAGE_DEMAND = "storage_demand"
+
+# dimensions of the bin packing: compute in units of performance_indicator, DRAM and storage (SSD + HDD) in GB
+DIMENSIONS = ["compute", "dram", "storage"]
+
+DEFAULT_MAX_UTILIZATION = 80
+
+# relative tolerance when checking whether a server still fits
+_FIT_TOLERANCE = 1e-9
+# items packed between two removals of full servers from the first fit scan
+_PRUNE_INTERVAL = 64
+
+
+def expand_configurations(cpus: SystemBatch, dram_capacities, ssd_capacities, hdd_capacities):
+    """
+    Every CPU with every DRAM, SSD and HDD sizing.
+
+    :return: SystemBatch and a DataFrame with the CPU position and sizing of every configuration
+    """
+    grid = np.array(list(itertools.product(range(len(cpus)), dram_capacities, ssd_capacities, hdd_capacities)),
+                    dtype=np.float64).reshape(-1, 4)
+    cpu = grid[:, 0].astype(np.int64)
+    configurations = SystemBatch(
+        die_size=cpus.packaging_size[cpu],
+        performance_indicator=cpus.performance_indicator[cpu],
+        lifetime=cpus.lifetime[cpu],
+        dram_capacity=grid[:, 1],
+        ssd_capacity=grid[:, 2],
+        hdd_capacity=grid[:, 3],
+        cpu_tdp=cpus.cpu_tdp[cpu],
+    )
+    return configurations, pd.DataFrame({"cpu": cpu, "dram_capacity": grid[:, 1], "ssd_capacity": grid[:, 2],
+                                         "hdd_capacity": grid[:, 3]})
+
+
+def _read_inventory(inventory):
+    if isinstance(inventory, str):
+        columns = set(INVENTORY_COLUMNS + [DRAM_DEMAND, STORAGE_DEMAND])
+        if inventory.endswith(".parquet"):
+            inventory = pd.read_parquet(inventory)
+            inventory = inventory[[column for column in inventory.columns if column in columns]]
+        else:
+            inventory = pd.read_csv(inventory, usecols=lambda column: column in columns)
+    return inventory
+
+
+def _first_fit_decreasing(demands, capacities, fallback):
+    """
+    Packs items into bins of capacities[0] in order of decreasing largest share of a bin. An item that does not fit
+    an empty bin of capacities[0] opens a bin of capacities[fallback[item]] instead. Bins too full for any item left
+    are dropped from the scan, the packing is the same as without.
+
+    :param demands: array of shape (items, dimensions)
+    :param capacities: array of shape (configurations, dimensions)
+    :return: bin of every item and configuration of every bin
+    """
+    n_items = len(demands)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # fmax skips the 0 / 0 of a dimension neither demanded nor provided
+        order = np.argsort(-np.fmax.reduce(demands / capacities[0], axis=1), kind="stable")
+    tolerance = _FIT_TOLERANCE * capacities.max(axis=0)
+    # smallest demand in every dimension among the items not packed yet, bins below it in a dimension are full
+    smallest_remaining = np.minimum.accumulate(demands[order][::-1], axis=0)[::-1] - tolerance
+
+    # remaining capacity of the open bins, one row per dimension so the scan reads contiguous memory
+    remaining = np.empty((demands.shape[1], n_items))
+    open_bins = np.empty(n_items, dtype=np.int64)
+    bin_configurations = np.empty(n_items, dtype=np.int64)
+    assignment = np.empty(n_items, dtype=np.int64)
+    n_open = n_bins = 0
+    for position_in_order, item in enumerate(order):
+        if position_in_order % _PRUNE_INTERVAL == 0 and n_open:
+            alive = np.flatnonzero((remaining[:, :n_open] >= smallest_remaining[position_in_order, :, np.newaxis])
+                                   .all(axis=0))
+            remaining[:, :len(alive)] = remaining[:, alive]
+            open_bins[:len(alive)] = open_bins[alive]
+            n_open = len(alive)
+
+        demand = demands[item] - tolerance
+        fits = remaining[0, :n_open] >= demand[0]
+        for dimension in range(1, len(demand)):
+            fits &= remaining[dimension, :n_open] >= demand[dimension]
+        first = int(fits.argmax()) if n_open else 0
+        if not n_open or not fits[first]:
+            first = n_open
+            bin_configurations[n_bins] = 0 if (capacities[0] >= demand).all() else fallback[item]
+            remaining[:, first] = capacities[bin_configurations[n_bins]]
+            open_bins[first] = n_bins
+            n_open += 1
+            n_bins += 1
+        remaining[:, first] -= demands[item]
+        assignment[item] = open_bins[first]
+
+    return assignment, bin_configurations[:n_bins]
+
+
+def _right_size(bin_loads, fixed_cost, variable_cost, capacities):
+    # cheapest configuration of every bin that can carry its content, shape (bins,)
+    tolerance = _FIT_TOLERANCE * capacities.max(axis=0)
+    fits = (capacities[np.newaxis, :, :] >= bin_loads[:, np.newaxis, :] - tolerance).all(axis=2)
+    cost = fixed_cost[np.newaxis, :] + variable_cost[np.newaxis, :] * bin_loads[:, :1]
+    return np.argmin(np.where(fits, cost, np.inf), axis=1)
+
+
+@traced("consolidation.plan_consolidation")
+def plan_consolidation(inventory, configurations: SystemBatch, time_horizon: int,
+                       max_utilization: float = DEFAULT_MAX_UTILIZATION):
+    """
+    Chooses the number and mix of new servers that carry the load of a pool of old servers with the least CO2 over
+    time_horizon years (embodied CO2 of the new servers plus their OPEX with the Gupta model), without an ILP.
+
+    The workload of an old server is its utilization times its performance_indicator, in the performance units of
+    the new configurations, plus the DRAM and storage it needs. A new server carries workloads up to max_utilization
+    percent of its performance_indicator and its DRAM and SSD + HDD capacity. Unlike generate_systems_comparison,
+    which scales the whole OPEX of a new server by the performance factor, the utilization of a new server follows
+    from the workloads it carries, so the idle power of every server counts and fewer, fuller servers save OPEX.
+    Old servers are only consolidated with servers in the same country.
+
+    The power draw is affine in the utilization, so the CO2 of a plan is a fixed cost per new server (CAPEX and idle
+    OPEX) plus a cost per unit of workload that only depends on the configuration carrying it. Per country,
+    the configurations are tried in order of their fractional lower bound cost: the workloads are packed first fit
+    decreasing into servers of that configuration, then every packed server is right-sized to the cheapest
+    configuration that still carries its content. Configurations whose lower bound exceeds the best plan so far are
+    skipped, so only few packings run.
+
+    :param inventory: see load_inventory, optionally with DRAM_DEMAND and STORAGE_DEMAND columns
+    :param configurations: candidate new servers, see expand_configurations
+    :return: DataFrame with one row per new server (its country, configuration, number of old servers carried,
+             utilization, embodied and yearly operational CO2) and the new server of every old server
+    """
+    inventory = _read_inventory(inventory)
+    columns = load_inventory(inventory)
+    countries = inventory["country"].astype(str).str.lower().to_numpy()
+    dram_demand = inventory[DRAM_DEMAND].to_numpy(dtype=np.float64) if DRAM_DEMAND in inventory.columns \
+        else columns["dram_capacity"]
+    storage_demand = inventory[STORAGE_DEMAND].to_numpy(dtype=np.float64) if STORAGE_DEMAND in inventory.columns \
+        else columns["ssd_capacity"] + columns["hdd_capacity"]
+    demands = np.column_stack([columns["utilization"] / 100 * columns["performance_indicator"], dram_demand,
+                               storage_demand])
+
+    capacities = np.column_stack([configurations.performance_indicator * max_utilization / 100,
+                                  configurations.dram_capacity,
+                                  configurations.ssd_capacity + configurations.hdd_capacity])
+    capex = configurations.calculate_capex_emissions()
+    tolerance = _FIT_TOLERANCE * capacities.max(axis=0)
+
+    oversized = ~(capacities[np.newaxis, :, :] >= demands[:, np.newaxis, :] - tolerance).all(axis=2).any(axis=1)
+    if oversized.any():
+        raise ValueError(f"{int(oversized.sum())} old servers do not fit any configuration, "
+                         f"e.g. the one at position {int(np.flatnonzero(oversized)[0])}")
+
+    assignment = np.empty(len(demands), dtype=np.int64)
+    servers = []
+    n_servers = 0
+    for country in np.unique(countries):
+        members = np.flatnonzero(countries == country)
+        site_demands = demands[members]
+        gci = columns["gci"][members[0]]
+
+        # CO2 over the time horizon per new server and per unit of workload carried
+        idle_opex = _opex_per_year(configurations.cpu_tdp, configurations.dram_capacity, configurations.ssd_capacity,
+                                   configurations.hdd_capacity, 0, gci)
+        full_opex = _opex_per_year(configurations.cpu_tdp, configurations.dram_capacity, configurations.ssd_capacity,
+                                   configurations.hdd_capacity, 100, gci)
+        fixed_cost = capex + idle_opex * time_horizon
+        variable_cost = (full_opex - idle_opex) * time_horizon / configurations.performance_indicator
+
+        # a fractional packing without fixed cost for partly filled servers is a lower bound of every packing
+        total_demand = site_demands.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # a dimension neither demanded nor provided (0 / 0) does not bound the number of servers
+            servers_needed = np.fmax.reduce(total_demand / capacities, axis=1)
+        lower_bound = servers_needed * fixed_cost + variable_cost * total_demand[0]
+        fits = (capacities[np.newaxis, :, :] >= site_demands[:, np.newaxis, :] - tolerance).all(axis=2)
+        # cheapest configuration of every item that does not fit the configuration packed
+        fallback = np.argmin(np.where(fits, fixed_cost + variable_cost * site_demands[:, :1], np.inf), axis=1)
+
+        best_cost, best = np.inf, None
+        with span("consolidation.pack", country=country, servers=len(members)):
+            for configuration in np.argsort(lower_bound, kind="stable"):
+                if lower_bound[configuration] >= best_cost:
+                    break
+                count("consolidation.packings")
+                order = np.concatenate([[configuration], np.arange(len(capacities))])
+                site_assignment, bin_configurations = _first_fit_decreasing(
+                    site_demands, capacities[order], fallback + 1)
+                bin_configurations = order[bin_configurations]
+
+                bin_loads = np.column_stack([np.bincount(site_assignment, weights=site_demands[:, dimension],
+                                                         minlength=len(bin_configurations))
+                                             for dimension in range(len(DIMENSIONS))])
+                bin_configurations = _right_size(bin_loads, fixed_cost, variable_cost, capacities)
+                cost = float((fixed_cost[bin_configurations] + variable_cost[bin_configurations] * bin_loads[:, 0])
+                             .sum())
+                if cost < best_cost:
+                    best_cost, best = cost, (site_assignment, bin_configurations, bin_loads)
+
+        site_assignment, bin_configurations, bin_loads = best
+        assignment[members] = n_servers + site_assignment
+        n_servers += len(bin_configurations)
+        utilization = bin_loads[:, 0] / configurations.performance_indicator[bin_configurations] * 100
+        servers.append(pd.DataFrame({
+            "country": country,
+            "configuration": bin_configurations,
+            "old_servers": np.bincount(site_assignment, minlength=len(bin_configurations)),
+            "utilization": utilization,
+            "dram_demand": bin_loads[:, 1],
+            "storage_demand": bin_loads[:, 2],
+            "embodied_co2": capex[bin_configurations],
+            "opex_per_year": _opex_per_year(
+                configurations.cpu_tdp[bin_configurations], configurations.dram_capacity[bin_configurations],
+                configurations.ssd_capacity[bin_configurations], configurations.hdd_capacity[bin_configurations],
+                utilization, gci),
+        }))
+
+    count("consolidation.new_servers", n_servers)
+    servers = pd.concat(servers, ignore_index=True) if servers else pd.DataFrame(
+        columns=["country", "configuration", "old_servers", "utilization", "dram_demand", "storage_demand",
+                 "embodied_co2", "opex_per_year"])
+    return servers, assignment
+
+
+def summarize_consolidation(inventory, servers, time_horizon: int):
+    """
+    Per country, the old and new server counts, the CO2 over time_horizon years of keeping the old servers and of
+    consolidating onto the new ones, and the break-even time of the consolidation, see compute_break_even.
+    """
+    inventory = _read_inventory(inventory)
+    columns = load_inventory(inventory)
+    old = pd.DataFrame({
+        "country": inventory["country"].astype(str).str.lower().to_numpy(),
+        "opex_per_year": _opex_per_year(columns["cpu_tdp"], columns["dram_capacity"], columns["ssd_capacity"],
+                                        columns["hdd_capacity"], columns["utilization"], columns["gci"]),
+    }).groupby("country").agg(old_servers=("opex_per_year", "size"), old_opex_per_year=("opex_per_year", "sum"))
+    new = servers.groupby("country").agg(new_servers=("configuration", "size"), embodied_co2=("embodied_co2", "sum"),
+                                         new_opex_per_year=("opex_per_year", "sum"))
+
+    summary = old.join(new, how="outer").fillna(0.0).reset_index()
+    summary["old_co2"] = summary["old_opex_per_year"] * time_horizon
+    summary["new_co2"] = summary["embodied_co2"] + summary["new_opex_per_year"] * time_horizon
+    summary["co2_saved"] = summary["old_co2"] - summary["new_co2"]
+    summary["break_even"] = compute_break_even(summary["embodied_co2"].to_numpy(),
+                                               summary["new_opex_per_year"].to_numpy(),
+                                               summary["old_opex_per_year"].to_numpy())
+    return summary
@@ -5,6 +5,7 @@ SPECINT = "specint"
 # Countries
 SWEDEN = "sweden"
 GERMANY = "germany"
+POLAND = "poland"
 
 # Systems
 OLD_SYSTEM = "old_system"
@@ -13,6 +14,8 @@ NEW_SYSTEM = "new_system"
 # OPEX model
 HPE_POWER_ADVISOR = "hpe_power_advisor"
 GUPTA_MODEL = "gupta_model"
+# the Gupta model against the hourly grid carbon intensity in lifecycle_anslysis.grid_intensity
+HOURLY_GRID_INTENSITY = "hourly_grid_intensity"
 
 # data from files in ./raw_data_no_image
 # generated using the HPE power advisor
@@ -51,9 +54,28 @@ OPEX_PER_YEAR = {
 # Electricity maps
 GCI_CONSTANTS = {
     SWEDEN: 25 / 1000,
-    GERMANY: 344 / 1000
+    GERMANY: 344 / 1000,
+    POLAND: 652 / 1000
 }
 
 # according to https://dl.acm.org/doi/fullHtml/10.1145/3466752.3480089#tab1
 DRAM_WATTS_PER_256GB = 25.9
 
+
+# Embodied carbon model (ACT)
+# Source of the constants: https://ugupta.com/files/Gupta_ISCA2022_ACT.pdf
+MPA = 0.5  ### Procure materials | kg co2 per cm2
+EPA = 2.15  ### 0.8-3.5 | Fab Energy | kWh per cm2
+CI_FAB = 0.365  ### 30-700  | g co2 per kWh  --> converted to kg co2 per kWh
+GPA = 0.3  ### 0.1-0.5 | Kg CO2 per cm2
+FAB_YIELD = 0.875  ### 0-1  | Fab yield
+E_DRAM = 0.3  ### 0 - 0.6 | Kg CO2/GB
+E_SSD = 0.015  ### 0 - 0.03 | Kg CO2/GB
+E_HDD = 0.06  ### 0 - 0.12 | Kg CO2/GB
+
+# Watts according to https://www.ssstc.com/knowledge-detail/ssd-vs-hdd-power-efficiency/#:~:text=On%20average%2C%20SSDs%20consume%20around,may%20consume%203%2D4%20watts.
+SSD_WATTS = 3
+HDD_WATTS = 7
+
+# 52 weeks, the hourly grid carbon intensity series have 365 days (8760 hours) per year, see grid_intensity.py
+HOURS_PER_YEAR = 24 * 7 * 52
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.instrumentation import count, span, traced
+from lifecycle_anslysis.system import System, SystemBatch
+
+INTEL = "Intel"
+AMD = "AMD"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# intel_cpus_filtered.csv is the subset of intel_cpus.csv that intel_cpus_filtered-extended.csv is derived from, so
+# it adds no information of its own
+DEFAULT_SOURCES = {
+    "ark": os.path.join(REPO_ROOT, "intel_cpus.csv"),
+    "ark_extended": os.path.join(REPO_ROOT, "intel_cpus_filtered-extended.csv"),
+    "spec_medians": os.path.join(REPO_ROOT, "spec_median_xeon_tpc.csv"),
+    "frontend": os.path.join(REPO_ROOT, "frontend", "src", "assets", "data.ts"),
+}
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, ".cache", "cpu_catalog")
+
+# bump whenever the columns or their derivation change, so existing caches are rebuilt
+SCHEMA_VERSION = 2
+
+COLUMNS = {
+    "processor_number": "U32",
+    "name": "U64",
+    "vendor": "U8",
+    "launch_year": np.int16,  # -1 if unknown
+    "socket": "U32",
+    "cores": np.float64,
+    "threads": np.float64,
+    "tdp": np.float64,  # Watt
+    "die_size_cm2": np.float64,
+    "package_area_cm2": np.float64,
+    "spec_int_median": np.float64,
+    "spec_int_rate": np.float64,
+    "spec_int": np.float64,
+    "sort_tuples_per_s": np.float64,
+    "tpch_runs_per_h": np.float64,
+}
+
+# columns usable as System.performance_indicator
+PERFORMANCE_COLUMNS = ["spec_int_median", "spec_int_rate", "spec_int", "sort_tuples_per_s", "tpch_runs_per_h"]
+
+_MARKETING_WORDS = re.compile(r"\b(INTEL|AMD|XEON|PROCESSOR|PLATINUM|GOLD|SILVER|BRONZE|CPU)\b|\(R\)|\(TM\)|®|™")
+
+
+def normalize_processor_number(name):
+    """
+    Maps the different spellings of a processor to one key, e.g. "Intel Xeon E5-2630 v2", "Xeon Processor E5-2630 v2"
+    and "E5-2630V2" all become "E5-2630V2", "AMD EPYC 7601" becomes "EPYC7601".
+    """
+    return re.sub(r"\s+", "", _MARKETING_WORDS.sub(" ", name.upper()))
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_frontend_number(value):
+    # values are either plain numbers, null or products such as (4*477)
+    if value.strip() == "null":
+        return np.nan
+    factors = value.strip("() ").split("*")
+    return float(np.prod([float(factor) for factor in factors]))
+
+
+def read_frontend_cpus(path):
+    with open(path) as file:
+        content = file.read()
+
+    records = []
+    for name, body in re.findall(r'"([^"]+)":\s*\{([^{}]*)\}', content):
+        fields = dict(re.findall(r'"(\w+)":\s*([^,\n]+)', body))
+        if "MAKE" not in fields:
+            continue
+        records.append({
+            "name": name,
+            "vendor": AMD if fields["MAKE"].strip() == "AMD" else INTEL,
+            "launch_year": int(_parse_frontend_number(fields.get("LAUNCH_YEAR", "-1"))),
+            "cores": _parse_frontend_number(fields["CORE_COUNT"]) if "CORE_COUNT" in fields else np.nan,
+            "threads": _parse_frontend_number(fields["THREAD_COUNT"]) if "THREAD_COUNT" in fields else np.nan,
+            "tdp": _parse_frontend_number(fields["TDP"]) if "TDP" in fields else np.nan,
+            "die_size_cm2": _parse_frontend_number(fields["DIE_SIZE"]) / 100 if "DIE_SIZE" in fields else np.nan,
+            "spec_int_rate": _parse_frontend_number(fields["SPECINT_RATE"]) if "SPECINT_RATE" in fields else np.nan,
+            "spec_int": _parse_frontend_number(fields["SPECINT"]) if "SPECINT" in fields else np.nan,
+            "sort_tuples_per_s": _parse_frontend_number(fields["SORTED_TUPLES_PER_S"])
+            if "SORTED_TUPLES_PER_S" in fields else np.nan,
+            "tpch_runs_per_h": _parse_frontend_number(fields["TPCH_RUNS_PER_H"])
+            if "TPCH_RUNS_PER_H" in fields else np.nan,
+        })
+
+    return pd.DataFrame(records)
+
+
+@traced("cpu_catalog.build_catalog_frame")
+def build_catalog_frame(sources=None):
+    """
+    Normalizes all sources into one DataFrame with the columns in COLUMNS, one row per processor number.
+    """
+    sources = {**DEFAULT_SOURCES, **(sources or {})}
+
+    with span("csv.read", path=sources["ark"]):
+        ark = pd.read_csv(sources["ark"], sep=";")
+    count("csv.rows_parsed", len(ark))
+    catalog = pd.DataFrame({
+        "processor_number": ark["id"].map(normalize_processor_number),
+        "name": ark["name"],
+        "vendor": INTEL,
+        "launch_year": ark["Launch Date"].str.slice(0, 4).astype(float).fillna(-1),
+        "socket": ark["socket"].fillna(""),
+        "cores": ark["Total Cores"],
+        "threads": ark["Total Threads"],
+        "tdp": ark["TDP"],
+    }).set_index("processor_number")
+    catalog = catalog.reindex(columns=[column for column in COLUMNS if column != "processor_number"])
+
+    if os.path.exists(sources["ark_extended"]):
+        extended = pd.read_csv(sources["ark_extended"], usecols=["id", "package-area-cm2", "sort_tuples_per_s"])
+        extended.index = extended["id"].map(normalize_processor_number)
+        catalog["package_area_cm2"] = pd.to_numeric(extended["package-area-cm2"], errors="coerce")
+        catalog["sort_tuples_per_s"] = extended["sort_tuples_per_s"]
+
+    if os.path.exists(sources["spec_medians"]):
+        spec_medians = pd.read_csv(sources["spec_medians"], usecols=["Processor", "median_spec_int_perf"])
+        spec_medians.index = spec_medians["Processor"].map(normalize_processor_number)
+        spec_medians = spec_medians[spec_medians.index.isin(catalog.index)]
+        catalog.loc[spec_medians.index, "spec_int_median"] = spec_medians["median_spec_int_perf"]
+
+    if os.path.exists(sources["frontend"]):
+        frontend = read_frontend_cpus(sources["frontend"])
+        frontend.index = frontend["name"].map(normalize_processor_number)
+        # the curated frontend values take precedence, CPUs missing in ARK (e.g. AMD) are appended
+        catalog = frontend.combine_first(catalog)
+
+    catalog = catalog.reset_index(names="processor_number")
+    catalog["name"] = catalog["name"].fillna(catalog["processor_number"])
+    catalog["socket"] = catalog["socket"].fillna("")
+    catalog["launch_year"] = catalog["launch_year"].fillna(-1)
+
+    return catalog[list(COLUMNS)]
+
+
+class CpuCatalog:
+    """
+    Typed columnar CPU catalog. The columns are cached as .npy files that are memory-mapped on load, the cache is
+    rebuilt only if one of the sources changed. Lookups by processor number are dictionary lookups.
+    """
+
+    def __init__(self, columns) -> None:
+        self.columns = columns
+        for column in COLUMNS:
+            setattr(self, column, columns[column])
+
+        self.by_processor_number = {number: row for row, number in enumerate(self.processor_number.tolist())}
+        self.by_vendor = self._group_rows(self.vendor)
+        self.by_launch_year = self._group_rows(self.launch_year)
+        self.by_socket = self._group_rows(self.socket)
+
+    @staticmethod
+    def _group_rows(column):
+        keys, inverse = np.unique(column, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1])
+        return dict(zip(keys.tolist(), groups))
+
+    @classmethod
+    def load(cls, sources=None, cache_dir=DEFAULT_CACHE_DIR):
+        sources = {key: path for key, path in {**DEFAULT_SOURCES, **(sources or {})}.items() if os.path.exists(path)}
+        manifest_path = os.path.join(cache_dir, "manifest.json")
+
+        manifest = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+        if not cls._is_cache_valid(manifest, sources):
+            count("cpu_catalog.cache_misses")
+            cls._write_cache(build_catalog_frame(sources), sources, cache_dir)
+        else:
+            count("cpu_catalog.cache_hits")
+
+        return cls({column: np.load(os.path.join(cache_dir, f"{column}.npy"), mmap_mode="r") for column in COLUMNS})
+
+    @staticmethod
+    def _is_cache_valid(manifest, sources):
+        if manifest is None or manifest["schema_version"] != SCHEMA_VERSION \
+                or set(manifest["sources"]) != set(sources):
+            return False
+
+        for key, path in sources.items():
+            cached = manifest["sources"][key]
+            # size and mtime are a cheap first check, a touched but unchanged file is caught by the content hash
+            if cached["path"] != path:
+                return False
+            if {"size": cached["size"], "mtime_ns": cached["mtime_ns"]} != _fingerprint(path) \
+                    and cached["sha256"] != _sha256(path):
+                return False
+
+        return True
+
+    @staticmethod
+    def _write_cache(catalog, sources, cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        for column, dtype in COLUMNS.items():
+            np.save(os.path.join(cache_dir, f"{column}.npy"), catalog[column].to_numpy().astype(dtype))
+
+        manifest = {
+            "schema_version": SCHEMA_VERSION,
+            "sources": {key: {"path": path, "sha256": _sha256(path), **_fingerprint(path)}
+                        for key, path in sources.items()},
+        }
+        # the manifest is written last, an interrupted build is therefore rebuilt on the next load
+        with open(os.path.join(cache_dir, "manifest.json"), "w") as file:
+            json.dump(manifest, file)
+
+    def __len__(self):
+        return len(self.processor_number)
+
+    def row(self, name):
+        return self.by_processor_number[normalize_processor_number(name)]
+
+    def record(self, name):
+        row = self.row(name)
+        return {column: self.columns[column][row].item() for column in COLUMNS}
+
+    def rows(self, vendor=None, launch_year=None, socket=None):
+        """
+        Rows matching all given filters, in catalog order.
+        """
+        selected = np.arange(len(self))
+        for index, key in ((self.by_vendor, vendor), (self.by_launch_year, launch_year), (self.by_socket, socket)):
+            if key is not None:
+                selected = np.intersect1d(selected, index.get(key, np.empty(0, dtype=np.int64)))
+        return selected
+
+    def die_size(self, rows):
+        # System assumes package size == die size, so the package area is used where the die size is unknown
+        return np.where(np.isnan(self.die_size_cm2[rows]), self.package_area_cm2[rows], self.die_size_cm2[rows])
+
+    def system(self, name, performance_column, lifetime, dram_capacity, ssd_capacity, hdd_capacity):
+        row = self.row(name)
+        return System(
+            die_size=float(self.die_size(row)),
+            performance_indicator=float(self.columns[performance_column][row]),
+            lifetime=lifetime,
+            dram_capacity=dram_capacity,
+            ssd_capacity=ssd_capacity,
+            hdd_capacity=hdd_capacity,
+            cpu_tdp=float(self.tdp[row]),
+        )
+
+    def system_batch(self, rows, performance_column, lifetime, dram_capacity, ssd_capacity, hdd_capacity):
+        return SystemBatch(
+            die_size=self.die_size(rows),
+            performance_indicator=self.columns[performance_column][rows],
+            lifetime=lifetime,
+            dram_capacity=dram_capacity,
+            ssd_capacity=ssd_capacity,
+            hdd_capacity=hdd_capacity,
+            cpu_tdp=self.tdp[rows],
+        )
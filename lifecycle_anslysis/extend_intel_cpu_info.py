@@ -1,43 +1,107 @@
-import math
+import contextlib
 import os.path
 
+import numpy as np
 import pandas as pd
 
+try:
+    from lifecycle_anslysis.instrumentation import count, span
+except ImportError:
+    # run as a script from this directory, without instrumentation
+    def span(name, category=None, **args):
+        return contextlib.nullcontext()
 
-def _compute_area(size_str):
-    if not isinstance(size_str, str) and math.isnan(size_str):
-        return ""
+    def count(name, value=1):
+        pass
 
-    print(size_str)
-    size_str = size_str.strip("[]").replace("mm", "").replace("'", "")
-    if 'x' in size_str:
-        dimensions = size_str.split('x')
-    elif ',' in size_str:
-        dimensions = size_str.split(', ')
-    else:
-        raise NotImplementedError
+# ARK reports package sizes as e.g. ['52.5mm', '45mm'], ['37.5 mm', '37.5 mm'], ['76.0mm X 56.5mm'], ['45x45mm'],
+# ['52.5', '45mm'] or ['77.5mm', '56.5mm (LGA4189)']
+PACKAGE_SIZE_PATTERN = r"(?P<width>\d+(?:\.\d+)?)\s*(?:mm)?\s*(?:[xX×]|'\s*,\s*'|,)\s*'?\s*(?P<height>\d+(?:\.\d+)?)"
+
+ID_COLUMN = "id"
+PACKAGE_SIZE_COLUMN = "Package Size"
+PACKAGE_AREA_COLUMN = "package-area-cm2"
+ROW_HASH_COLUMN = "source-row-hash"
 
-    width = float(dimensions[0])
-    height = float(dimensions[1])
+
+def compute_package_area_cm2(package_sizes):
+    """
+    :param package_sizes: Series of ARK package size strings
+    :return: Series of package areas in cm^2, NaN where the size is missing or could not be parsed
+    """
+    dimensions = package_sizes.astype("string").str.extract(PACKAGE_SIZE_PATTERN).astype(float)
 
     # Compute the area in mm^2 and convert to cm^2
-    area_cm2 = (width * height) / 100.0
-    return area_cm2
+    return (dimensions["width"] * dimensions["height"]) / 100.0
+
+
+def _hash_rows(csv_path):
+    # hash the raw text of each row, so the hashes do not depend on the dtypes pandas infers for a file
+    raw = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    return pd.util.hash_pandas_object(raw, index=False).map("{:016x}".format)
 
 
 def add_package_size_cm2(csv_path):
-    data = pd.read_csv(csv_path)
-    base_path = directory = os.path.dirname(csv_path)
+    """
+    Writes <csv_path without extension>-extended.csv with the package area of every CPU. Rows whose content hash
+    matches the one stored in an existing extended file are taken over unchanged, including columns added to the
+    extended file afterwards. The file is only rewritten if a row was added, changed or removed.
+
+    :return: reprocessed rows with a package size that could not be parsed
+    """
+    with span("csv.read", path=csv_path):
+        data = pd.read_csv(csv_path)
+    count("csv.rows_parsed", len(data))
+    data = pd.concat([data, _hash_rows(csv_path).rename(ROW_HASH_COLUMN)], axis=1)
+    base_path = os.path.dirname(csv_path)
     file_name_without_extension = os.path.splitext(os.path.basename(csv_path))[0]
+    output_path = os.path.join(base_path, f'{file_name_without_extension}-extended.csv')
 
-    # Apply the function to compute the area for each row
-    data['package-area-cm2'] = data['Package Size'].apply(_compute_area)
+    previous = None
+    if os.path.exists(output_path):
+        previous = pd.read_csv(output_path)
+        if ROW_HASH_COLUMN not in previous.columns:
+            # written before rows were hashed, only the columns added by hand are taken over
+            added_columns = [column for column in previous.columns
+                             if column not in data.columns and column != PACKAGE_AREA_COLUMN]
+            added = previous.drop_duplicates(subset=ID_COLUMN).set_index(ID_COLUMN)[added_columns]
+            data = data.join(added, on=ID_COLUMN)
+            previous = None
+
+    if previous is not None:
+        previous = previous.drop_duplicates(subset=ID_COLUMN, ignore_index=True)
+        previous_positions = pd.Index(previous[ID_COLUMN]).get_indexer(data[ID_COLUMN])
+        unchanged = (previous_positions >= 0) & (
+                previous[ROW_HASH_COLUMN].to_numpy()[previous_positions] == data[ROW_HASH_COLUMN].to_numpy())
+    else:
+        unchanged = np.zeros(len(data), dtype=bool)
+
+    changed_rows = data[~unchanged].copy()
+    count("extend_intel_cpu_info.rows_reused", int(unchanged.sum()))
+    count("extend_intel_cpu_info.rows_computed", len(changed_rows))
+    changed_rows[PACKAGE_AREA_COLUMN] = compute_package_area_cm2(changed_rows[PACKAGE_SIZE_COLUMN])
+    unparseable = changed_rows[changed_rows[PACKAGE_SIZE_COLUMN].notna() & changed_rows[PACKAGE_AREA_COLUMN].isna()]
+
+    if previous is not None and unchanged.all() and len(previous) == len(data):
+        return unparseable[[ID_COLUMN, PACKAGE_SIZE_COLUMN]]
+
+    if previous is not None:
+        unchanged_rows = previous.iloc[previous_positions[unchanged]]
+        unchanged_rows.index = data.index[unchanged]
+        data = pd.concat([unchanged_rows, changed_rows]).sort_index()
+    else:
+        data = changed_rows
 
     # Save the updated DataFrame to a new CSV file
-    output_path = os.path.join(base_path, f'{file_name_without_extension}-extended.csv')
-    data.to_csv(output_path, index=False)
+    with span("csv.write", path=output_path):
+        data.to_csv(output_path, index=False)
+
+    return unparseable[[ID_COLUMN, PACKAGE_SIZE_COLUMN]]
 
 
 if __name__ == '__main__':
     csv_file = '../intel_cpus_filtered.csv'
-    add_package_size_cm2(csv_file)
+    unparseable_rows = add_package_size_cm2(csv_file)
+    if len(unparseable_rows) > 0:
+        print(f"Could not parse the package size of {len(unparseable_rows)} CPUs:")
+        print(unparseable_rows.to_string(index=False))
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import compute_break_even
+from lifecycle_anslysis.constants import HOURS_PER_YEAR, GCI_CONSTANTS
+from lifecycle_anslysis.instrumentation import count, traced
+from lifecycle_anslysis.power_curves import GUPTA_POWER_MODEL
+from lifecycle_anslysis.system import SystemBatch
+
+# System fields, the age of the server in years, its site and its utilization in percent
+HARDWARE_COLUMNS = ["die_size", "performance_indicator", "lifetime", "dram_capacity", "ssd_capacity", "hdd_capacity",
+                    "cpu_tdp"]
+INVENTORY_COLUMNS = HARDWARE_COLUMNS + ["age", "country", "utilization"]
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# generation index of servers still running their original hardware
+ORIGINAL_HARDWARE = -1
+
+
+class AgePolicy:
+    """
+    Replaces a server once it is max_age years old.
+    """
+    needs_break_even = False
+
+    def __init__(self, max_age: int) -> None:
+        self.max_age = max_age
+
+    def select(self, age, break_even):
+        return age >= self.max_age
+
+
+class BreakEvenPolicy:
+    """
+    Replaces a server as soon as the newest generation breaks even within max_break_even years.
+    """
+    needs_break_even = True
+
+    def __init__(self, max_break_even: float) -> None:
+        self.max_break_even = max_break_even
+
+    def select(self, age, break_even):
+        return break_even <= self.max_break_even
+
+
+class BudgetPolicy:
+    """
+    Replaces the servers with the shortest break-even time first, as long as the embodied CO2 of the replacements
+    bought in a year stays within annual_budget (kg CO2). Servers at the end of their lifetime are replaced regardless
+    and count against the budget.
+    """
+    needs_break_even = True
+
+    def __init__(self, annual_budget: float, max_break_even: float = np.inf) -> None:
+        self.annual_budget = annual_budget
+        self.max_break_even = max_break_even
+
+    def select(self, age, break_even):
+        return np.isfinite(break_even) & (break_even <= self.max_break_even)
+
+
+def iter_inventory_chunks(inventory, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    :param inventory: DataFrame or path to a CSV or Parquet file with the INVENTORY_COLUMNS, one row per server
+    :return: iterator over DataFrames of at most chunk_size servers with the INVENTORY_COLUMNS
+    """
+    if not isinstance(inventory, str):
+        for start in range(0, len(inventory), chunk_size):
+            yield inventory.iloc[start:start + chunk_size]
+    elif inventory.endswith(".parquet"):
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(inventory).iter_batches(batch_size=chunk_size,
+                                                                         columns=INVENTORY_COLUMNS):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(inventory, usecols=INVENTORY_COLUMNS, chunksize=chunk_size)
+
+
+def load_inventory(inventory, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Reads the inventory chunk by chunk into float64 columns, so besides the columns only one chunk of the file is in
+    memory at a time.
+
+    :param inventory: see iter_inventory_chunks
+    :return: dict of NumPy columns, the country replaced by its grid carbon intensity "gci"
+    """
+    numeric_columns = HARDWARE_COLUMNS + ["age", "utilization"]
+    chunks = {column: [] for column in numeric_columns + ["gci"]}
+    for chunk in iter_inventory_chunks(inventory, chunk_size):
+        missing = set(INVENTORY_COLUMNS) - set(chunk.columns)
+        if missing:
+            raise ValueError(f"Inventory is missing the columns {sorted(missing)}")
+
+        for column in numeric_columns:
+            chunks[column].append(chunk[column].to_numpy(dtype=np.float64))
+
+        countries = chunk["country"].astype(str).str.lower()
+        unknown = set(countries.unique()) - set(GCI_CONSTANTS)
+        if unknown:
+            raise ValueError(f"No grid carbon intensity for {sorted(unknown)}")
+        chunks["gci"].append(countries.map(GCI_CONSTANTS).to_numpy(dtype=np.float64))
+
+    # one column at a time, so the chunks of only one column are copied at once
+    columns = {}
+    for column in list(chunks):
+        columns[column] = np.concatenate(chunks.pop(column)) if chunks[column] else np.empty(0)
+    return columns
+
+
+def _opex_per_year(cpu_tdp, dram_capacity, ssd_capacity, hdd_capacity, utilization, gci):
+    # System.calculate_opex_emissions with the utilization and grid carbon intensity of every server
+    power = GUPTA_POWER_MODEL.total_power(cpu_tdp, dram_capacity, ssd_capacity, hdd_capacity, utilization)
+    return HOURS_PER_YEAR * power * gci
+
+
+@traced("fleet.simulate_fleet")
+def simulate_fleet(inventory, policy, generations: SystemBatch, availability_years, time_horizon: int,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Simulates the replacement of a server fleet year by year with the Gupta OPEX model. In every year, servers are
+    replaced at the end of their lifetime or when the policy selects them, always by the newest generation available
+    in that year. As in generate_systems_comparison, a server keeps serving the workload of its original hardware, so
+    the OPEX of replacement hardware is scaled by original performance / replacement performance. The embodied CO2 of
+    the original hardware is sunk and not counted.
+
+    The fleet state is a few arrays per server, the inventory is read and all arithmetic runs on chunks of chunk_size
+    servers, so the temporary memory does not grow with the fleet.
+
+    :param inventory: see load_inventory
+    :param policy: AgePolicy, BreakEvenPolicy or BudgetPolicy
+    :param generations: replacement hardware
+    :param availability_years: year (counted from 0) from which each generation can be bought
+    :return: DataFrame with the replacements, embodied, operational and total CO2 in kg of every year
+    """
+    columns = load_inventory(inventory, chunk_size)
+    n_servers = len(columns["age"])
+    availability = np.asarray(availability_years, dtype=np.float64)
+
+    generation = np.full(n_servers, ORIGINAL_HARDWARE, dtype=np.int16)
+    age = columns["age"].copy()
+    # the performance the workload of each server was sized for
+    demand = columns["performance_indicator"]
+
+    generation_columns = {
+        "performance_indicator": generations.performance_indicator, "lifetime": generations.lifetime,
+        "dram_capacity": generations.dram_capacity, "ssd_capacity": generations.ssd_capacity,
+        "hdd_capacity": generations.hdd_capacity, "cpu_tdp": generations.cpu_tdp,
+    }
+    generation_capex = generations.calculate_capex_emissions()
+
+    replace = np.zeros(n_servers, dtype=bool)
+    break_even = np.full(n_servers, np.inf) if isinstance(policy, BudgetPolicy) else None
+
+    def current(column, chunk):
+        # attribute of the hardware currently installed in every server of the chunk
+        installed = generation[chunk]
+        return np.where(installed == ORIGINAL_HARDWARE, columns[column][chunk],
+                        generation_columns[column][np.maximum(installed, 0)])
+
+    def opex_per_year(chunk):
+        return demand[chunk] / current("performance_indicator", chunk) * _opex_per_year(
+            current("cpu_tdp", chunk), current("dram_capacity", chunk), current("ssd_capacity", chunk),
+            current("hdd_capacity", chunk), columns["utilization"][chunk], columns["gci"][chunk])
+
+    chunks = [slice(start, min(start + chunk_size, n_servers)) for start in range(0, n_servers, chunk_size)]
+    years = {"year": [], "replacements": [], "embodied_co2": [], "operational_co2": []}
+
+    for year in range(time_horizon):
+        available = np.flatnonzero(availability <= year)
+        newest = int(available[np.argmax(availability[available])]) if len(available) else None
+
+        # pass 1: decide which servers are replaced
+        for chunk in chunks:
+            end_of_life = age[chunk] >= current("lifetime", chunk)
+            if newest is None:
+                replace[chunk] = False
+                continue
+
+            chunk_break_even = None
+            if policy.needs_break_even:
+                new_system_opex_per_year = _opex_per_year(
+                    generations.cpu_tdp[newest], generations.dram_capacity[newest], generations.ssd_capacity[newest],
+                    generations.hdd_capacity[newest], columns["utilization"][chunk], columns["gci"][chunk])
+                chunk_break_even = compute_break_even(
+                    generation_capex[newest], new_system_opex_per_year, opex_per_year(chunk),
+                    demand[chunk] / generations.performance_indicator[newest])
+                # a server already running the newest generation has nothing to gain
+                chunk_break_even = np.where(generation[chunk] == newest, np.inf, chunk_break_even)
+
+            selected = policy.select(age[chunk], chunk_break_even) & (generation[chunk] != newest)
+            if break_even is not None:
+                break_even[chunk] = np.where(selected & ~end_of_life, chunk_break_even, np.inf)
+                replace[chunk] = end_of_life
+            else:
+                replace[chunk] = end_of_life | selected
+
+        if break_even is not None and newest is not None:
+            # every replacement in a year buys the same generation, so the budget is a number of servers
+            remaining = policy.annual_budget - replace.sum() * generation_capex[newest]
+            n_candidates = int(np.isfinite(break_even).sum())
+            n_affordable = min(int(max(remaining, 0) // generation_capex[newest]) if generation_capex[newest] > 0
+                               else n_candidates, n_candidates)
+            if n_affordable > 0:
+                shortest = np.argpartition(break_even, n_affordable - 1)[:n_affordable]
+                replace[shortest] = True
+
+        # pass 2: replace and operate for one year
+        n_replacements = 0
+        operational_co2 = 0.0
+        for chunk in chunks:
+            replaced = replace[chunk]
+            n_replacements += int(replaced.sum())
+            generation[chunk] = np.where(replaced, newest if newest is not None else ORIGINAL_HARDWARE,
+                                         generation[chunk])
+            age[chunk] = np.where(replaced, 0, age[chunk])
+
+            operational_co2 += float(opex_per_year(chunk).sum())
+            age[chunk] += 1
+
+        count("fleet.replacements", n_replacements)
+        years["year"].append(year)
+        years["replacements"].append(n_replacements)
+        years["embodied_co2"].append(n_replacements * generation_capex[newest] if newest is not None else 0.0)
+        years["operational_co2"].append(operational_co2)
+
+    result = pd.DataFrame(years)
+    result["total_co2"] = result["embodied_co2"] + result["operational_co2"]
+    return result
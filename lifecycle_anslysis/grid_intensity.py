@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.power_curves import ComponentPowerModel, GUPTA_POWER_MODEL
+
+# 365 days of measured hours. The OPEX models count HOURS_PER_YEAR = 52 weeks = 8736 hours, 0.27% less.
+# calculate_hourly_opex_emissions sums over all measured hours, hourly_opex_per_year is scaled to HOURS_PER_YEAR like
+# the other OPEX calculations.
+HOURS_PER_SERIES_YEAR = 8760
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "grid_intensity")
+MANIFEST_FILE = "manifest.json"
+
+
+class GridIntensityStore:
+    """
+    Hourly grid carbon intensity in kg CO2 per kWh, one float32 array of shape (years, 8760) per country stored as
+    .npy file. Countries are memory-mapped on first access.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR) -> None:
+        self.directory = directory
+        self._series = {}
+        self._mean_intensity = {}
+
+        self.manifest = {}
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                self.manifest = json.load(file)
+
+    def countries(self):
+        return list(self.manifest)
+
+    def years(self, country):
+        first_year = self.manifest[country]["first_year"]
+        return list(range(first_year, first_year + self.manifest[country]["n_years"]))
+
+    def load(self, country, years=None):
+        """
+        :return: array of shape (len(years), 8760), all stored years if years is None
+        """
+        if country not in self.manifest:
+            raise KeyError(country)
+        if country not in self._series:
+            self._series[country] = np.load(os.path.join(self.directory, f"{country}.npy"), mmap_mode="r")
+        series = self._series[country]
+
+        if years is None:
+            return series
+        first_year = self.manifest[country]["first_year"]
+        return series[[year - first_year for year in years]]
+
+    def mean_intensity(self, country):
+        """
+        :return: mean over all stored hours in kg CO2 per kWh
+        """
+        if country not in self._mean_intensity:
+            self._mean_intensity[country] = float(np.mean(self.load(country), dtype=np.float64))
+        return self._mean_intensity[country]
+
+    def write(self, country, first_year, series):
+        os.makedirs(self.directory, exist_ok=True)
+        series = np.asarray(series, dtype=np.float32).reshape(-1, HOURS_PER_SERIES_YEAR)
+        np.save(os.path.join(self.directory, f"{country}.npy"), series)
+        self._series.pop(country, None)
+        self._mean_intensity.pop(country, None)
+
+        self.manifest[country] = {"first_year": int(first_year), "n_years": int(series.shape[0])}
+        with open(os.path.join(self.directory, MANIFEST_FILE), "w") as file:
+            json.dump(self.manifest, file, indent=2, sort_keys=True)
+
+
+def read_hourly_csv(csv_path, datetime_column, intensity_column, grams=True):
+    """
+    Reads a local CSV export (e.g. from electricitymaps) into whole years of hourly values in kg CO2 per kWh.
+    Sub-hourly values are averaged, missing hours are interpolated and Feb 29 is dropped, so every year has 8760
+    hours. Incomplete first and last years are dropped.
+
+    :return: first year and array of shape (years, 8760)
+    """
+    data = pd.read_csv(csv_path, usecols=[datetime_column, intensity_column])
+    timestamps = pd.to_datetime(data[datetime_column], utc=True)
+    intensity = pd.Series(data[intensity_column].astype(float).to_numpy(), index=timestamps).sort_index()
+    if grams:
+        intensity = intensity / 1000
+
+    hourly = intensity.resample("h").mean().interpolate(limit_direction="both")
+    hourly = hourly[~((hourly.index.month == 2) & (hourly.index.day == 29))]
+
+    hours_per_year = hourly.groupby(hourly.index.year).size()
+    complete_years = hours_per_year.index[hours_per_year == HOURS_PER_SERIES_YEAR]
+    if len(complete_years) == 0:
+        raise ValueError(f"{csv_path} does not contain a complete year of hourly values")
+    if not np.array_equal(complete_years, np.arange(complete_years[0], complete_years[-1] + 1)):
+        raise ValueError(f"{csv_path} has incomplete years between complete ones")
+
+    hourly = hourly[(hourly.index.year >= complete_years[0]) & (hourly.index.year <= complete_years[-1])]
+    return int(complete_years[0]), hourly.to_numpy().reshape(-1, HOURS_PER_SERIES_YEAR)
+
+
+def calculate_hourly_opex_emissions(systems, grid_intensity, utilization):
+    """
+    OPEX per system and year against an hourly grid carbon intensity, see System.calculate_opex_emissions. A year
+    is the 8760 hours of the series, not HOURS_PER_YEAR.
+
+    The power draw is affine in the utilization (a + b * u), so the hourly dot product power @ intensity reduces to
+    a * sum(intensity) + b * (u @ intensity) and is computed once per year instead of once per system.
+
+    :param systems: System or SystemBatch
+    :param grid_intensity: array of shape (years, 8760) in kg CO2 per kWh
+    :param utilization: scalar or hourly utilization profile of shape (8760,) or (years, 8760), in percent
+    :return: array of shape (len(systems), years) in kg CO2, (years,) for a System
+    """
+    grid_intensity = np.asarray(grid_intensity, dtype=np.float64)
+    utilization = np.broadcast_to(np.asarray(utilization, dtype=np.float64), grid_intensity.shape)
+
+    # kWh per hour as a + b * utilization
+    static_energy, utilization_energy = GUPTA_POWER_MODEL.affine_coefficients(systems)
+
+    intensity_per_year = grid_intensity.sum(axis=1)
+    utilization_weighted_intensity_per_year = np.einsum("yh,yh->y", utilization, grid_intensity)
+
+    return np.multiply.outer(static_energy, intensity_per_year) \
+        + np.multiply.outer(utilization_energy, utilization_weighted_intensity_per_year)
+
+
+_default_store = None
+
+
+def hourly_opex_per_year(systems, country: str, utilization, store: GridIntensityStore = None,
+                         power_model: ComponentPowerModel = GUPTA_POWER_MODEL):
+    """
+    OPEX per year in kg CO2 of the HOURLY_GRID_INTENSITY opex_calculation. At a constant utilization the power draw
+    is constant, so the OPEX against the hourly series is the OPEX at its mean intensity over all stored years. Use
+    calculate_hourly_opex_emissions for hourly utilization profiles and single years.
+
+    :param systems: System or SystemBatch
+    :param store: GridIntensityStore with the country, the one in DEFAULT_STORE_DIR by default
+    """
+    global _default_store
+    if store is None:
+        if _default_store is None:
+            _default_store = GridIntensityStore()
+        store = _default_store
+    return power_model.calculate_opex_emissions(systems, utilization, gci=store.mean_intensity(country))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import an hourly grid carbon intensity CSV export.")
+    parser.add_argument("csv", help="path to the CSV export")
+    parser.add_argument("country", help="country key, e.g. germany")
+    parser.add_argument("--datetime-column", default="Datetime (UTC)")
+    parser.add_argument("--intensity-column", default="Carbon Intensity gCO₂eq/kWh (LCA)")
+    parser.add_argument("--kg", action="store_true", help="intensity is given in kg instead of g CO2 per kWh")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+
+    first_year, series = read_hourly_csv(args.csv, args.datetime_column, args.intensity_column, grams=not args.kg)
+    GridIntensityStore(args.store).write(args.country, first_year, series)
@@ -0,0 +1,234 @@
+import argparse
+import collections
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from multiprocessing import util
+
+import pandas as pd
+
+# set to a directory to trace this process and every process started from it, e.g. the workers of a process pool
+TRACE_DIR_ENV = "LIFECYCLE_TRACE_DIR"
+TRACE_PART_PATTERN = "trace-*.json"
+# events kept in memory per process. With a trace directory a full buffer is written to a part file, without one the
+# oldest events are dropped.
+MAX_BUFFERED_EVENTS = 1 << 20
+
+_enabled = False
+_trace_dir = None
+_events = collections.deque(maxlen=MAX_BUFFERED_EVENTS)
+_counters = {}
+
+
+def _record(event):
+    if len(_events) == MAX_BUFFERED_EVENTS and _trace_dir is not None:
+        dump()
+    _events.append(event)
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category, args) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        _record(("X", self.name, self.category, self.start, end - self.start, threading.get_native_id(), self.args))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ProcessState:
+    # weak-referenceable handle for multiprocessing.util.register_after_fork
+    pass
+
+
+_process_state = _ProcessState()
+
+
+def _clear_after_fork():
+    # a forked child starts with a copy of the parent's events, which the parent dumps itself
+    _events.clear()
+    _counters.clear()
+
+
+def _register_dump(_=None):
+    # runs at interpreter exit and, unlike atexit, also when a multiprocessing worker exits
+    util.Finalize(None, dump, exitpriority=0)
+
+
+os.register_at_fork(after_in_child=_clear_after_fork)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(trace_dir=None):
+    """
+    Starts recording spans and counters in this process. With a trace_dir, every process that imports this module
+    with TRACE_DIR_ENV inherited is traced as well, and each process writes its events to a part file in trace_dir
+    when it exits, see merge_traces.
+    """
+    global _enabled, _trace_dir
+    _enabled = True
+    if trace_dir is not None and _trace_dir is None:
+        _trace_dir = os.path.abspath(trace_dir)
+        os.makedirs(_trace_dir, exist_ok=True)
+        os.environ[TRACE_DIR_ENV] = _trace_dir
+        _register_dump()
+        # multiprocessing drops the finalizers of the parent in forked workers
+        util.register_after_fork(_process_state, _register_dump)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def span(name, category="lifecycle", **args):
+    """
+    Context manager recording the wall time of its body as a Chrome trace span. Spans nest. Returns a shared no-op
+    context manager while tracing is disabled.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def traced(name=None, category="lifecycle"):
+    """
+    Decorator recording every call of the function as a span, named after the function by default.
+    """
+
+    def decorate(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def count(name, value=1):
+    """
+    Adds value to the counter name, e.g. rows parsed or cache hits.
+    """
+    if not _enabled:
+        return
+    total = _counters.get(name, 0) + value
+    _counters[name] = total
+    _record(("C", name, "counter", time.perf_counter_ns(), 0, threading.get_native_id(), {name: total}))
+
+
+def counters():
+    return dict(_counters)
+
+
+def chrome_trace_events():
+    """
+    Recorded events of this process in the Chrome trace event format (chrome://tracing, Perfetto).
+    """
+    pid = os.getpid()
+    return [{"ph": phase, "name": name, "cat": category, "ts": start / 1000, "dur": duration / 1000, "pid": pid,
+             "tid": tid, "args": args} if phase == "X" else
+            {"ph": phase, "name": name, "cat": category, "ts": start / 1000, "pid": pid, "tid": tid, "args": args}
+            for phase, name, category, start, duration, tid, args in _events]
+
+
+def write_chrome_trace(path, events=None):
+    events = chrome_trace_events() if events is None else events
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+
+def dump():
+    """
+    Writes the events of this process to a part file in the trace directory and clears them.
+    """
+    if _trace_dir is None or not _events:
+        return
+    write_chrome_trace(os.path.join(_trace_dir, f"trace-{os.getpid()}-{time.time_ns()}.json"))
+    _events.clear()
+
+
+def merge_traces(trace_dir, output_path=None):
+    """
+    Merges the part files of all traced processes into one Chrome trace at output_path.
+
+    :return: merged events
+    """
+    events = []
+    for part_path in sorted(glob.glob(os.path.join(trace_dir, TRACE_PART_PATTERN))):
+        with open(part_path) as file:
+            events.extend(json.load(file)["traceEvents"])
+
+    if output_path is not None:
+        write_chrome_trace(output_path, events)
+    return events
+
+
+def summarize(events):
+    """
+    :return: DataFrame with one row per span name (calls, total, mean and max wall time in ms, summed over all
+             processes, nested spans count towards their parents as well) and one row per counter (final value
+             summed over processes)
+    """
+    spans = pd.DataFrame([event for event in events if event["ph"] == "X"], columns=["name", "dur"])
+    summary = spans.groupby("name")["dur"].agg(calls="count", total_ms="sum", mean_ms="mean", max_ms="max")
+    summary[["total_ms", "mean_ms", "max_ms"]] /= 1000
+    summary = summary.sort_values("total_ms", ascending=False)
+
+    final_counter_values = {}
+    for event in events:
+        if event["ph"] == "C":
+            final_counter_values[(event["pid"], event["name"])] = event["args"][event["name"]]
+    counter_totals = pd.Series(final_counter_values, dtype=float)
+    if len(counter_totals):
+        counter_totals = counter_totals.groupby(level=1).sum()
+    summary = pd.concat([summary, pd.DataFrame({"count": counter_totals})])
+    summary[["calls", "count"]] = summary[["calls", "count"]].astype("Int64")
+
+    return summary.rename_axis("name").reset_index()
+
+
+if os.environ.get(TRACE_DIR_ENV):
+    enable(os.environ[TRACE_DIR_ENV])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f"Merge and summarize the traces written with {TRACE_DIR_ENV} set.")
+    parser.add_argument("trace_dir")
+    parser.add_argument("--output", default=None, help="merged Chrome trace (default: <trace_dir>/trace.json)")
+    args = parser.parse_args()
+
+    merged_events = merge_traces(args.trace_dir, args.output or os.path.join(args.trace_dir, "trace.json"))
+    print(summarize(merged_events).to_string(index=False, float_format="{:.3f}".format))
@@ -0,0 +1,188 @@
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from lifecycle_anslysis.comparison import compute_break_even
+from lifecycle_anslysis.constants import HOURS_PER_YEAR, CI_FAB, EPA, GPA, MPA, FAB_YIELD, E_DRAM, E_SSD, E_HDD
+from lifecycle_anslysis.cpu_catalog import CpuCatalog, DEFAULT_SOURCES, REPO_ROOT, read_frontend_cpus, \
+    normalize_processor_number
+from lifecycle_anslysis.power_curves import GUPTA_POWER_MODEL
+
+DEFAULT_OUTPUT_DIR = os.path.join(REPO_ROOT, "frontend", "public", "lookup")
+INDEX_FILE = "index.json"
+POWER_FILE = "power.bin"
+BREAK_EVEN_DIR = "break_even"
+
+# bump whenever the layout of the tables changes, the UI refuses tables of another version
+LOOKUP_TABLES_VERSION = 1
+
+# the break-even tables hold every CPU pair and grow with the square of the number of CPUs, e.g. 351 MiB for the 477
+# catalog CPUs with a TDP and die size at a utilization step of 1%. They are served from frontend/public, so their
+# total size is capped, see max_lookup_cpus.
+MAX_BREAK_EVEN_BYTES = 64 * 2 ** 20
+
+# UI workload -> catalog column, see WORKLOAD_MAPPING in BenchmarkSettings.tsx
+WORKLOADS = {
+    "SPECrate": "spec_int_rate",
+    "SPECspeed": "spec_int",
+    "Sorting": "sort_tuples_per_s",
+    "TPC-H": "tpch_runs_per_h",
+}
+
+# default selections in Compare.tsx (RAM_CAPACITIES[0], SSD_CAPACITIES[0], HDD_CAPACITIES[0])
+DEFAULT_STORAGE = {"ram": 128, "ssd": 512, "hdd": 0}
+
+POWER_COMPONENTS = ["CPU", "RAM", "SSD", "HDD", "TOTAL"]
+CAPEX_COMPONENTS = ["CPU", "RAM", "SSD", "HDD", "TOTAL"]
+
+
+def calculate_power_breakdown(cpu_tdp, utilizations, ram, ssd, hdd):
+    """
+    Power draw per component as in System.calculate_opex_emissions.
+
+    :return: array of shape (len(cpu_tdp), len(utilizations), 5) in kW, components in POWER_COMPONENTS order
+    """
+    cpu_tdp = np.asarray(cpu_tdp, dtype=np.float64)[:, np.newaxis]
+    utilizations = np.asarray(utilizations, dtype=np.float64)
+
+    power = np.empty(cpu_tdp.shape[:1] + utilizations.shape + (len(POWER_COMPONENTS),))
+    # the platform power of GUPTA_POWER_MODEL is 0
+    cpu_power, ram_power, ssd_power, hdd_power, _ = GUPTA_POWER_MODEL.component_power(cpu_tdp, ram, ssd, hdd,
+                                                                                      utilizations)
+    power[..., 0] = cpu_power / 1000
+    power[..., 1] = ram_power / 1000
+    power[..., 2] = ssd_power / 1000
+    power[..., 3] = hdd_power / 1000
+    power[..., 4] = power[..., :4].sum(axis=-1)
+    return power
+
+
+def calculate_capex_breakdown(die_size, ram, ssd, hdd):
+    """
+    :return: array of shape (len(die_size), 5) in kg CO2, components in CAPEX_COMPONENTS order
+    """
+    die_size = np.asarray(die_size, dtype=np.float64)
+
+    capex = np.empty((len(die_size), len(CAPEX_COMPONENTS)))
+    capex[:, 0] = ((CI_FAB * EPA + GPA + MPA) * die_size) / FAB_YIELD
+    capex[:, 1] = ram * E_DRAM
+    capex[:, 2] = ssd * E_SSD
+    capex[:, 3] = hdd * E_HDD
+    capex[:, 4] = capex[:, :4].sum(axis=1)
+    return capex
+
+
+def pair_bytes(n_utilizations):
+    # float32 break-even times of one CPU pair, (workloads, utilizations)
+    return len(WORKLOADS) * n_utilizations * 4
+
+
+def max_lookup_cpus(n_utilizations, max_bytes=MAX_BREAK_EVEN_BYTES):
+    """
+    :return: largest number of CPUs whose break-even tables fit into max_bytes, e.g. 203 at a utilization step of 1%
+             and 446 at 5%
+    """
+    return math.isqrt(max_bytes // pair_bytes(n_utilizations))
+
+
+def build_lookup_tables(catalog: CpuCatalog, rows, output_dir=DEFAULT_OUTPUT_DIR, utilizations=range(0, 101),
+                        storage=None, max_bytes=MAX_BREAK_EVEN_BYTES):
+    """
+    Precomputes the comparison of every CPU pair for every workload and utilization step, so the UI looks results up
+    instead of running generateSystemsComparison on every change. Both systems use the same storage configuration.
+
+    The accumulated emissions of both systems are linear in time and the grid carbon intensity only scales the OPEX,
+    so every comparison follows from three tables without a country or time axis:
+
+    - power.bin: float32 (cpus, utilizations, 5), power per component in kW. OPEX per year is
+      power * HOURS_PER_YEAR * GCI, the opex breakdown and power consumption are read directly.
+    - index.json: the capex breakdown per CPU in kg CO2, new system emissions after t years are
+      capex + performance factor * opex per year * t, which gives the ratio and savings curves.
+    - break_even/<current CPU index>.bin: float32 (new CPUs, workloads, utilizations), break-even time in years at
+      a grid carbon intensity of 1 kg CO2 per kWh, divide by the GCI of the selected country. Infinity if the new
+      system never breaks even, NaN if a performance value is missing. One file per current CPU, the
+      (workloads, utilizations) block of a pair is pair_bytes long at offset new CPU index * pair_bytes, so the UI
+      fetches a single pair with an HTTP range request.
+
+    The break-even tables are len(rows) ** 2 * pair_bytes long in total. Catalogs that exceed max_bytes are rejected
+    before anything is written, use a coarser utilization step or fewer CPUs, see max_lookup_cpus.
+
+    :param rows: catalog rows to include, in UI order
+    :param max_bytes: limit of the total size of the break-even tables
+    """
+    storage = {**DEFAULT_STORAGE, **(storage or {})}
+    rows = np.asarray(rows)
+    utilizations = np.asarray(list(utilizations), dtype=np.float64)
+
+    max_cpus = max_lookup_cpus(len(utilizations), max_bytes)
+    if len(rows) > max_cpus:
+        raise ValueError(f"The break-even tables of {len(rows)} CPUs at {len(utilizations)} utilization steps take "
+                         f"{len(rows) ** 2 * pair_bytes(len(utilizations)) / 2 ** 20:.0f} MiB, at most {max_cpus} "
+                         f"CPUs fit into {max_bytes / 2 ** 20:.0f} MiB")
+
+    power = calculate_power_breakdown(catalog.tdp[rows], utilizations, **storage)
+    capex = calculate_capex_breakdown(catalog.die_size(rows), **storage)
+    performance = np.stack([catalog.columns[column][rows] for column in WORKLOADS.values()])  # (workloads, cpus)
+
+    # opex per year at a GCI of 1 kg CO2 per kWh
+    opex_per_year = power[..., -1] * HOURS_PER_YEAR  # (cpus, utilizations)
+
+    os.makedirs(os.path.join(output_dir, BREAK_EVEN_DIR), exist_ok=True)
+    power.astype("<f4").tofile(os.path.join(output_dir, POWER_FILE))
+
+    for old in range(len(rows)):
+        # (new CPUs, workloads, utilizations)
+        performance_factor = (performance[:, old][np.newaxis, :] / performance.T)[:, :, np.newaxis]
+        break_even = compute_break_even(capex[:, np.newaxis, np.newaxis, -1],
+                                        opex_per_year[:, np.newaxis, :],
+                                        opex_per_year[np.newaxis, np.newaxis, old, :],
+                                        performance_factor)
+        break_even = np.where(np.isnan(performance_factor), np.nan, break_even)
+        break_even.astype("<f4").tofile(os.path.join(output_dir, BREAK_EVEN_DIR, f"{old}.bin"))
+
+    index = {
+        "version": LOOKUP_TABLES_VERSION,
+        "cpus": catalog.name[rows].tolist(),
+        "workloads": list(WORKLOADS),
+        "utilizations": utilizations.tolist(),
+        "storage": storage,
+        "hours_per_year": HOURS_PER_YEAR,
+        "power_components": POWER_COMPONENTS,
+        "capex_components": CAPEX_COMPONENTS,
+        "capex": capex.round(6).tolist(),
+        "pair_bytes": pair_bytes(len(utilizations)),
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as file:
+        json.dump(index, file, indent=1)
+
+    return index
+
+
+def frontend_rows(catalog: CpuCatalog, frontend_path=DEFAULT_SOURCES["frontend"]):
+    # the CPUs of the UI, in the order of data.ts
+    return np.array([catalog.by_processor_number[normalize_processor_number(name)]
+                     for name in read_frontend_cpus(frontend_path)["name"]])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute the comparison lookup tables of the web UI.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--all", action="store_true",
+                        help="include every catalog CPU with a TDP and die size instead of the CPUs in data.ts, "
+                             "needs a coarse --utilization-step to stay within --max-mib")
+    parser.add_argument("--utilization-step", type=int, default=1, help="utilization step in percent")
+    parser.add_argument("--max-mib", type=float, default=MAX_BREAK_EVEN_BYTES / 2 ** 20,
+                        help="limit of the total size of the break-even tables in MiB")
+    args = parser.parse_args()
+
+    cpu_catalog = CpuCatalog.load()
+    if args.all:
+        selected_rows = np.flatnonzero(~np.isnan(cpu_catalog.tdp) & ~np.isnan(cpu_catalog.die_size(slice(None))))
+    else:
+        selected_rows = frontend_rows(cpu_catalog)
+
+    build_lookup_tables(cpu_catalog, selected_rows, args.output, utilizations=range(0, 101, args.utilization_step),
+                        max_bytes=int(args.max_mib * 2 ** 20))
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from lifecycle_anslysis import extend_intel_cpu_info, result_ingestion
+from lifecycle_anslysis.cpu_catalog import REPO_ROOT, normalize_processor_number, _sha256
+from lifecycle_anslysis.extend_intel_cpu_info import add_package_size_cm2
+from lifecycle_anslysis.instrumentation import count, span
+from lifecycle_anslysis.result_ingestion import ingest_spec_results
+
+DEFAULT_MANIFEST_PATH = os.path.join(REPO_ROOT, ".cache", "pipeline", "manifest.json")
+
+# bump to rerun every stage, e.g. after a pandas upgrade that changes how CSVs are written
+PIPELINE_VERSION = 1
+
+# stage states reported by run_pipeline
+RAN = "ran"
+FRESH = "fresh"
+UNAVAILABLE = "unavailable"
+
+STAGES = {}
+
+
+def stage(name, inputs, outputs, code=()):
+    """
+    Registers a pipeline stage. The decorated function is called as func(input_paths, output_paths) in a worker
+    process. Paths are relative to the repository root. A stage depends on the stages producing its inputs. Its
+    outputs are up to date as long as the content of its inputs, its own source and the source of the modules in code
+    are unchanged.
+    """
+
+    def register(func):
+        STAGES[name] = {"func": func, "inputs": list(inputs), "outputs": list(outputs), "code": list(code)}
+        return func
+
+    return register
+
+
+##############################
+# Stages
+##############################
+
+# Server CPUs of the Xeon Scalable and E5/E7 lines, see notebooks/intel_cpus.ipynb
+# W Processors: cpus for workstations and small servers
+# E Processors: entry-level servers and workstation microprocessors, https://en.wikichip.org/wiki/intel/xeon_e
+# D Processors: low-end, networking-heavy hyperscale servers, https://en.wikichip.org/wiki/intel/xeon_d
+DROPPED_COLLECTIONS = ["Legacy Xeon Processors", "Xeon W Processor", "Xeon E Processor", "Xeon D Processor",
+                       "Xeon CPU Max Series", "Xeon 6"]
+
+# CPUs used in TPC-H submissions, relaxed by hand (e.g. without suffix letters), see notebooks/spec.ipynb
+SPEC_MODEL_SELECTION = ['Gallatin', '5160', 'X5355', '7040', '7041', '7140', '7150', 'E5320', 'E5345', 'X5365',
+                        'X5460', 'X7350', 'E5420', 'X5440', 'X7460', 'E5520', 'X5570', 'X5680', 'X5650', 'X7560',
+                        'X5690', '8870', '2690', '4650', '2680', '8890', '8891', '2699', '4890', '2670', '8180',
+                        '2630', '4114', '6150', '6148', '8163', '4110', '4210', '6258', '6354', '8255', '4410']
+
+
+def extract_performance_id(name):
+    match = re.search(r'\d{4}', name)
+    if match:
+        return match.group(0)[-2:]
+    return None
+
+
+@stage("filtered", inputs=["intel_cpus.csv"], outputs=["intel_cpus_filtered.csv"])
+def filter_server_cpus(inputs, outputs):
+    df = pd.read_csv(inputs[0], sep=";")
+    count("csv.rows_parsed", len(df))
+
+    df["Processor Base Frequency"] = df["Processor Base Frequency"] / 10 ** 9
+    df["Max Turbo Frequency"] = df["Max Turbo Frequency"] / 10 ** 9
+    df = pd.concat([df, pd.DataFrame({
+        "Launch Year": df["Launch Date"].str.split("-").str[0].astype(int),
+        "Launch Year Month": df["Launch Date"].str.slice(0, 7),
+        "TDP per Core": df["TDP"] / df["Total Cores"],
+    })], axis=1)
+
+    df = df[df["Vertical Segment"] == "Server"].copy()
+    df["Product Collection"] = df["Product Collection"].str.replace('Generation', 'Gen')
+    df["performance_id"] = df["name"].apply(extract_performance_id)
+    df = df[~df["Product Collection"].isin(DROPPED_COLLECTIONS)]
+    # E3: Workstation CPUs, https://www.cpu-world.com/info/id_model/Intel-server-conventions.html
+    df = df[~df["Product Collection"].str.contains("E3")]
+
+    # the index is the row of the CPU in intel_cpus.csv
+    df.to_csv(outputs[0], header=True)
+
+
+@stage("extended", inputs=["intel_cpus_filtered.csv"], outputs=["intel_cpus_filtered-extended.csv"],
+       code=[extend_intel_cpu_info])
+def extend_with_package_area(inputs, outputs):
+    # rewrites only changed rows and keeps columns added to the extended file by hand, e.g. sort_tuples_per_s
+    add_package_size_cm2(inputs[0])
+
+
+@stage("spec_medians", inputs=["cpu2006-results-20240723-164205.csv", "cpu2017-results-20240723-171407.csv"],
+       outputs=["spec_median_xeon_tpc.csv"], code=[result_ingestion])
+def compute_spec_medians(inputs, outputs):
+    medians = ingest_spec_results(inputs, processor_pattern='|'.join(SPEC_MODEL_SELECTION)).to_frame()
+    pd.DataFrame({"Processor": medians.index, "median_spec_int_perf": medians["median"].to_numpy()}).to_csv(outputs[0])
+
+
+@stage("tpc_perf", inputs=["tpc_xeon.csv", "spec_median_xeon_tpc.csv"], outputs=["tpc_xeon_perf.csv"])
+def join_tpc_with_spec(inputs, outputs):
+    df = pd.read_csv(inputs[0], index_col=0)
+    spec_medians = pd.read_csv(inputs[1], index_col=0)
+    spec_medians = pd.Series(spec_medians["median_spec_int_perf"].to_numpy(),
+                             index=spec_medians["Processor"].map(normalize_processor_number))
+
+    # values entered by hand (e.g. the 7140N using the 7140M) are kept where SPEC has no result for a model
+    model = df["model"].str.strip()
+    df["median_spec_int_perf"] = model.map(normalize_processor_number).map(spec_medians).fillna(
+        df["median_spec_int_perf"])
+    df = df[df["median_spec_int_perf"].notna()].copy()
+
+    # older submissions give a range like "1 - 8" or no number of processors, their cores are per processor
+    df["processors"] = pd.to_numeric(df["processors"], errors="coerce").fillna(1).astype(int)
+    df["cores_per_cpu"] = pd.to_numeric(df["cores"], errors="coerce") / df["processors"]
+    df["perf_times_cores"] = df["median_spec_int_perf"] * df["cores_per_cpu"]
+    df["perf_per_tdp"] = df["perf_times_cores"] / df["TDP/CPU (W)"]
+
+    df.sort_values(by="model_launch_year", kind="stable").to_csv(outputs[0], index=False)
+
+
+##############################
+# Execution
+##############################
+
+def _absolute(path, root):
+    return os.path.join(root, path)
+
+
+def stage_order():
+    """
+    Stages in topological order, with the stages each one depends on.
+    """
+    producers = {output: name for name, spec in STAGES.items() for output in spec["outputs"]}
+    dependencies = {name: sorted({producers[path] for path in spec["inputs"] if path in producers})
+                    for name, spec in STAGES.items()}
+
+    order, visiting = [], set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline stage {name} depends on itself")
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency)
+        order.append(name)
+
+    for name in STAGES:
+        visit(name)
+    return order, dependencies
+
+
+def stage_key(name, root=REPO_ROOT):
+    """
+    Hash of the content of the stage's inputs and of its code, None if an input is missing.
+    """
+    spec = STAGES[name]
+    digest = hashlib.sha256(f"{PIPELINE_VERSION}:{name}".encode())
+    digest.update(inspect.getsource(spec["func"]).encode())
+    for module in spec["code"]:
+        digest.update(inspect.getsource(module).encode())
+    for path in spec["inputs"]:
+        absolute_path = _absolute(path, root)
+        if not os.path.exists(absolute_path):
+            return None
+        digest.update(f"{path}:{_sha256(absolute_path)}".encode())
+    return digest.hexdigest()
+
+
+def _is_fresh(name, key, manifest, root):
+    recorded = manifest.get(name)
+    if recorded is None or recorded["key"] != key:
+        return False
+    # outputs edited or deleted by hand are rebuilt
+    return all(os.path.exists(_absolute(path, root)) and _sha256(_absolute(path, root)) == sha256
+               for path, sha256 in recorded["outputs"].items())
+
+
+def _read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    return manifest["stages"] if manifest.get("version") == PIPELINE_VERSION else {}
+
+
+def _write_manifest(manifest_path, stages):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    temporary_path = f"{manifest_path}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump({"version": PIPELINE_VERSION, "stages": stages}, file, indent=1)
+    os.replace(temporary_path, manifest_path)
+
+
+def _run_stage(name, root):
+    spec = STAGES[name]
+    with span(f"pipeline.{name}", category="pipeline"):
+        spec["func"]([_absolute(path, root) for path in spec["inputs"]],
+                     [_absolute(path, root) for path in spec["outputs"]])
+
+
+def run_pipeline(targets=None, force=(), jobs=None, dry_run=False, root=REPO_ROOT,
+                 manifest_path=DEFAULT_MANIFEST_PATH):
+    """
+    Runs the stale stages needed for targets (default: all) in dependency order, independent stages in parallel.
+
+    A stage is stale if the hash of its inputs and code differs from the one recorded after its last run, or if one
+    of its outputs changed since. As keys are computed from the actual upstream outputs, a rerun stage whose outputs
+    did not change does not invalidate the stages after it. A stage with a missing input, e.g. raw SPEC results that
+    are not part of the repository, keeps its existing outputs.
+
+    :param force: stages to rerun even if they are up to date
+    :param dry_run: only report which stages would run, assuming the outputs of stale stages change
+    :return: dict of stage name to RAN, FRESH or UNAVAILABLE (with dry_run, RAN means would run)
+    """
+    order, dependencies = stage_order()
+    if targets is not None:
+        unknown = set(targets) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages {sorted(unknown)}")
+        needed = set()
+        pending_targets = list(targets)
+        while pending_targets:
+            name = pending_targets.pop()
+            if name not in needed:
+                needed.add(name)
+                pending_targets.extend(dependencies[name])
+        order = [name for name in order if name in needed]
+
+    manifest = _read_manifest(manifest_path)
+    states = {}
+    keys = {}
+    running = {}
+
+    def schedule(executor):
+        for name in order:
+            if name in states or name in running.values() \
+                    or any(dependency not in states for dependency in dependencies[name]):
+                continue
+
+            key = stage_key(name, root)
+            if key is None:
+                missing = [path for path in STAGES[name]["inputs"] if not os.path.exists(_absolute(path, root))]
+                if not all(os.path.exists(_absolute(path, root)) for path in STAGES[name]["outputs"]):
+                    raise FileNotFoundError(f"Pipeline stage {name} is missing the inputs {missing} and has no "
+                                            f"outputs to fall back to")
+                states[name] = UNAVAILABLE
+            elif name not in force and _is_fresh(name, key, manifest, root) \
+                    and not (dry_run and any(states[dependency] == RAN for dependency in dependencies[name])):
+                states[name] = FRESH
+                count("pipeline.stages_fresh")
+            elif dry_run:
+                states[name] = RAN
+            else:
+                keys[name] = key
+                running[executor.submit(_run_stage, name, root)] = name
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        schedule(executor)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                future.result()
+                states[name] = RAN
+                count("pipeline.stages_run")
+                manifest[name] = {
+                    "key": keys[name],
+                    "outputs": {path: _sha256(_absolute(path, root)) for path in STAGES[name]["outputs"]},
+                }
+                _write_manifest(manifest_path, manifest)
+            schedule(executor)
+
+    return {name: states[name] for name in order}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild the derived CPU data files whose inputs or code changed.")
+    parser.add_argument("targets", nargs="*", help=f"stages to build with their dependencies, of {sorted(STAGES)}")
+    parser.add_argument("--force", nargs="*", default=[], help="stages to rerun even if they are up to date")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel stages (default: number of CPUs)")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages that would run")
+    args = parser.parse_args()
+
+    stage_states = run_pipeline(args.targets or None, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    for stage_name, state in stage_states.items():
+        print(f"{stage_name}: {state}")
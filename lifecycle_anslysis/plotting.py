@@ -1,17 +1,21 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from matplotlib import pyplot as plt
 
+from lifecycle_anslysis.instrumentation import count, span, traced
+
 # colors
 BAR2 = "#abd9e9"
 BAR1 = "#fdae61"
 LINE = "#d7191c"
 
-
-def create_projections_plot(system_a_projected_emissions, system_b_projected_emissions, ratio, save_path, step_size=1,
-                            fig_size=None, break_even_label_pos=0):
-    plt.rcParams.update({'text.usetex': True
-                            , 'pgf.rcfonts': False
-                            , 'text.latex.preamble': r"""\usepackage{iftex}
+LATEX_STYLE = {'text.usetex': True
+               , 'pgf.rcfonts': False
+               , 'text.latex.preamble': r"""\usepackage{iftex}
                                             \ifxetex
                                                 \usepackage[libertine]{newtxmath}
                                                 \usepackage[tt=false]{libertine}
@@ -19,8 +23,19 @@ def create_projections_plot(system_a_projected_emissions, system_b_projected_emi
                                             \else
                                                 \RequirePackage[tt=false, type1=true]{libertine}
                                             \fi"""
-                         })
+               }
+# renders with matplotlib's mathtext instead of TeX, much faster but not camera-ready
+DRAFT_STYLE = {'text.usetex': False}
 
+# bump whenever the figure layout changes, so cached figures are rendered again
+PROJECTIONS_PLOT_VERSION = 1
+FIGURE_HASHES_FILE = ".figure_hashes.json"
+FIGURE_FORMATS = ["png", "svg"]
+
+
+@traced("plotting.draw_projections_plot")
+def _draw_projections_plot(system_a_projected_emissions, system_b_projected_emissions, ratio, step_size=1,
+                           fig_size=None, break_even_label_pos=0):
     bar_width = 0.25 * step_size
     font_size = 26
     fig, ax1 = plt.subplots(figsize=(10,6))
@@ -68,7 +83,101 @@ def create_projections_plot(system_a_projected_emissions, system_b_projected_emi
                bbox_to_anchor=(0.5, 1.3))  # Adjust vertical position
 
     plt.tight_layout()
-    plt.savefig(f"{save_path}.png", bbox_inches='tight')
-    plt.savefig(f"{save_path}.svg", bbox_inches='tight')
 
-    plt.show()
+    return fig
+
+
+def create_projections_plot(system_a_projected_emissions, system_b_projected_emissions, ratio, save_path, step_size=1,
+                            fig_size=None, break_even_label_pos=0, draft=False, show=True):
+    with plt.rc_context(DRAFT_STYLE if draft else LATEX_STYLE):
+        fig = _draw_projections_plot(system_a_projected_emissions, system_b_projected_emissions, ratio,
+                                     step_size=step_size, fig_size=fig_size, break_even_label_pos=break_even_label_pos)
+        for figure_format in FIGURE_FORMATS:
+            with span("plotting.savefig", format=figure_format):
+                fig.savefig(f"{save_path}.{figure_format}", bbox_inches='tight')
+    count("plotting.figures_rendered")
+
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
+def _projections_plot_hash(job, style):
+    digest = hashlib.sha256()
+    digest.update(repr((PROJECTIONS_PLOT_VERSION, sorted(style.items()))).encode())
+    for key in sorted(job):
+        if key == "save_path":
+            continue
+        value = job[key]
+        digest.update(key.encode())
+        if isinstance(value, np.ndarray):
+            digest.update(repr((value.dtype.str, value.shape)).encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+
+    return digest.hexdigest()
+
+
+def _init_render_worker(style):
+    plt.switch_backend("Agg")
+    plt.rcParams.update(style)
+
+
+def _render_projections_plot(job):
+    fig = _draw_projections_plot(**{key: value for key, value in job.items() if key != "save_path"})
+    for figure_format in FIGURE_FORMATS:
+        with span("plotting.savefig", format=figure_format):
+            fig.savefig(f"{job['save_path']}.{figure_format}", bbox_inches='tight')
+    plt.close(fig)
+    count("plotting.figures_rendered")
+
+
+@traced("plotting.render_projections_plots")
+def render_projections_plots(jobs, draft=False, max_workers=None, force=False):
+    """
+    Renders many projection plots in parallel worker processes using the Agg backend. A figure is skipped if its
+    outputs exist and the hash of its input arrays, arguments and style matches the one recorded when it was last
+    rendered. The hashes are kept in a FIGURE_HASHES_FILE next to the figures.
+
+    :param jobs: list of dicts with the keyword arguments of create_projections_plot (without draft and show)
+    :return: save paths of the figures that were rendered
+    """
+    style = DRAFT_STYLE if draft else LATEX_STYLE
+    jobs = [{**job, "system_a_projected_emissions": np.asarray(job["system_a_projected_emissions"]),
+             "system_b_projected_emissions": np.asarray(job["system_b_projected_emissions"]),
+             "ratio": np.asarray(job["ratio"])} for job in jobs]
+
+    figure_hashes = {}
+    for job in jobs:
+        directory = os.path.dirname(os.path.abspath(job["save_path"]))
+        if directory not in figure_hashes:
+            hashes_path = os.path.join(directory, FIGURE_HASHES_FILE)
+            figure_hashes[directory] = {}
+            if os.path.exists(hashes_path):
+                with open(hashes_path) as file:
+                    figure_hashes[directory] = json.load(file)
+
+    stale_jobs = []
+    for job in jobs:
+        directory = os.path.dirname(os.path.abspath(job["save_path"]))
+        name = os.path.basename(job["save_path"])
+        job_hash = _projections_plot_hash(job, style)
+        outputs_exist = all(os.path.exists(f"{job['save_path']}.{figure_format}") for figure_format in FIGURE_FORMATS)
+        if force or not outputs_exist or figure_hashes[directory].get(name) != job_hash:
+            stale_jobs.append((job, directory, name, job_hash))
+
+    count("plotting.figure_cache_hits", len(jobs) - len(stale_jobs))
+    if stale_jobs:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker,
+                                 initargs=(style,)) as executor:
+            list(executor.map(_render_projections_plot, [job for job, _, _, _ in stale_jobs]))
+
+    # the hashes are only recorded once all figures were written
+    for _, directory, name, job_hash in stale_jobs:
+        figure_hashes[directory][name] = job_hash
+    for directory, hashes in figure_hashes.items():
+        with open(os.path.join(directory, FIGURE_HASHES_FILE), "w") as file:
+            json.dump(hashes, file, indent=2, sort_keys=True)
+
+    return [job["save_path"] for job, _, _, _ in stale_jobs]
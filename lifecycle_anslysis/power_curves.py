@@ -0,0 +1,248 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.constants import OPEX_PER_YEAR, DRAM_WATTS_PER_256GB, SSD_WATTS, HDD_WATTS, HOURS_PER_YEAR, \
+    GCI_CONSTANTS
+
+DEFAULT_ADVISOR_EXPORTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "co2-footprint",
+                                       "parsed_data", "advisor_exports.csv")
+
+# table entries per percent of utilization, curves are exact at measured points on this grid
+DEFAULT_STEPS_PER_PERCENT = 10
+
+
+class PowerCurve:
+    """
+    Piecewise linear curve through measured (utilization in percent, value) points, precomputed into a dense table
+    over 0 - 100%. Beyond the first and last measured utilization the end segments are extended, a single point is a
+    constant. Evaluating the curve is a table lookup, independent of the number of measured points.
+    """
+
+    def __init__(self, utilizations, values, steps_per_percent=DEFAULT_STEPS_PER_PERCENT) -> None:
+        points = pd.DataFrame({"utilization": np.asarray(utilizations, dtype=np.float64).ravel(),
+                               "value": np.asarray(values, dtype=np.float64).ravel()})
+        if points.empty or points.isna().any(axis=None):
+            raise ValueError("A power curve needs at least one measured point and no missing values")
+        # repeated measurements at the same utilization are averaged
+        points = points.groupby("utilization")["value"].mean()
+
+        self.utilizations = points.index.to_numpy()
+        self.values = points.to_numpy()
+        self.steps_per_percent = steps_per_percent
+
+        grid = np.arange(100 * steps_per_percent + 1) / steps_per_percent
+        table = np.interp(grid, self.utilizations, self.values)
+        if len(self.utilizations) > 1:
+            for end, (first, second) in (("left", (0, 1)), ("right", (-1, -2))):
+                slope = (self.values[second] - self.values[first]) / (self.utilizations[second]
+                                                                      - self.utilizations[first])
+                outside = grid < self.utilizations[0] if end == "left" else grid > self.utilizations[-1]
+                table[outside] = self.values[first] + slope * (grid[outside] - self.utilizations[first])
+        self.table = table
+        # plain floats for scalar lookups, which are the common case in sweeps
+        self._table = table.tolist()
+        self._last = len(self._table) - 2
+        self._constant = float(self.values[0]) if len(self.values) == 1 else None
+
+    @classmethod
+    def constant(cls, value):
+        return cls([0], [value])
+
+    def __call__(self, utilization):
+        """
+        :param utilization: scalar or array in percent, clipped to 0 - 100
+        """
+        if isinstance(utilization, (int, float)):
+            if self._constant is not None:
+                return self._constant
+            position = min(max(utilization, 0), 100) * self.steps_per_percent
+            index = min(int(position), self._last)
+            fraction = position - index
+            return self._table[index] * (1 - fraction) + self._table[index + 1] * fraction
+
+        position = np.clip(np.asarray(utilization, dtype=np.float64), 0, 100) * self.steps_per_percent
+        index = np.minimum(position.astype(np.int64), self._last)
+        fraction = position - index
+        return (self.table[index] * (1 - fraction) + self.table[index + 1] * fraction)[()]
+
+    def slope(self, utilization):
+        """
+        :return: derivative per percent of utilization, of the table segment the utilization falls into
+        """
+        position = np.clip(np.asarray(utilization, dtype=np.float64), 0, 100) * self.steps_per_percent
+        index = np.minimum(position.astype(np.int64), self._last)
+        return ((self.table[index + 1] - self.table[index]) * self.steps_per_percent)[()]
+
+    def __repr__(self):
+        points = ", ".join(f"({u:g}, {v:g})" for u, v in zip(self.utilizations, self.values))
+        return f"PowerCurve([{points}])"
+
+
+def _installed(capacity, power):
+    # power of a drive if one is installed, without NumPy for the scalar capacities of a System
+    if isinstance(capacity, (int, float)):
+        return power if capacity > 0 else 0 * power
+    return np.where(np.greater(capacity, 0), power, 0)
+
+
+class ComponentPowerModel:
+    """
+    Power draw of a server as the sum of per-component curves over the utilization:
+
+    - cpu: fraction of the TDP
+    - dram: W per GB of DRAM
+    - ssd: W if an SSD is installed
+    - hdd: W if an HDD is installed
+    - platform: W per server independent of its configuration, e.g. fans, board and PSU losses, or the whole measured
+      power of a fixed server configuration
+
+    The total is multiplied by overhead, e.g. 1 + cooling watts per watt of the HPE power advisor.
+    """
+
+    def __init__(self, cpu: PowerCurve, dram: PowerCurve, ssd: PowerCurve, hdd: PowerCurve,
+                 platform: PowerCurve = None, overhead: float = 1.0) -> None:
+        self.cpu = cpu
+        self.dram = dram
+        self.ssd = ssd
+        self.hdd = hdd
+        self.platform = platform if platform is not None else PowerCurve.constant(0.0)
+        self.overhead = overhead
+
+    def component_power(self, cpu_tdp, dram_capacity, ssd_capacity, hdd_capacity, utilization):
+        """
+        :return: power draw of the cpu, dram, ssd, hdd and platform in W without the overhead, all arguments
+                 broadcast against each other
+        """
+        return (cpu_tdp * self.cpu(utilization), dram_capacity * self.dram(utilization),
+                _installed(ssd_capacity, self.ssd(utilization)), _installed(hdd_capacity, self.hdd(utilization)),
+                self.platform(utilization))
+
+    def total_power(self, cpu_tdp, dram_capacity, ssd_capacity, hdd_capacity, utilization):
+        """
+        :return: power draw in kW, see component_power
+        """
+        if isinstance(utilization, (int, float)) and isinstance(cpu_tdp, (int, float)):
+            # a single System, the common case in sweeps, without the tuple and array checks of component_power
+            power = cpu_tdp * self.cpu(utilization) + dram_capacity * self.dram(utilization) \
+                + self.platform(utilization)
+            if ssd_capacity > 0:
+                power += self.ssd(utilization)
+            if hdd_capacity > 0:
+                power += self.hdd(utilization)
+            return power * self.overhead / 1000
+
+        cpu, dram, ssd, hdd, platform = self.component_power(cpu_tdp, dram_capacity, ssd_capacity, hdd_capacity,
+                                                             utilization)
+        power = (cpu + dram + ssd + hdd + platform) * self.overhead / 1000
+        return power[()] if isinstance(power, np.ndarray) else power
+
+    def power(self, systems, utilization):
+        """
+        :param systems: System or SystemBatch
+        :param utilization: in percent, broadcast against the systems, e.g. utilization[:, np.newaxis] for a
+                            (utilizations, systems) grid
+        :return: power draw in kW
+        """
+        return self.total_power(systems.cpu_tdp, systems.dram_capacity, systems.ssd_capacity, systems.hdd_capacity,
+                                utilization)
+
+    def affine_coefficients(self, systems):
+        """
+        Power draw in kW as static + utilization * dynamic, exact for models whose curves are linear in the
+        utilization such as GUPTA_POWER_MODEL.
+
+        :return: static and dynamic power
+        """
+        static = self.power(systems, 0)
+        return static, (self.power(systems, 100) - static) / 100
+
+    def calculate_opex_emissions(self, systems, utilization, country: str = None, gci=None):
+        """
+        OPEX per year in kg CO2, see System.calculate_opex_emissions.
+
+        :param country: country in GCI_CONSTANTS, alternatively pass gci in kg CO2 per kWh
+        """
+        if (country is None) == (gci is None):
+            raise ValueError("Pass either country or gci")
+        gci = GCI_CONSTANTS[country] if gci is None else gci
+        return HOURS_PER_YEAR * self.power(systems, utilization) * gci
+
+
+# the Gupta model of System.calculate_opex_emissions: 50% of the TDP when idle to 100% at full load, constant DRAM,
+# SSD and HDD power. Source of the CPU curve: https://ieeexplore.ieee.org/document/4404806/?arnumber=4404806&tag=1,
+# see Fig 2
+GUPTA_POWER_MODEL = ComponentPowerModel(
+    cpu=PowerCurve([0, 100], [0.5, 1.0]),
+    dram=PowerCurve.constant(DRAM_WATTS_PER_256GB / 256),
+    ssd=PowerCurve.constant(SSD_WATTS),
+    hdd=PowerCurve.constant(HDD_WATTS),
+)
+
+
+def read_advisor_points(path=DEFAULT_ADVISOR_EXPORTS):
+    """
+    Measured power points of the HPE power advisor exports, one row per server configuration and utilization
+    including idle (0%) and max load (100%).
+
+    :param path: advisor_exports.csv written by co2-footprint/extract_numbers.py, or one of the per-server JSON files
+                 of the form {"<export file>": {<extracted values>}, ...}
+    :return: DataFrame with server_type, configuration (the max load input power in W), utilization in percent,
+             power in W without cooling and cooling_watts per watt
+    """
+    if path.endswith(".json"):
+        with open(path) as file:
+            exports = {name: values for name, values in json.load(file).items() if isinstance(values, dict)}
+        server_type = os.path.splitext(os.path.basename(path))[0]
+        exports = pd.DataFrame.from_dict(exports, orient="index").assign(server_type=server_type)
+    else:
+        exports = pd.read_csv(path)
+
+    exports = exports.rename(columns={"total_max_load_input_power": "configuration"})
+    keys = ["server_type", "configuration"]
+    measured = exports[keys + ["cooling_watts"]].assign(utilization=exports["utilization"] * 100,
+                                                        power=exports["power_hardware"])
+    idle = exports[keys + ["cooling_watts"]].assign(utilization=0.0, power=exports["total_idle_input_power"])
+    max_load = exports[keys + ["cooling_watts"]].assign(utilization=100.0, power=exports["configuration"])
+
+    points = pd.concat([idle, measured, max_load], ignore_index=True)
+    points = points.groupby(keys + ["utilization"], as_index=False).agg(power=("power", "mean"),
+                                                                       cooling_watts=("cooling_watts", "mean"))
+    return points[keys + ["utilization", "power", "cooling_watts"]]
+
+
+def advisor_power_models(path=DEFAULT_ADVISOR_EXPORTS, steps_per_percent=DEFAULT_STEPS_PER_PERCENT):
+    """
+    One ComponentPowerModel per measured server configuration: the whole measured power as platform curve, the
+    cooling as overhead and no per-component power, as the configuration is fixed.
+
+    :return: dict of (server_type, configuration) to model, see read_advisor_points
+    """
+    zero = PowerCurve.constant(0.0)
+    models = {}
+    for (server_type, configuration), points in read_advisor_points(path).groupby(["server_type", "configuration"]):
+        models[(server_type, configuration)] = ComponentPowerModel(
+            cpu=zero, dram=zero, ssd=zero, hdd=zero,
+            platform=PowerCurve(points["utilization"], points["power"], steps_per_percent),
+            overhead=1 + points["cooling_watts"].mean())
+    return models
+
+
+# one curve per country and system id in OPEX_PER_YEAR
+_hpe_power_advisor_curves = {}
+
+
+def hpe_power_advisor_opex_per_year(country: str, utilization, system_id: str):
+    """
+    OPEX per year in kg CO2 of the HPE power advisor results in OPEX_PER_YEAR at any utilization, interpolated
+    linearly between the measured utilizations and extrapolated beyond them. Equal to OPEX_PER_YEAR at the measured
+    utilizations.
+    """
+    curve = _hpe_power_advisor_curves.get((country, system_id))
+    if curve is None:
+        measured = OPEX_PER_YEAR[country]
+        curve = PowerCurve(list(measured), [measured[point][system_id] for point in measured])
+        _hpe_power_advisor_curves[(country, system_id)] = curve
+    return curve(utilization)
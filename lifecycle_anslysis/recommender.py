@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import compute_break_even
+from lifecycle_anslysis.constants import NEW_SYSTEM, OLD_SYSTEM, GUPTA_MODEL
+from lifecycle_anslysis.cpu_catalog import CpuCatalog
+from lifecycle_anslysis.system import System
+
+# ranking objectives
+BREAK_EVEN = "break_even"
+CO2_SAVED = "co2_saved"
+
+DOMINANCE_CHUNK_SIZE = 512
+
+
+def count_dominators(criteria, chunk_size=DOMINANCE_CHUNK_SIZE):
+    """
+    Number of rows dominating each row, i.e. at most as large in every criterion and smaller in at least one.
+
+    Rows are sorted by the first criterion, so a row is only compared against the prefix of rows that can dominate
+    it, one chunk of rows at a time (memory O(chunk_size * len(criteria))). Rows that are no worse in every criterion
+    are counted and identical rows, which do not dominate each other, are subtracted afterwards.
+
+    :param criteria: array of shape (n, d), smaller is better in every column
+    """
+    criteria = np.asarray(criteria, dtype=np.float64)
+    order = np.argsort(criteria[:, 0], kind="stable")
+    criteria = criteria[order]
+    first = criteria[:, 0]
+
+    _, inverse, duplicates = np.unique(criteria, axis=0, return_inverse=True, return_counts=True)
+
+    counts = np.zeros(len(criteria), dtype=np.int64)
+    for start in range(0, len(criteria), chunk_size):
+        chunk = criteria[start:start + chunk_size]
+        prefix = np.searchsorted(first, chunk[-1, 0], side="right")
+
+        no_worse = first[np.newaxis, :prefix] <= chunk[:, 0, np.newaxis]
+        for column in range(1, criteria.shape[1]):
+            no_worse &= criteria[np.newaxis, :prefix, column] <= chunk[:, column, np.newaxis]
+        counts[start:start + chunk_size] = no_worse.sum(axis=1)
+
+    counts -= duplicates[inverse.ravel()]
+
+    result = np.empty_like(counts)
+    result[order] = counts
+    return result
+
+
+class ReplacementRecommender:
+    """
+    Ranks the CPUs of a catalog as replacements for an existing system, see generate_systems_comparison.
+
+    With the storage configuration fixed for all candidates, the emissions of a candidate after t years are
+    capex(die_size) + old.performance_indicator * opex(cpu_tdp) / performance_indicator * t, both terms increasing in
+    die_size, cpu_tdp / performance_indicator and 1 / performance_indicator (DRAM and storage draw power independent
+    of the TDP). A candidate that is no better than another one in all three (it is dominated) therefore has a
+    break-even time and CO2 savings that are no better, for every country, utilization and year. Only the k-skyband,
+    the candidates dominated by fewer than k others, can be among the top k, the rest is never evaluated. The
+    dominance counts are computed once per catalog, a query costs O(size of the skyband).
+    """
+
+    def __init__(self, catalog: CpuCatalog, performance_column: str, lifetime: int, dram_capacity: int,
+                 ssd_capacity: int, hdd_capacity: int, rows=None) -> None:
+        rows = np.arange(len(catalog)) if rows is None else np.asarray(rows)
+        performance = catalog.columns[performance_column][rows]
+        die_size = catalog.die_size(rows)
+        tdp = catalog.tdp[rows]
+        valid = (performance > 0) & np.isfinite(performance) & np.isfinite(die_size) & np.isfinite(tdp)
+
+        self.catalog = catalog
+        self.rows = rows[valid]
+        self.candidates = catalog.system_batch(self.rows, performance_column, lifetime, dram_capacity, ssd_capacity,
+                                               hdd_capacity)
+
+        # Pareto index over (performance / TDP, embodied carbon), plus the performance itself
+        criteria = np.column_stack([1 / self.candidates.performance_indicator,
+                                    self.candidates.cpu_tdp / self.candidates.performance_indicator,
+                                    self.candidates.packaging_size])
+        self.dominator_counts = count_dominators(criteria)
+
+    def skyband(self, k):
+        """
+        Candidates (positions in self.rows) that can be among the top k, the Pareto frontier for k = 1.
+        """
+        return np.flatnonzero(self.dominator_counts < k)
+
+    def recommend(self, current_system: System, k: int, country: str, utilization: int,
+                  opex_calculation: str = GUPTA_MODEL, objective: str = BREAK_EVEN, year: int = None):
+        """
+        :param objective: BREAK_EVEN (shortest first) or CO2_SAVED (most saved after year years first)
+        :param year: years after which the CO2 savings are compared, defaults to current_system.lifetime
+        :return: DataFrame with the k best candidates, their break-even time in years (np.inf if never) and the
+                 CO2 in kg saved after year years
+        """
+        if objective not in (BREAK_EVEN, CO2_SAVED):
+            raise ValueError(f"Unknown objective '{objective}'")
+        year = current_system.lifetime if year is None else year
+
+        evaluated = self.skyband(k)
+        candidates = self.candidates.take(evaluated)
+
+        performance_factor = current_system.performance_indicator / candidates.performance_indicator
+        capex = candidates.calculate_capex_emissions()
+        new_system_opex_per_year = candidates.calculate_opex_per_year(
+            NEW_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+        old_system_opex_per_year = current_system.calculate_opex_per_year(
+            OLD_SYSTEM, country=country, utilization=utilization, opex_calculation=opex_calculation)
+
+        break_even = compute_break_even(capex, new_system_opex_per_year, old_system_opex_per_year, performance_factor)
+        co2_saved = old_system_opex_per_year * year - (capex + performance_factor * new_system_opex_per_year * year)
+
+        if objective == BREAK_EVEN:
+            order = np.lexsort((-co2_saved, break_even))
+        else:
+            order = np.lexsort((break_even, -co2_saved))
+        best = order[:k]
+        rows = self.rows[evaluated[best]]
+
+        return pd.DataFrame({
+            "processor_number": self.catalog.processor_number[rows],
+            "name": self.catalog.name[rows],
+            BREAK_EVEN: break_even[best],
+            CO2_SAVED: co2_saved[best],
+        })
@@ -0,0 +1,187 @@
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.cpu_catalog import CpuCatalog, normalize_processor_number
+from lifecycle_anslysis.instrumentation import count, span, traced
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# spec.org result exports, see notebooks/spec.ipynb
+SPEC_COLUMNS = ["Benchmark", "Processor ", "# Chips", "Result", "HW Avail"]
+# SPEC CPU2017 integer results are scaled by 9 to be comparable to CPU2006
+SPEC_2017_SCALE = 9
+
+# tpc.org TPC-H result exports, text columns are space-padded to a fixed width
+TPCH_COLUMNS = ["CPU Type", "# CPU's", "Scale Factor", "QphH"]
+
+# benchmark names in performance_indicator_table
+SPEC_INT = "spec_int"
+TPCH = "tpch"
+
+# e.g. "Intel Xeon X5690 Hex-Core - 3.46 GHz", "Intel Xeon Platinum 8180 2.50GHz", "Intel Xeon X3000 MP - 3.0 GHz"
+_TPCH_CPU_DECORATIONS = re.compile(
+    r"(\s+-)?\s+\d+(\.\d+)?\s*[GM]Hz\b|\b(Dual|Quad|Hex|Six|Eight|Octa|Ten|Twelve)-Core\b", re.IGNORECASE)
+
+
+def normalize_spec_processor(names):
+    """
+    Trims SPEC processor names and collapses whitespace, so spellings differing only in padding are one processor.
+    """
+    return names.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+def normalize_tpch_cpu_type(cpu_types):
+    """
+    Strips the padding, clock rate and core count from TPC-H CPU types, e.g. "Intel Xeon X5690 Hex-Core - 3.46 GHz"
+    becomes "Intel Xeon X5690".
+    """
+    cpu_types = cpu_types.astype("string").str.replace(_TPCH_CPU_DECORATIONS, "", regex=True)
+    return cpu_types.str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+class OnlineMedians:
+    """
+    Counts and exact medians of values per key over a stream of chunks. Only the values themselves are kept, 8 bytes
+    per row, so a result dump never has to be loaded as a whole.
+    """
+
+    def __init__(self) -> None:
+        self._values = {}
+
+    def update(self, keys, values):
+        """
+        :param keys: Index, MultiIndex or Series with one key per value, rows with a missing key or value are ignored
+        """
+        keys = pd.Index(keys) if not isinstance(keys, pd.Index) else keys
+        values = np.asarray(values, dtype=np.float64)
+        codes, uniques = pd.factorize(keys)
+        valid = (codes >= 0) & ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+
+        order = np.argsort(codes, kind="stable")
+        groups = np.split(values[order], np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1])
+        for key, group in zip(uniques, groups):
+            if len(group):
+                self._values.setdefault(key, []).append(group)
+
+    def __len__(self):
+        return len(self._values)
+
+    def counts(self):
+        return {key: sum(len(group) for group in groups) for key, groups in self._values.items()}
+
+    def to_frame(self, index_names=None):
+        """
+        :return: DataFrame with the count and median of every key
+        """
+        keys = list(self._values)
+        medians = [float(np.median(np.concatenate(self._values[key]))) for key in keys]
+        counts = self.counts()
+        index = pd.MultiIndex.from_tuples(keys, names=index_names) if keys and isinstance(keys[0], tuple) \
+            else pd.Index(keys, name=index_names[0] if index_names else None)
+        return pd.DataFrame({"count": [counts[key] for key in keys], "median": medians}, index=index).sort_index()
+
+
+def _normalize_unique(values, normalize):
+    # dumps repeat few distinct names, so only those are normalized
+    codes, uniques = pd.factorize(values)
+    normalized = normalize(pd.Series(uniques, dtype="string")).to_numpy(dtype=object)
+    return pd.Index(np.where(codes >= 0, normalized[codes], None), dtype="string")
+
+
+def _read_chunks(path, columns, chunk_size):
+    with span("csv.read", path=path):
+        for chunk in pd.read_csv(path, usecols=columns, index_col=False, chunksize=chunk_size):
+            count("csv.rows_parsed", len(chunk))
+            yield chunk
+
+
+@traced("result_ingestion.ingest_spec_results")
+def ingest_spec_results(paths, processor_pattern=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    SPEC CPU integer result per chip (CPU2017 scaled to CPU2006) of every processor, see notebooks/spec.ipynb.
+    Results without hardware availability date or with a result of 0 are skipped.
+
+    :param processor_pattern: regex, only processors matching it (case-insensitive) are kept
+    :return: OnlineMedians keyed by the normalized processor name
+    """
+    medians = OnlineMedians()
+    for path in paths:
+        for chunk in _read_chunks(path, SPEC_COLUMNS, chunk_size):
+            processors = _normalize_unique(chunk["Processor "], normalize_spec_processor)
+            benchmark_codes, benchmarks = pd.factorize(chunk["Benchmark"])
+            is_2017 = np.append(pd.Index(benchmarks, dtype="string").str.contains("2017").fillna(False), False)
+            perf = chunk["Result"].to_numpy(dtype=np.float64) * np.where(is_2017[benchmark_codes], SPEC_2017_SCALE, 1)
+
+            keep = chunk["HW Avail"].notna().to_numpy() & (perf != 0)
+            if processor_pattern is not None:
+                processor_codes, uniques = pd.factorize(processors)
+                matches = np.append(pd.Index(uniques, dtype="string").str.contains(processor_pattern, case=False)
+                                    .fillna(False).to_numpy(dtype=bool), False)
+                keep &= matches[processor_codes]
+            medians.update(processors[keep], perf[keep] / chunk["# Chips"].to_numpy(dtype=np.float64)[keep])
+    return medians
+
+
+@traced("result_ingestion.ingest_tpch_results")
+def ingest_tpch_results(paths, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    TPC-H QphH per CPU of every processor and scale factor, results of different scale factors are not comparable.
+
+    :return: OnlineMedians keyed by (normalized CPU type, scale factor)
+    """
+    medians = OnlineMedians()
+    for path in paths:
+        for chunk in _read_chunks(path, TPCH_COLUMNS, chunk_size):
+            keys = pd.MultiIndex.from_arrays([_normalize_unique(chunk["CPU Type"], normalize_tpch_cpu_type),
+                                              chunk["Scale Factor"]])
+            medians.update(keys, chunk["QphH"].to_numpy(dtype=np.float64)
+                           / chunk["# CPU's"].to_numpy(dtype=np.float64))
+    return medians
+
+
+def performance_indicator_table(spec_medians=None, tpch_medians=None, catalog: CpuCatalog = None):
+    """
+    One row per processor and benchmark (SPEC_INT, or TPCH with the scale factor, e.g. "tpch_sf1000") with the
+    median result to be used as System.performance_indicator and the number of results it is based on. With a
+    catalog, only processors in the catalog are kept.
+    """
+    frames = []
+    if spec_medians is not None and len(spec_medians):
+        spec = spec_medians.to_frame(["name"]).reset_index()
+        spec["benchmark"] = SPEC_INT
+        frames.append(spec)
+    if tpch_medians is not None and len(tpch_medians):
+        tpch = tpch_medians.to_frame(["name", "scale_factor"]).reset_index()
+        tpch["benchmark"] = TPCH + "_sf" + tpch.pop("scale_factor").astype(int).astype(str)
+        frames.append(tpch)
+
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["name", "count", "median", "benchmark"])
+    table.insert(0, "processor_number", table["name"].astype(str).map(normalize_processor_number))
+    table = table.rename(columns={"median": "performance_indicator"})
+    table = table[["processor_number", "name", "benchmark", "count", "performance_indicator"]]
+
+    if catalog is not None:
+        table = table[table["processor_number"].isin(catalog.by_processor_number)]
+    return table.sort_values(["processor_number", "benchmark"], ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Median SPEC CPU and TPC-H results per processor.")
+    parser.add_argument("--spec", nargs="*", default=[], help="spec.org CPU2006/CPU2017 integer result exports")
+    parser.add_argument("--tpch", nargs="*", default=[], help="tpc.org TPC-H result exports")
+    parser.add_argument("--all", action="store_true", help="keep processors missing in the CPU catalog")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", default="performance_indicators.csv")
+    args = parser.parse_args()
+
+    performance_indicators = performance_indicator_table(
+        ingest_spec_results(args.spec, chunk_size=args.chunk_size) if args.spec else None,
+        ingest_tpch_results(args.tpch, chunk_size=args.chunk_size) if args.tpch else None,
+        None if args.all else CpuCatalog.load())
+    performance_indicators.to_csv(args.output, index=False)
+    print(f"{len(performance_indicators)} performance indicators written to {args.output}")
@@ -1,9 +1,9 @@
 import os
+import sys
 
-from lifecycle_anslysis.comparison import generate_systems_comparison
-from lifecycle_anslysis.constants import GERMANY, SWEDEN, GUPTA_MODEL
-from lifecycle_anslysis.plotting import create_projections_plot
-from lifecycle_anslysis.system import System
+from lifecycle_anslysis.instrumentation import span
+from lifecycle_anslysis.plotting import render_projections_plots
+from lifecycle_anslysis.sweep import PAPER_SCENARIOS, load_scenario, run_sweep, select_comparisons
 
 # assumptions
 time_horizon = 20
@@ -12,50 +12,26 @@ time_horizon = 20
 # Systems
 ##############################
 
-# shared specs
-lifetime = 20
-dram_capacity = 8 * 64
-ssd_capacity = 2 * 1600
-hdd_capacity = 0
-
-# Intel Xeon E7-4880, release 2014
-old_system = System(
-    die_size=541 / 100,  # cm^2,
-    performance_indicator=1,  # own measurements Section 2 new system sorts 3.55 times more tuples per second
-    cpu_tdp=130,
-    lifetime=lifetime,
-    dram_capacity=dram_capacity,
-    ssd_capacity=ssd_capacity,
-    hdd_capacity=hdd_capacity
-)
-
-# Intel Platinum 8480CL, release 2023
-new_system = System(
-    die_size=(4 * 477) / 100,  # cm^2,
-    performance_indicator=3.55,  # own measurements Section 2 new system sorts 3.55 times more tuples per second
-    cpu_tdp=350,
-    lifetime=lifetime,
-    dram_capacity=dram_capacity,
-    ssd_capacity=ssd_capacity,
-    hdd_capacity=hdd_capacity
-)
+# comparison sorting_intel in paper_scenarios.json, all systems with 8 * 64 GB DRAM, 2 * 1600 GB SSD and a lifetime
+# of 20 years
+# - old: Intel Xeon E7-4880, release 2014
+# - new: Intel Platinum 8480CL, release 2023
+# performance indicators from own measurements in Section 2, the new system sorts 3.55 times more tuples per second
 
 if __name__ == '__main__':
+    scenario = select_comparisons(load_scenario(PAPER_SCENARIOS), ["sorting_intel"], time_horizons=[time_horizon])
+    results = run_sweep(scenario)
+
     # plot comparison plots
     save_root_path = "./plots"
     os.makedirs(save_root_path, exist_ok=True)
-    for country in [GERMANY, SWEDEN]:
-        for utilization in [30, 60, 90]:
-            save_path = os.path.join(save_root_path, f"country-{country}-utilization-{utilization}-workload-sorting")
-
-            new_system_opex, old_system_opex, abs_savings, relative_savings, ratio = \
-                generate_systems_comparison(
-                    new_system=new_system,
-                    old_system=old_system,
-                    time_horizon=time_horizon,
-                    country=country,
-                    utilization=utilization,
-                    opex_calculation=GUPTA_MODEL)
-
-            fig_size = (10, 5)
-            create_projections_plot(new_system_opex, old_system_opex, ratio, save_path, step_size=2, fig_size=fig_size)
+    plot_jobs = []
+    for (country, utilization, opex_calculation), cell in results.groupby(["country", "utilization",
+                                                                           "opex_calculation"], sort=False):
+        save_path = os.path.join(save_root_path, f"country-{country}-utilization-{utilization}-workload-sorting")
+        plot_jobs.append(dict(system_a_projected_emissions=cell["new_system_opex"].to_numpy(),
+                              system_b_projected_emissions=cell["old_system_opex"].to_numpy(),
+                              ratio=cell["ratio"].to_numpy(), save_path=save_path, step_size=2, fig_size=(10, 5)))
+
+    with span("sorting_intel.render"):
+        render_projections_plots(plot_jobs, draft="--draft" in sys.argv)
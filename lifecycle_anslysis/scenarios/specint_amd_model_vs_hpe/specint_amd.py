@@ -1,9 +1,10 @@
 import os
+import sys
 
-from lifecycle_anslysis.comparison import generate_systems_comparison
-from lifecycle_anslysis.constants import GERMANY, SWEDEN, HPE_POWER_ADVISOR, GUPTA_MODEL
-from lifecycle_anslysis.plotting import create_projections_plot
-from lifecycle_anslysis.system import System
+from lifecycle_anslysis.constants import HPE_POWER_ADVISOR
+from lifecycle_anslysis.instrumentation import span
+from lifecycle_anslysis.plotting import render_projections_plots
+from lifecycle_anslysis.sweep import PAPER_SCENARIOS, load_scenario, run_sweep, select_comparisons
 
 # assumptions
 time_horizon = 10
@@ -12,65 +13,28 @@ time_horizon = 10
 # Systems
 ##############################
 
-# shared specs
-lifetime = 10
-dram_capacity = 8 * 64
-ssd_capacity = 2 * 1600
-hdd_capacity = 0
-
-# AMD EPYC 7502P, 2.5GHz
-old_system = System(
-    # cm^2; # Die size from: https://www.techpowerup.com/cpu-specs/epyc-7502p.c2260
-    die_size=74 / 100,
-    # according to https://www.spec.org/cpu2006/results/ and https://www.spec.org/cpu2017/results/
-    performance_indicator=285.44,
-    cpu_tdp=180,
-    lifetime=lifetime,
-    dram_capacity=dram_capacity,
-    ssd_capacity=ssd_capacity,
-    hdd_capacity=hdd_capacity,
-)
-
-# AMD 9334, 2.7 GHz
-new_system = System(
-    die_size=4 * 72 / 100,  # cm^2,
-    # according to https://www.spec.org/cpu2006/results/ and https://www.spec.org/cpu2017/results/
-    performance_indicator=470.4,
-    cpu_tdp=210,
-    lifetime=lifetime,
-    dram_capacity=dram_capacity,
-    ssd_capacity=ssd_capacity,
-    hdd_capacity=hdd_capacity,
-)
+# comparison specint_amd in paper_scenarios.json, all systems with 8 * 64 GB DRAM, 2 * 1600 GB SSD and a lifetime of
+# 10 years
+# - old: AMD EPYC 7502P, 2.5GHz, die size from https://www.techpowerup.com/cpu-specs/epyc-7502p.c2260
+# - new: AMD 9334, 2.7 GHz
+# performance indicators according to https://www.spec.org/cpu2006/results/ and https://www.spec.org/cpu2017/results/
 
 if __name__ == '__main__':
+    scenario = select_comparisons(load_scenario(PAPER_SCENARIOS), ["specint_amd"], time_horizons=[time_horizon])
+    results = run_sweep(scenario)
+
     # plot comparison plots
     save_root_path = "./plots"
     os.makedirs(save_root_path, exist_ok=True)
-    for country in [GERMANY, SWEDEN]:
-        for utilization in [30, 60, 90]:
-            fig_size = (10, 5)
-
-            save_path = os.path.join(save_root_path,
-                                     f"HPE-country-{country}-utilization-{utilization}-workload-specint")
-            hpe_new_system_opex, hpe_old_system_opex, hpe_abs_savings, hpe_relative_savings, hpe_ratio = \
-                generate_systems_comparison(
-                    new_system=new_system,
-                    old_system=old_system,
-                    time_horizon=time_horizon,
-                    country=country,
-                    utilization=utilization,
-                    opex_calculation=HPE_POWER_ADVISOR)
-            create_projections_plot(hpe_new_system_opex, hpe_old_system_opex, hpe_ratio, save_path, fig_size=fig_size)
-
-            save_path = os.path.join("./plots", f"MODEL-country-{country}-utilization-{utilization}-workload-specint")
-            model_new_system_opex, model_old_system_opex, model_abs_savings, model_relative_savings, model_ratio = \
-                generate_systems_comparison(
-                    new_system=new_system,
-                    old_system=old_system,
-                    time_horizon=time_horizon,
-                    country=country,
-                    utilization=utilization,
-                    opex_calculation=GUPTA_MODEL)
-            create_projections_plot(model_new_system_opex, model_old_system_opex, model_ratio, save_path,
-                                    fig_size=fig_size)
+    plot_jobs = []
+    for (country, utilization, opex_calculation), cell in results.groupby(["country", "utilization",
+                                                                           "opex_calculation"], sort=False):
+        model = "HPE" if opex_calculation == HPE_POWER_ADVISOR else "MODEL"
+        save_path = os.path.join(save_root_path,
+                                 f"{model}-country-{country}-utilization-{utilization}-workload-specint")
+        plot_jobs.append(dict(system_a_projected_emissions=cell["new_system_opex"].to_numpy(),
+                              system_b_projected_emissions=cell["old_system_opex"].to_numpy(),
+                              ratio=cell["ratio"].to_numpy(), save_path=save_path, fig_size=(10, 5)))
+
+    with span("specint_amd.render"):
+        render_projections_plots(plot_jobs, draft="--draft" in sys.argv)
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis import constants
+from lifecycle_anslysis.constants import NEW_SYSTEM, OLD_SYSTEM, GCI_CONSTANTS
+from lifecycle_anslysis.power_curves import GUPTA_POWER_MODEL
+from lifecycle_anslysis.system import System, SystemBatch
+
+# System constructor arguments, in the order of SystemBatch's columns
+SYSTEM_FIELDS = ["die_size", "performance_indicator", "lifetime", "dram_capacity", "ssd_capacity", "hdd_capacity",
+                 "cpu_tdp"]
+MODEL_CONSTANTS = ["CI_FAB", "EPA", "GPA", "MPA", "FAB_YIELD", "E_DRAM", "E_SSD", "E_HDD", "DRAM_WATTS_PER_256GB",
+                   "SSD_WATTS", "HDD_WATTS", "HOURS_PER_YEAR"]
+PARAMETERS = [f"{system_id}.{field}" for system_id in (NEW_SYSTEM, OLD_SYSTEM) for field in SYSTEM_FIELDS] \
+    + ["utilization", "gci", "time_horizon"] + MODEL_CONSTANTS
+
+BREAK_EVEN = "break_even"
+CUMULATIVE_SAVINGS = "cumulative_savings"
+
+
+def _as_batch(systems):
+    return SystemBatch.from_systems([systems]) if isinstance(systems, System) else systems
+
+
+def _grid_carbon_intensity(country):
+    if isinstance(country, str):
+        return GCI_CONSTANTS[country]
+    return np.array([GCI_CONSTANTS[name] for name in country], dtype=np.float64)
+
+
+def calculate_sensitivities(new_systems, old_systems, utilization, country=None, time_horizon=10, gci=None):
+    """
+    Exact partial derivatives and elasticities of the break-even time and of the CO2 saved after time_horizon years
+    (old OPEX - new CAPEX - performance_factor * new OPEX, see generate_systems_comparison) with the Gupta OPEX model.
+
+    With the CAPEX C of the new system and the OPEX saved per year s, the break-even time is T = C / s and the
+    cumulative savings are S = s * t - C. Both C and s are closed-form in every parameter, so
+    dT/dx = (dC/dx - T * ds/dx) / s and dS/dx = t * ds/dx - dC/dx. Elasticities are dX/dx * x / X, the relative change
+    of X per relative change of x. The SSD and HDD power only depend on whether a drive is installed, their capacity
+    only enters the CAPEX. The lifetime does not enter either quantity. Derivatives of the break-even time are NaN
+    where the new system never breaks even.
+
+    All arguments broadcast against each other, so whole catalogs are evaluated at once.
+
+    :param new_systems: System or SystemBatch
+    :param old_systems: System or SystemBatch
+    :param country: country in GCI_CONSTANTS or a sequence of them, alternatively pass gci in kg CO2 per kWh
+    :return: DataFrame with one row per point and parameter in PARAMETERS: the parameter value, the break-even time
+             and cumulative savings, their derivatives d_<quantity> and elasticities <quantity>_elasticity
+    """
+    if (country is None) == (gci is None):
+        raise ValueError("Pass either country or gci")
+    gci = _grid_carbon_intensity(country) if gci is None else gci
+    new, old = _as_batch(new_systems), _as_batch(old_systems)
+
+    c = {name: getattr(constants, name) for name in MODEL_CONSTANTS}
+    (new_die, new_performance, new_lifetime, new_dram, new_ssd, new_hdd, new_tdp,
+     old_die, old_performance, old_lifetime, old_dram, old_ssd, old_hdd, old_tdp,
+     utilization, gci, time_horizon) = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in (
+        new.packaging_size, new.performance_indicator, new.lifetime, new.dram_capacity, new.ssd_capacity,
+        new.hdd_capacity, new.cpu_tdp, old.packaging_size, old.performance_indicator, old.lifetime,
+        old.dram_capacity, old.ssd_capacity, old.hdd_capacity, old.cpu_tdp, utilization, gci, time_horizon)])
+    zero = np.zeros_like(new_die)
+
+    # CAPEX of the new system, see System.calculate_capex_emissions
+    carbon_per_area = c["CI_FAB"] * c["EPA"] + c["GPA"] + c["MPA"]
+    capex = carbon_per_area * new_die / c["FAB_YIELD"] + new_dram * c["E_DRAM"] + new_ssd * c["E_SSD"] \
+        + new_hdd * c["E_HDD"]
+
+    # power in kW and OPEX per year, see System.calculate_opex_emissions. The component powers are spelled out with
+    # the constants in c, as the constants are inputs of the analysis as well.
+    normalized_power_usage = GUPTA_POWER_MODEL.cpu(utilization)
+    normalized_power_slope = GUPTA_POWER_MODEL.cpu.slope(utilization)
+    new_ssd_installed, old_ssd_installed = (new_ssd > 0).astype(np.float64), (old_ssd > 0).astype(np.float64)
+    new_hdd_installed, old_hdd_installed = (new_hdd > 0).astype(np.float64), (old_hdd > 0).astype(np.float64)
+
+    def power(tdp, dram, ssd_installed, hdd_installed):
+        return (tdp * normalized_power_usage + dram / 256 * c["DRAM_WATTS_PER_256GB"]
+                + ssd_installed * c["SSD_WATTS"] + hdd_installed * c["HDD_WATTS"]) / 1000
+
+    new_power = power(new_tdp, new_dram, new_ssd_installed, new_hdd_installed)
+    old_power = power(old_tdp, old_dram, old_ssd_installed, old_hdd_installed)
+    performance_factor = old_performance / new_performance
+    energy_to_co2 = c["HOURS_PER_YEAR"] * gci
+    savings_per_year = energy_to_co2 * (old_power - performance_factor * new_power)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        break_even = np.where(savings_per_year > 0, capex / savings_per_year, np.inf)
+    cumulative_savings = savings_per_year * time_horizon - capex
+
+    values = {
+        f"{NEW_SYSTEM}.die_size": new_die, f"{NEW_SYSTEM}.performance_indicator": new_performance,
+        f"{NEW_SYSTEM}.lifetime": new_lifetime, f"{NEW_SYSTEM}.dram_capacity": new_dram,
+        f"{NEW_SYSTEM}.ssd_capacity": new_ssd, f"{NEW_SYSTEM}.hdd_capacity": new_hdd, f"{NEW_SYSTEM}.cpu_tdp": new_tdp,
+        f"{OLD_SYSTEM}.die_size": old_die, f"{OLD_SYSTEM}.performance_indicator": old_performance,
+        f"{OLD_SYSTEM}.lifetime": old_lifetime, f"{OLD_SYSTEM}.dram_capacity": old_dram,
+        f"{OLD_SYSTEM}.ssd_capacity": old_ssd, f"{OLD_SYSTEM}.hdd_capacity": old_hdd, f"{OLD_SYSTEM}.cpu_tdp": old_tdp,
+        "utilization": utilization, "gci": gci, "time_horizon": time_horizon,
+        **{name: zero + value for name, value in c.items()},
+    }
+
+    d_capex = {
+        f"{NEW_SYSTEM}.die_size": carbon_per_area / c["FAB_YIELD"],
+        f"{NEW_SYSTEM}.dram_capacity": c["E_DRAM"],
+        f"{NEW_SYSTEM}.ssd_capacity": c["E_SSD"],
+        f"{NEW_SYSTEM}.hdd_capacity": c["E_HDD"],
+        "CI_FAB": c["EPA"] * new_die / c["FAB_YIELD"],
+        "EPA": c["CI_FAB"] * new_die / c["FAB_YIELD"],
+        "GPA": new_die / c["FAB_YIELD"],
+        "MPA": new_die / c["FAB_YIELD"],
+        "FAB_YIELD": -carbon_per_area * new_die / c["FAB_YIELD"] ** 2,
+        "E_DRAM": new_dram,
+        "E_SSD": new_ssd,
+        "E_HDD": new_hdd,
+    }
+
+    d_savings_per_year = {
+        f"{NEW_SYSTEM}.performance_indicator": energy_to_co2 * new_power * old_performance / new_performance ** 2,
+        f"{NEW_SYSTEM}.dram_capacity": -energy_to_co2 * performance_factor * c["DRAM_WATTS_PER_256GB"] / 256 / 1000,
+        f"{NEW_SYSTEM}.cpu_tdp": -energy_to_co2 * performance_factor * normalized_power_usage / 1000,
+        f"{OLD_SYSTEM}.performance_indicator": -energy_to_co2 * new_power / new_performance,
+        f"{OLD_SYSTEM}.dram_capacity": energy_to_co2 * c["DRAM_WATTS_PER_256GB"] / 256 / 1000,
+        f"{OLD_SYSTEM}.cpu_tdp": energy_to_co2 * normalized_power_usage / 1000,
+        "utilization": energy_to_co2 * (old_tdp - performance_factor * new_tdp) * normalized_power_slope / 1000,
+        "gci": c["HOURS_PER_YEAR"] * (old_power - performance_factor * new_power),
+        "DRAM_WATTS_PER_256GB": energy_to_co2 * (old_dram - performance_factor * new_dram) / 256 / 1000,
+        "SSD_WATTS": energy_to_co2 * (old_ssd_installed - performance_factor * new_ssd_installed) / 1000,
+        "HDD_WATTS": energy_to_co2 * (old_hdd_installed - performance_factor * new_hdd_installed) / 1000,
+        "HOURS_PER_YEAR": gci * (old_power - performance_factor * new_power),
+    }
+
+    n_points = len(new_die)
+    frames = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        breaks_even = np.isfinite(break_even)
+        for parameter in PARAMETERS:
+            capex_derivative = zero + d_capex.get(parameter, 0.0)
+            savings_per_year_derivative = zero + d_savings_per_year.get(parameter, 0.0)
+
+            d_break_even = np.where(breaks_even, (capex_derivative - break_even * savings_per_year_derivative)
+                                    / savings_per_year, np.nan)
+            d_cumulative_savings = time_horizon * savings_per_year_derivative - capex_derivative
+            if parameter == "time_horizon":
+                d_cumulative_savings = savings_per_year
+
+            value = values[parameter]
+            frames.append(pd.DataFrame({
+                "point": np.arange(n_points),
+                "parameter": parameter,
+                "value": value,
+                BREAK_EVEN: break_even,
+                f"d_{BREAK_EVEN}": d_break_even,
+                f"{BREAK_EVEN}_elasticity": np.where(d_break_even == 0, 0.0, d_break_even * value / break_even),
+                CUMULATIVE_SAVINGS: cumulative_savings,
+                f"d_{CUMULATIVE_SAVINGS}": d_cumulative_savings,
+                f"{CUMULATIVE_SAVINGS}_elasticity": np.where(d_cumulative_savings == 0, 0.0,
+                                                             d_cumulative_savings * value / cumulative_savings),
+            }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def rank_parameters(sensitivities, quantity=BREAK_EVEN):
+    """
+    Tornado chart data: the median absolute elasticity of quantity per parameter over all points, largest first.
+    Parameters the quantity does not depend on are dropped.
+    """
+    elasticity = sensitivities[f"{quantity}_elasticity"].abs()
+    ranking = elasticity.groupby(sensitivities["parameter"]).median().dropna()
+    return ranking[ranking > 0].sort_values(ascending=False)
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import json
+import math
+from functools import lru_cache
+
+from lifecycle_anslysis.comparison import generate_systems_comparison, compute_systems_break_even
+from lifecycle_anslysis.constants import GUPTA_MODEL
+from lifecycle_anslysis.system import System
+
+SYSTEM_FIELDS = ("die_size", "performance_indicator", "lifetime", "dram_capacity", "ssd_capacity", "hdd_capacity",
+                 "cpu_tdp")
+# fields that have to be positive, the others have to be non-negative
+POSITIVE_FIELDS = ("performance_indicator", "lifetime")
+DEFAULT_CACHE_SIZE = 65536
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# a comparison allocates arrays of time_horizon years, a batch computes up to MAX_BATCH_SIZE comparisons
+MAX_TIME_HORIZON = 100
+MAX_BATCH_SIZE = 10000
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _number(value):
+    # 4 and 4.0 are the same input, so both map to one cache entry
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{value} is not a finite number")
+    return int(value) if value.is_integer() else value
+
+
+def normalize_comparison(request):
+    """
+    Turns a comparison request into a hashable cache key. Missing storage capacities default to 0 and the
+    opex_calculation defaults to the Gupta model.
+
+    :return: (new_system, old_system, time_horizon, country, utilization, opex_calculation) with the systems as
+             tuples in SYSTEM_FIELDS order
+    """
+    try:
+        systems = []
+        for key in ("new_system", "old_system"):
+            system = request[key]
+            unknown = set(system) - set(SYSTEM_FIELDS)
+            if unknown:
+                raise ValueError(f"unknown fields {sorted(unknown)} in {key}")
+            values = tuple(_number(system.get(field, 0) if field.endswith("_capacity") else system[field])
+                           for field in SYSTEM_FIELDS)
+            for field, value in zip(SYSTEM_FIELDS, values):
+                if field in POSITIVE_FIELDS and value <= 0:
+                    raise ValueError(f"{key}.{field} has to be positive")
+                if value < 0:
+                    raise ValueError(f"{key}.{field} has to be non-negative")
+            systems.append(values)
+
+        time_horizon = _number(request["time_horizon"])
+        if not isinstance(time_horizon, int) or not 1 <= time_horizon <= MAX_TIME_HORIZON:
+            raise ValueError(f"time_horizon has to be a whole number of years between 1 and {MAX_TIME_HORIZON}")
+        utilization = _number(request["utilization"])
+        if not 0 <= utilization <= 100:
+            raise ValueError("utilization has to be between 0 and 100")
+
+        return (systems[0], systems[1], time_horizon, str(request["country"]).lower(), utilization,
+                str(request.get("opex_calculation", GUPTA_MODEL)).lower())
+    except KeyError as e:
+        raise RequestError(400, f"missing field {e}")
+    except (TypeError, ValueError, AttributeError) as e:
+        raise RequestError(400, f"invalid comparison: {e}")
+
+
+def _json_float(value):
+    # JSON has no infinity, a break-even that is never reached is returned as null
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def compare(new_system, old_system, time_horizon, country, utilization, opex_calculation):
+    """
+    Runs generate_systems_comparison for one normalized request, see normalize_comparison.
+    """
+    new_system = System(**dict(zip(SYSTEM_FIELDS, new_system)))
+    old_system = System(**dict(zip(SYSTEM_FIELDS, old_system)))
+
+    try:
+        new_system_opex, old_system_opex, abs_savings, relative_savings, ratio = generate_systems_comparison(
+            new_system, old_system, time_horizon, country, utilization, opex_calculation)
+        break_even = compute_systems_break_even(new_system, old_system, country, utilization, opex_calculation)
+    except KeyError as e:
+        raise RequestError(400, f"no data for {e}")
+    except NotImplementedError:
+        raise RequestError(400, f"unknown opex_calculation '{opex_calculation}'")
+
+    return {
+        "new_system_opex": [_json_float(value) for value in new_system_opex],
+        "old_system_opex": [_json_float(value) for value in old_system_opex],
+        "abs_savings": [_json_float(value) for value in abs_savings],
+        "relative_savings": [_json_float(value) for value in relative_savings],
+        "ratio": [_json_float(value) for value in ratio],
+        "new_system_capex": _json_float(new_system.calculate_capex_emissions()),
+        "break_even": _json_float(break_even),
+    }
+
+
+class ComparisonService:
+    """
+    HTTP/1.1 JSON service around generate_systems_comparison, built on asyncio streams only.
+
+    POST /compare        body: one comparison, see normalize_comparison
+    POST /compare/batch  body: {"comparisons": [...]}, answers {"results": [...]} in request order, a comparison that
+                         fails is answered with {"error": ...} in its place
+    GET  /health
+
+    Results are kept in an LRU cache keyed on the normalized request, so repeated pairs and settings, also within one
+    batch, are computed once. Requests are computed in worker threads, the event loop keeps serving other connections.
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE) -> None:
+        self._compare = lru_cache(maxsize=cache_size)(compare)
+        self._routes = {
+            ("POST", "/compare"): self._handle_compare,
+            ("POST", "/compare/batch"): self._handle_batch,
+            ("GET", "/health"): self._handle_health,
+        }
+
+    def cache_info(self):
+        return self._compare.cache_info()
+
+    def compare(self, request):
+        # the cached result is shared between requests, callers get their own lists
+        result = self._compare(*normalize_comparison(request))
+        return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+
+    def _handle_compare(self, body):
+        return self.compare(body)
+
+    def _handle_batch(self, body):
+        comparisons = body.get("comparisons") if isinstance(body, dict) else None
+        if not isinstance(comparisons, list):
+            raise RequestError(400, "expected {\"comparisons\": [...]}")
+        if len(comparisons) > MAX_BATCH_SIZE:
+            raise RequestError(400, f"a batch holds at most {MAX_BATCH_SIZE} comparisons")
+
+        results = []
+        for request in comparisons:
+            try:
+                results.append(self.compare(request))
+            except RequestError as e:
+                results.append({"error": str(e)})
+            except ArithmeticError as e:
+                results.append({"error": f"invalid comparison: {e}"})
+        return {"results": results}
+
+    def _handle_health(self, body):
+        cache_info = self.cache_info()
+        return {"status": "ok", "cache_hits": cache_info.hits, "cache_misses": cache_info.misses,
+                "cache_size": cache_info.currsize}
+
+    def dispatch(self, method, path, body):
+        """
+        :return: HTTP status and JSON-serializable response
+        """
+        handler = self._routes.get((method, path.split("?", 1)[0]))
+        if handler is None:
+            if any(route_path == path for _, route_path in self._routes):
+                return 405, {"error": f"{method} is not allowed for {path}"}
+            return 404, {"error": f"unknown path {path}"}
+
+        try:
+            if method == "POST":
+                try:
+                    body = json.loads(body or b"null")
+                except ValueError as e:
+                    raise RequestError(400, f"invalid JSON: {e}")
+            return 200, handler(body)
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except ArithmeticError as e:
+            return 400, {"error": f"invalid comparison: {e}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # connections are kept alive, so clients issuing many requests pay for the TCP handshake once
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                try:
+                    content_length = int(headers.get("content-length", 0) or 0)
+                    if content_length < 0:
+                        raise ValueError
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                if content_length > MAX_BODY_BYTES:
+                    await self._write_response(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(content_length) if content_length else b""
+
+                try:
+                    # comparisons are CPU-bound, off the event loop other connections are still served meanwhile
+                    status, response = await asyncio.to_thread(self.dispatch, method, path, body)
+                except Exception as e:
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self._write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write_response(writer, status, response, keep_alive):
+        body = json.dumps(response, allow_nan=False).encode()
+        header = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                  f"Content-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(header.encode("latin-1") + body)
+        await writer.drain()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def request(host, port, method, path, payload=None):
+    """
+    Minimal client for local use and testing, sends one request on a fresh connection.
+
+    :return: HTTP status and decoded JSON response
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(host, port, cache_size):
+    server = await ComparisonService(cache_size).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve system comparisons over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.cache_size))
@@ -0,0 +1,157 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import generate_systems_comparison, compute_systems_break_even
+from lifecycle_anslysis.instrumentation import count, traced
+from lifecycle_anslysis.system import System
+
+PAPER_SCENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "paper_scenarios.json")
+
+CELL_KEYS = ["comparison", "country", "utilization", "opex_calculation", "time_horizon"]
+# scenario lists spanned for every comparison, a comparison can override any of them
+CELL_AXES = ["countries", "utilizations", "opex_calculations", "time_horizons"]
+RESULT_COLUMNS = CELL_KEYS + ["new_system", "old_system", "year", "new_system_opex", "old_system_opex", "abs_savings",
+                              "relative_savings", "ratio", "break_even"]
+
+# set in every worker process by _init_worker
+_systems = None
+_comparisons = None
+
+
+@traced("sweep.load_scenario")
+def load_scenario(scenario_path):
+    """
+    A scenario file is a JSON document of the form
+
+    {
+        "systems": {"<name>": {<System keyword arguments>}, ...},
+        "comparisons": [{"name": "<name>", "new_system": "<system name>", "old_system": "<system name>"}, ...],
+        "countries": ["germany", "sweden"],
+        "utilizations": [30, 60, 90],
+        "opex_calculations": ["gupta_model", "hpe_power_advisor", "hourly_grid_intensity"],
+        "time_horizons": [10, 20]
+    }
+
+    A comparison can replace any of these lists for itself, e.g. {"name": ..., "opex_calculations": ["gupta_model"]}.
+    """
+    with open(scenario_path) as file:
+        scenario = json.load(file)
+
+    for comparison in scenario["comparisons"]:
+        for system_key in ["new_system", "old_system"]:
+            if comparison[system_key] not in scenario["systems"]:
+                raise ValueError(f"Comparison {comparison['name']} references unknown system {comparison[system_key]}")
+        for axis in CELL_AXES:
+            if not isinstance(comparison.get(axis, scenario[axis]), list):
+                raise ValueError(f"Comparison {comparison['name']} has to list its {axis}")
+
+    return scenario
+
+
+def select_comparisons(scenario, names, **overrides):
+    """
+    :param overrides: lists replacing CELL_AXES of the selected comparisons, e.g. time_horizons=[10]
+    :return: the scenario restricted to the comparisons in names
+    """
+    unknown = set(overrides) - set(CELL_AXES)
+    if unknown:
+        raise ValueError(f"Unknown scenario lists {sorted(unknown)}, expected some of {CELL_AXES}")
+    comparisons = [{**comparison, **overrides} for comparison in scenario["comparisons"] if comparison["name"] in names]
+    return {**scenario, "comparisons": comparisons}
+
+
+def expand_cells(scenario):
+    cells = []
+    for comparison in scenario["comparisons"]:
+        cells.extend(itertools.product([comparison["name"]],
+                                       *[comparison.get(axis, scenario[axis]) for axis in CELL_AXES]))
+    return cells
+
+
+def _init_worker(systems, comparisons):
+    global _systems, _comparisons
+    _systems = {name: System(**kwargs) for name, kwargs in systems.items()}
+    _comparisons = {comparison["name"]: comparison for comparison in comparisons}
+
+
+@traced("sweep.run_cells")
+def _run_cells(cells):
+    columns = {column: [] for column in RESULT_COLUMNS}
+
+    for comparison_name, country, utilization, opex_calculation, time_horizon in cells:
+        comparison = _comparisons[comparison_name]
+        new_system = _systems[comparison["new_system"]]
+        old_system = _systems[comparison["old_system"]]
+
+        new_system_opex, old_system_opex, abs_savings, relative_savings, ratio = generate_systems_comparison(
+            new_system=new_system,
+            old_system=old_system,
+            time_horizon=time_horizon,
+            country=country,
+            utilization=utilization,
+            opex_calculation=opex_calculation)
+        break_even = compute_systems_break_even(new_system, old_system, country, utilization, opex_calculation)
+
+        for key, value in zip(CELL_KEYS, (comparison_name, country, utilization, opex_calculation, time_horizon)):
+            columns[key].extend([value] * time_horizon)
+        columns["new_system"].extend([comparison["new_system"]] * time_horizon)
+        columns["old_system"].extend([comparison["old_system"]] * time_horizon)
+        columns["year"].append(np.arange(1, time_horizon + 1))
+        columns["new_system_opex"].append(new_system_opex)
+        columns["old_system_opex"].append(old_system_opex)
+        columns["abs_savings"].append(abs_savings)
+        columns["relative_savings"].append(relative_savings)
+        columns["ratio"].append(ratio)
+        columns["break_even"].append(np.full(time_horizon, break_even))
+
+    count("sweep.cells", len(cells))
+    return pd.DataFrame({
+        column: np.concatenate(values) if values and isinstance(values[0], np.ndarray) else values
+        for column, values in columns.items()
+    }, columns=RESULT_COLUMNS)
+
+
+@traced("sweep.run_sweep")
+def run_sweep(scenario, max_workers=None, chunk_size=256):
+    """
+    Runs every cell of the scenario's Cartesian product across a process pool.
+
+    :return: tidy DataFrame with one row per cell and year
+    """
+    cells = expand_cells(scenario)
+    chunks = [cells[i:i + chunk_size] for i in range(0, len(cells), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(scenario["systems"], scenario["comparisons"])) as executor:
+        results = list(executor.map(_run_cells, chunks))
+
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    return pd.concat(results, ignore_index=True)
+
+
+@traced("sweep.write_results")
+def write_results(results, output_path):
+    if os.path.splitext(output_path)[1] == ".parquet":
+        results.to_parquet(output_path, index=False)
+    else:
+        results.to_csv(output_path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a scenario sweep and write one tidy results table.")
+    parser.add_argument("scenario", help="path to the scenario JSON file")
+    parser.add_argument("output", help="results table, written as Parquet if it ends with .parquet, else CSV")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="cells per task sent to a worker")
+    args = parser.parse_args()
+
+    results = run_sweep(load_scenario(args.scenario), max_workers=args.workers, chunk_size=args.chunk_size)
+    write_results(results, args.output)
@@ -1,10 +1,23 @@
 import numpy as np
 
-from lifecycle_anslysis.constants import OPEX_PER_YEAR, DRAM_WATTS_PER_256GB, GCI_CONSTANTS, HPE_POWER_ADVISOR, \
-    GUPTA_MODEL
+from lifecycle_anslysis.constants import HPE_POWER_ADVISOR, GUPTA_MODEL, HOURLY_GRID_INTENSITY, MPA, EPA, CI_FAB, \
+    GPA, FAB_YIELD, E_DRAM, E_SSD, E_HDD
+from lifecycle_anslysis.grid_intensity import hourly_opex_per_year
+from lifecycle_anslysis.power_curves import ComponentPowerModel, GUPTA_POWER_MODEL, hpe_power_advisor_opex_per_year
+
+
+# OPEX values kept per System, the oldest one is evicted first
+OPEX_CACHE_SIZE = 16
 
 
 class System:
+    """
+    Immutable and hashable by value, so equal configurations share cache entries and can be used as dict keys. The
+    CAPEX and OPEX are computed once per instance and (utilization, country, model). Instances have no __dict__ and
+    the OPEX cache is only allocated on first use, so millions of candidate configurations fit in memory.
+    """
+    __slots__ = ("packaging_size", "performance_indicator", "lifetime", "dram_capacity", "ssd_capacity",
+                 "hdd_capacity", "cpu_tdp", "_capex", "_opex_cache")
 
     def __init__(self, die_size: float, performance_indicator: float, lifetime: int, dram_capacity: int,
                  ssd_capacity: int, hdd_capacity: int, cpu_tdp: int) -> None:
@@ -17,73 +30,207 @@ class System:
         :param hdd_capacity: in GB
         :param cpu_tdp: in Watt
         """
-        self.packaging_size = die_size
-        self.performance_indicator = performance_indicator
-        self.lifetime = lifetime
-        self.dram_capacity = dram_capacity
-        self.ssd_capacity = ssd_capacity
-        self.hdd_capacity = hdd_capacity
-        self.cpu_tdp = cpu_tdp
+        set_attribute = object.__setattr__
+        set_attribute(self, "packaging_size", die_size)
+        set_attribute(self, "performance_indicator", performance_indicator)
+        set_attribute(self, "lifetime", lifetime)
+        set_attribute(self, "dram_capacity", dram_capacity)
+        set_attribute(self, "ssd_capacity", ssd_capacity)
+        set_attribute(self, "hdd_capacity", hdd_capacity)
+        set_attribute(self, "cpu_tdp", cpu_tdp)
+        set_attribute(self, "_capex", None)
+        set_attribute(self, "_opex_cache", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"System is immutable, cannot set '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"System is immutable, cannot delete '{name}'")
+
+    def _fields(self):
+        return (self.packaging_size, self.performance_indicator, self.lifetime, self.dram_capacity,
+                self.ssd_capacity, self.hdd_capacity, self.cpu_tdp)
+
+    def __eq__(self, other):
+        if not isinstance(other, System):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __reduce__(self):
+        # pickled without the caches, the default slot state would be restored through __setattr__
+        return System, self._fields()
+
+    def __repr__(self):
+        return f"System(die_size={self.packaging_size!r}, performance_indicator={self.performance_indicator!r}, " \
+               f"lifetime={self.lifetime!r}, dram_capacity={self.dram_capacity!r}, " \
+               f"ssd_capacity={self.ssd_capacity!r}, hdd_capacity={self.hdd_capacity!r}, cpu_tdp={self.cpu_tdp!r})"
 
     def calculate_capex_emissions(self):
-        ####### Source of the constants: https://ugupta.com/files/Gupta_ISCA2022_ACT.pdf
-
-        MPA = 0.5  ### Procure materials | kg co2 per cm2
-        EPA = 2.15  ### 0.8-3.5 | Fab Energy | kWh per cm2
-        CI_fab = 0.365  ### 30-700  | g co2 per kWh  --> converted to kg co2 per kWh
-        GPA = 0.3  ### 0.1-0.5 | Kg CO2 per cm2
-        _yield = 0.875  ### 0-1  | Fab yield
-        E_DRAM = 0.3  ### 0 - 0.6 | Kg CO2/GB
-        E_SDD = 0.015  ### 0 - 0.03 | Kg CO2/GB
-        E_HDD = 0.06  ### 0 - 0.12 | Kg CO2/GB
+        if self._capex is None:
+            object.__setattr__(self, "_capex", self._calculate_capex_emissions())
+        return self._capex
 
+    def _calculate_capex_emissions(self):
         # Note assume package size == die size
-        capex_cpu = ((CI_fab * EPA + GPA + MPA) * self.packaging_size) / _yield  #### Kg Co2
+        capex_cpu = ((CI_FAB * EPA + GPA + MPA) * self.packaging_size) / FAB_YIELD  #### Kg Co2
         capex_dram = self.dram_capacity * E_DRAM  #### Kg Co2
-        capex_ssd = self.ssd_capacity * E_SDD  #### Kg Co2
+        capex_ssd = self.ssd_capacity * E_SSD  #### Kg Co2
         capex_hdd = self.hdd_capacity * E_HDD  #### Kg Co2
 
         capex_total = capex_cpu + capex_dram + capex_ssd + capex_hdd  #### Kg Co2
 
         return capex_total
 
-    def generate_accumm_projected_opex_emissions(self, time_horizon: int, system_id: str, country: str,
-                                                 utilization: float, opex_calculation: str):
-        if opex_calculation == HPE_POWER_ADVISOR:
-            opex_per_year = OPEX_PER_YEAR[country][utilization][system_id]
+    def _cache_opex(self, key, opex):
+        cache = self._opex_cache
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, "_opex_cache", cache)
+        elif len(cache) >= OPEX_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        cache[key] = opex
+        return opex
+
+    def calculate_opex_per_year(self, system_id: str, country: str, utilization: float, opex_calculation):
+        """
+        :param opex_calculation: HPE_POWER_ADVISOR, GUPTA_MODEL, HOURLY_GRID_INTENSITY or a ComponentPowerModel
+        """
+        if isinstance(opex_calculation, ComponentPowerModel):
+            return self.calculate_opex_emissions(utilization, country, opex_calculation)
+        elif opex_calculation == HPE_POWER_ADVISOR:
+            return hpe_power_advisor_opex_per_year(country, utilization, system_id)
         elif opex_calculation == GUPTA_MODEL:
-            opex_per_year = self.calculate_opex_emissions(utilization, country)
+            return self.calculate_opex_emissions(utilization, country)
+        elif opex_calculation == HOURLY_GRID_INTENSITY:
+            key = (utilization, country, HOURLY_GRID_INTENSITY)
+            if self._opex_cache is not None and key in self._opex_cache:
+                return self._opex_cache[key]
+            return self._cache_opex(key, hourly_opex_per_year(self, country, utilization))
         else:
             raise NotImplementedError
 
+    def generate_accumm_projected_opex_emissions(self, time_horizon: int, system_id: str, country: str,
+                                                 utilization: float, opex_calculation: str):
+        opex_per_year = self.calculate_opex_per_year(system_id, country, utilization, opex_calculation)
+
         projected_emissions = [i * opex_per_year for i in range(1, time_horizon + 1)]
 
         return np.array(projected_emissions)
 
     def generate_normalized_power_usage(self, utilization: float):
+        # fraction of the TDP drawn at the utilization, see GUPTA_POWER_MODEL
+        return GUPTA_POWER_MODEL.cpu(utilization)
+
+    def calculate_opex_emissions(self, utilization: float, country: str,
+                                 power_model: ComponentPowerModel = GUPTA_POWER_MODEL):
+        key = (utilization, country, GUPTA_MODEL if power_model is GUPTA_POWER_MODEL else power_model)
+        if self._opex_cache is not None and key in self._opex_cache:
+            return self._opex_cache[key]
+        return self._cache_opex(key, self._calculate_opex_emissions(utilization, country, power_model))
+
+    def _calculate_opex_emissions(self, utilization: float, country: str,
+                                  power_model: ComponentPowerModel = GUPTA_POWER_MODEL):
+        ######## Source of GCI: https://app.electricitymaps.com/zone/DE --> 2023 average for DE
+        return power_model.calculate_opex_emissions(self, utilization, country)  ###### Kg co2 per year
 
-        #### Source: https://ieeexplore.ieee.org/document/4404806/?arnumber=4404806&tag=1
-        ### See Fig 2
-        power_slope = (100 - 50) / (100 - 0)
-        intercept = 50
 
-        return (intercept + utilization * power_slope) / 100
+class SystemBatch:
+    """
+    Structure-of-arrays counterpart of System: every attribute is a NumPy column with one entry per configuration,
+    so the emission model is evaluated for all configurations at once.
+    """
 
-    def calculate_opex_emissions(self, utilization: float, country: str):
-        ######## Source of GCI: https://app.electricitymaps.com/zone/DE --> 2023 average for DE
+    def __init__(self, die_size, performance_indicator, lifetime, dram_capacity, ssd_capacity, hdd_capacity,
+                 cpu_tdp) -> None:
+        """
+        :param die_size: in cm^2
+        :param performance_indicator:
+        :param lifetime: in years
+        :param dram_capacity: in GB
+        :param ssd_capacity: in GB
+        :param hdd_capacity: in GB
+        :param cpu_tdp: in Watt
+        """
+        columns = np.broadcast_arrays(*[np.asarray(column, dtype=np.float64) for column in (
+            die_size, performance_indicator, lifetime, dram_capacity, ssd_capacity, hdd_capacity, cpu_tdp)])
+        if columns[0].ndim != 1:
+            raise ValueError("SystemBatch columns must be one-dimensional")
+
+        self.packaging_size, self.performance_indicator, self.lifetime, self.dram_capacity, self.ssd_capacity, \
+            self.hdd_capacity, self.cpu_tdp = [np.ascontiguousarray(column) for column in columns]
+
+    @classmethod
+    def from_systems(cls, systems):
+        systems = list(systems)
+        return cls(
+            die_size=[system.packaging_size for system in systems],
+            performance_indicator=[system.performance_indicator for system in systems],
+            lifetime=[system.lifetime for system in systems],
+            dram_capacity=[system.dram_capacity for system in systems],
+            ssd_capacity=[system.ssd_capacity for system in systems],
+            hdd_capacity=[system.hdd_capacity for system in systems],
+            cpu_tdp=[system.cpu_tdp for system in systems],
+        )
+
+    def __len__(self):
+        return self.packaging_size.shape[0]
+
+    def __getitem__(self, index):
+        return System(
+            die_size=float(self.packaging_size[index]),
+            performance_indicator=float(self.performance_indicator[index]),
+            lifetime=int(self.lifetime[index]),
+            dram_capacity=float(self.dram_capacity[index]),
+            ssd_capacity=float(self.ssd_capacity[index]),
+            hdd_capacity=float(self.hdd_capacity[index]),
+            cpu_tdp=float(self.cpu_tdp[index]),
+        )
+
+    def take(self, indices):
+        """
+        SystemBatch of the configurations at indices.
+        """
+        return SystemBatch(
+            die_size=self.packaging_size[indices],
+            performance_indicator=self.performance_indicator[indices],
+            lifetime=self.lifetime[indices],
+            dram_capacity=self.dram_capacity[indices],
+            ssd_capacity=self.ssd_capacity[indices],
+            hdd_capacity=self.hdd_capacity[indices],
+            cpu_tdp=self.cpu_tdp[indices],
+        )
 
-        normalized_power_usage = self.generate_normalized_power_usage(utilization)
-        cpu_energy_consumption = (self.cpu_tdp * normalized_power_usage) / 1000  #### kW
-        dram_energy_consumption = ((self.dram_capacity / 256) * DRAM_WATTS_PER_256GB) / 1000  #### kW
+    def calculate_capex_emissions(self):
+        # Note assume package size == die size
+        capex_cpu = ((CI_FAB * EPA + GPA + MPA) * self.packaging_size) / FAB_YIELD  #### Kg Co2
+        capex_dram = self.dram_capacity * E_DRAM  #### Kg Co2
+        capex_ssd = self.ssd_capacity * E_SSD  #### Kg Co2
+        capex_hdd = self.hdd_capacity * E_HDD  #### Kg Co2
 
-        # Watts according to https://www.ssstc.com/knowledge-detail/ssd-vs-hdd-power-efficiency/#:~:text=On%20average%2C%20SSDs%20consume%20around,may%20consume%203%2D4%20watts.
-        ssd_energy_consumption = (3 if (self.ssd_capacity > 0) else 0) / 1000  ###kW
-        hdd_energy_consumption = (7 if (self.hdd_capacity > 0) else 0) / 1000  ###kW
+        return capex_cpu + capex_dram + capex_ssd + capex_hdd  #### Kg Co2
 
-        total_watts = cpu_energy_consumption + dram_energy_consumption + ssd_energy_consumption + hdd_energy_consumption
-        total_watts_per_year = 24 * 7 * 52 * total_watts  ### kWh
-        GCI = GCI_CONSTANTS[country]
+    def calculate_opex_per_year(self, system_id: str, country: str, utilization: float, opex_calculation):
+        """
+        :param opex_calculation: HPE_POWER_ADVISOR, GUPTA_MODEL, HOURLY_GRID_INTENSITY or a ComponentPowerModel
+        """
+        if isinstance(opex_calculation, ComponentPowerModel):
+            return self.calculate_opex_emissions(utilization, country, opex_calculation)
+        elif opex_calculation == HPE_POWER_ADVISOR:
+            return np.full(len(self), hpe_power_advisor_opex_per_year(country, utilization, system_id),
+                           dtype=np.float64)
+        elif opex_calculation == GUPTA_MODEL:
+            return self.calculate_opex_emissions(utilization, country)
+        elif opex_calculation == HOURLY_GRID_INTENSITY:
+            return hourly_opex_per_year(self, country, utilization)
+        else:
+            raise NotImplementedError
 
-        OPEX = total_watts_per_year * GCI  ###### Kg co2 per year
+    # the power curve only depends on the utilization, so it is shared with System
+    generate_normalized_power_usage = System.generate_normalized_power_usage
 
-        return OPEX
+    def calculate_opex_emissions(self, utilization: float, country: str,
+                                 power_model: ComponentPowerModel = GUPTA_POWER_MODEL):
+        return power_model.calculate_opex_emissions(self, utilization, country)  ###### Kg co2 per year
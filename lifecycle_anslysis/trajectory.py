@@ -0,0 +1,189 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.constants import HOURS_PER_YEAR
+from lifecycle_anslysis.instrumentation import count, traced
+from lifecycle_anslysis.power_curves import GUPTA_POWER_MODEL
+from lifecycle_anslysis.system import System, SystemBatch
+
+# parameters of Trajectories.from_rates, in the column order of Trajectories.parameters
+RATE_PARAMETERS = ["gci", "gci_change", "utilization", "utilization_growth", "pue", "efficiency_drift"]
+
+
+class Trajectories:
+    """
+    Per-year model inputs of S scenarios over Y years, every attribute is an array of shape (S, Y):
+
+    - gci: grid carbon intensity in kg CO2 per kWh
+    - utilization: in percent
+    - pue: power usage effectiveness, the facility energy per unit of IT energy
+    - efficiency_drift: growth rate of the power draw per year of hardware age, e.g. 0.01 if a server draws 1% more
+      power each year for the same work. A system of age a in year y draws (1 + efficiency_drift[y]) ** (a + y)
+      times its nominal power.
+    """
+
+    def __init__(self, gci, utilization, pue=1.0, efficiency_drift=0.0, parameters=None) -> None:
+        """
+        :param parameters: optional DataFrame with one row per scenario describing it, e.g. the rates it was
+                           generated from
+        """
+        columns = np.broadcast_arrays(*[np.atleast_2d(np.asarray(column, dtype=np.float64)) for column in (
+            gci, utilization, pue, efficiency_drift)])
+        if columns[0].ndim != 2:
+            raise ValueError("Trajectories must be of shape (scenarios, years)")
+
+        self.gci, self.utilization, self.pue, self.efficiency_drift = [np.ascontiguousarray(column)
+                                                                       for column in columns]
+        self.parameters = parameters
+
+    @classmethod
+    def from_rates(cls, time_horizon: int, gci, gci_change=0.0, utilization=50, utilization_growth=0.0, pue=1.0,
+                   efficiency_drift=0.0):
+        """
+        Trajectories with constant annual rates, e.g. a grid decarbonizing by 5% per year is gci_change=-0.05. Every
+        argument is a scalar or one value per scenario. Utilizations are capped at 100%.
+        """
+        rates = np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype=np.float64)) for value in (
+            gci, gci_change, utilization, utilization_growth, pue, efficiency_drift)])
+        gci, gci_change, utilization, utilization_growth, pue, efficiency_drift = [rate[:, np.newaxis]
+                                                                                   for rate in rates]
+        years = np.arange(time_horizon, dtype=np.float64)
+
+        return cls(
+            gci=gci * (1 + gci_change) ** years,
+            utilization=np.minimum(utilization * (1 + utilization_growth) ** years, 100),
+            pue=np.broadcast_to(pue, (len(pue), time_horizon)),
+            efficiency_drift=np.broadcast_to(efficiency_drift, (len(pue), time_horizon)),
+            parameters=pd.DataFrame(dict(zip(RATE_PARAMETERS, rates))),
+        )
+
+    @classmethod
+    def grid(cls, time_horizon: int, **families):
+        """
+        from_rates over the Cartesian product of the given values, e.g.
+        Trajectories.grid(10, gci=[0.344], gci_change=[0, -0.03, -0.07], utilization=[30, 60]) has 6 scenarios.
+        """
+        unknown = set(families) - set(RATE_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown trajectory parameters {sorted(unknown)}, expected some of {RATE_PARAMETERS}")
+        names = list(families)
+        product = np.array(list(itertools.product(*[np.atleast_1d(families[name]) for name in names])),
+                           dtype=np.float64).reshape(-1, len(names))
+        return cls.from_rates(time_horizon, **{name: product[:, i] for i, name in enumerate(names)})
+
+    @property
+    def n_scenarios(self):
+        return self.gci.shape[0]
+
+    @property
+    def time_horizon(self):
+        return self.gci.shape[1]
+
+    def energy_weights(self, age=0.0):
+        """
+        kg CO2 emitted per kW of nominal IT power in every scenario and year, and the same weighted by the
+        utilization, for a system that is age years old in the first year.
+
+        :return: two arrays of shape (S, Y)
+        """
+        years = np.arange(self.time_horizon, dtype=np.float64)
+        weight = HOURS_PER_YEAR * self.gci * self.pue * (1 + self.efficiency_drift) ** (age + years)
+        return weight, weight * self.utilization
+
+
+def _as_batch(systems):
+    return SystemBatch.from_systems([systems]) if isinstance(systems, System) else systems
+
+
+def _power_coefficients(systems: SystemBatch):
+    # the power draw in kW is affine in the utilization: static + utilization * dynamic
+    # see System.calculate_opex_emissions
+    return GUPTA_POWER_MODEL.affine_coefficients(systems)
+
+
+@traced("trajectory.calculate_trajectory_opex")
+def calculate_trajectory_opex(systems, trajectories: Trajectories, age=0.0, accumulate=True):
+    """
+    OPEX of every system in every scenario and year with the Gupta model driven by the trajectories.
+
+    The power draw is affine in the utilization and everything else scales it, so the OPEX of system n in scenario s
+    and year y is static[n] * w[s, y] + dynamic[n] * (w * u)[s, y]. Accumulating over the years commutes with this,
+    so the cumulative sums are taken over the (S, Y) weights once instead of over every system.
+
+    :param systems: System or SystemBatch
+    :param age: age of the systems in years at the start, see Trajectories
+    :param accumulate: return the OPEX accumulated up to the end of every year instead of per year
+    :return: array of shape (len(systems), S, Y) in kg CO2
+    """
+    systems = _as_batch(systems)
+    count("trajectory.opex_cells", len(systems) * trajectories.gci.size)
+    static, dynamic = _power_coefficients(systems)
+    weight, utilization_weight = trajectories.energy_weights(age)
+    if accumulate:
+        weight, utilization_weight = np.cumsum(weight, axis=1), np.cumsum(utilization_weight, axis=1)
+
+    return static[:, np.newaxis, np.newaxis] * weight + dynamic[:, np.newaxis, np.newaxis] * utilization_weight
+
+
+def compute_trajectory_break_even(accumulated_difference, capex):
+    """
+    First time at which the accumulated emissions of the new system (CAPEX included) no longer exceed the ones of the
+    old system. Within a year the OPEX is constant, so the crossover is interpolated linearly.
+
+    :param accumulated_difference: new minus old accumulated emissions at the end of every year, years on the last
+                                   axis
+    :param capex: CAPEX of the new system, the difference at time 0, broadcast against accumulated_difference[..., 0]
+    :return: fractional break-even time in years, np.inf if the new system does not break even within the horizon
+    """
+    accumulated_difference = np.asarray(accumulated_difference, dtype=np.float64)
+    shape, time_horizon = accumulated_difference.shape[:-1], accumulated_difference.shape[-1]
+    capex = np.broadcast_to(np.asarray(capex, dtype=np.float64), shape).ravel()
+    accumulated_difference = accumulated_difference.reshape(-1, time_horizon)
+
+    # only the year of the crossover and the one before are gathered, not whole series
+    year = np.argmax(accumulated_difference <= 0, axis=1)
+    position = np.arange(len(year)) * time_horizon + year
+    end = accumulated_difference.ravel()[position]
+    start = np.where(year > 0, accumulated_difference.ravel()[np.maximum(position - 1, 0)], capex)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        break_even = year + np.where(start > end, start / (start - end), 0.0)
+
+    break_even = np.where(end <= 0, break_even, np.inf)
+    break_even = np.where(capex <= 0, 0.0, break_even).reshape(shape)
+    return break_even[()]
+
+
+@traced("trajectory.generate_trajectory_systems_comparison")
+def generate_trajectory_systems_comparison(new_systems, old_systems, trajectories: Trajectories, old_system_age=0.0):
+    """
+    generate_batch_systems_comparison with year-varying grid carbon intensity, utilization, PUE and efficiency drift
+    instead of constant yearly OPEX. Every new system is compared against every old system in every scenario. The
+    new systems start at age 0, the old ones at old_system_age.
+
+    :param new_systems: System or SystemBatch
+    :param old_systems: System or SystemBatch
+    :return: new_system_opex, abs_savings, relative_savings and ratio of shape (N, M, S, Y), old_system_opex of shape
+             (M, S, Y) and break_even of shape (N, M, S), see compute_trajectory_break_even
+    """
+    new_systems, old_systems = _as_batch(new_systems), _as_batch(old_systems)
+    count("comparisons", len(new_systems) * len(old_systems) * trajectories.n_scenarios)
+
+    new_system_opex_accumulated = calculate_trajectory_opex(new_systems, trajectories)
+    new_system_capex = new_systems.calculate_capex_emissions()
+    old_system_opex = calculate_trajectory_opex(old_systems, trajectories, age=old_system_age)
+
+    performance_factor = \
+        old_systems.performance_indicator[np.newaxis, :] / new_systems.performance_indicator[:, np.newaxis]
+
+    new_system_opex = performance_factor[:, :, np.newaxis, np.newaxis] * new_system_opex_accumulated[:, np.newaxis]
+    new_system_opex += new_system_capex[:, np.newaxis, np.newaxis, np.newaxis]
+
+    abs_savings = new_system_opex - old_system_opex
+    relative_savings = 1 - (old_system_opex / new_system_opex)
+    ratio = new_system_opex / old_system_opex
+
+    break_even = compute_trajectory_break_even(abs_savings, new_system_capex[:, np.newaxis, np.newaxis])
+
+    return new_system_opex, old_system_opex, abs_savings, relative_savings, ratio, break_even
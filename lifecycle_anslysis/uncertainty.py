@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.comparison import compute_break_even
+from lifecycle_anslysis.constants import MPA, GCI_CONSTANTS, DRAM_WATTS_PER_256GB, SSD_WATTS, HDD_WATTS, \
+    HOURS_PER_YEAR
+from lifecycle_anslysis.system import SystemBatch
+
+# Distributions are given as (kind, *arguments), kind is one of the numpy Generator methods listed in
+# SUPPORTED_DISTRIBUTIONS or "fixed" for a constant value.
+SUPPORTED_DISTRIBUTIONS = ["uniform", "triangular", "normal", "lognormal"]
+
+# Ranges as documented in the ACT paper, see constants.py
+DEFAULT_DISTRIBUTIONS = {
+    "MPA": ("fixed", MPA),
+    "EPA": ("uniform", 0.8, 3.5),
+    "CI_FAB": ("uniform", 0.03, 0.7),
+    "GPA": ("uniform", 0.1, 0.5),
+    "FAB_YIELD": ("triangular", 0.5, 0.875, 1.0),  # a yield close to 0 would make the CPU CAPEX unbounded
+    "E_DRAM": ("uniform", 0, 0.6),
+    "E_SSD": ("uniform", 0, 0.03),
+    "E_HDD": ("uniform", 0, 0.12),
+}
+
+# Break-even times are binned on a log scale, values outside of the range land in the under-/overflow bins
+BREAK_EVEN_BIN_EDGES = np.geomspace(1e-3, 1e3, 8193)
+
+
+def sample_parameters(distributions, n_samples, rng):
+    samples = {}
+    for parameter, (kind, *arguments) in distributions.items():
+        if kind == "fixed":
+            samples[parameter] = np.full(n_samples, arguments[0], dtype=np.float64)
+        elif kind in SUPPORTED_DISTRIBUTIONS:
+            samples[parameter] = getattr(rng, kind)(*arguments, size=n_samples)
+        else:
+            raise ValueError(f"Unsupported distribution {kind} for {parameter}")
+
+    return samples
+
+
+class StreamingQuantiles:
+    """
+    Fixed-bin histogram per series: memory is independent of the number of observed values and a whole chunk is
+    added with a single bincount. Quantiles are interpolated geometrically within a bin, so the relative error is
+    bounded by the bin width.
+    """
+
+    def __init__(self, n_series, bin_edges=BREAK_EVEN_BIN_EDGES) -> None:
+        self.bin_edges = bin_edges
+        self.n_series = n_series
+        self.n_bins = len(bin_edges) + 1
+        self.counts = np.zeros((n_series, self.n_bins), dtype=np.int64)
+
+    def update(self, values):
+        """
+        :param values: array of shape (n_values, n_series)
+        """
+        bins = np.searchsorted(self.bin_edges, values, side="right")
+        bins += np.arange(self.n_series) * self.n_bins
+        self.counts += np.bincount(bins.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def quantile(self, q):
+        cumulative_counts = np.cumsum(self.counts, axis=1)
+        rank = q * cumulative_counts[:, -1]
+        bins = np.argmax(cumulative_counts >= np.maximum(rank, 1)[:, np.newaxis], axis=1)
+
+        rows = np.arange(self.n_series)
+        lower_counts = np.where(bins > 0, cumulative_counts[rows, bins - 1], 0)
+        fraction = np.clip((rank - lower_counts) / np.maximum(self.counts[rows, bins], 1), 0, 1)
+
+        inner_bins = np.clip(bins, 1, self.n_bins - 2)
+        lower_edges = self.bin_edges[inner_bins - 1]
+        upper_edges = self.bin_edges[inner_bins]
+        result = lower_edges * (upper_edges / lower_edges) ** fraction
+
+        result = np.where(bins == 0, self.bin_edges[0], result)
+        result = np.where(bins == self.n_bins - 1, np.inf, result)
+        return result
+
+
+def run_monte_carlo(new_systems: SystemBatch, old_systems: SystemBatch, country: str, utilization: float,
+                    n_samples: int, distributions=None, chunk_size=100_000, quantiles=(0.05, 0.5, 0.95), seed=None):
+    """
+    Samples the ACT embodied-carbon constants, the grid carbon intensity and the utilization and reports the
+    resulting break-even time distribution of every comparison new_systems[i] vs. old_systems[i]. All comparisons
+    see the same samples. Only the GUPTA_MODEL OPEX calculation is parametric, so it is used throughout.
+
+    :param distributions: overrides for DEFAULT_DISTRIBUTIONS, additionally accepts "GCI" (kg CO2 per kWh) and
+                          "UTILIZATION" (percent), which default to the fixed country GCI and utilization
+    :param chunk_size: number of samples evaluated at once, memory grows with chunk_size * len(new_systems)
+    :return: DataFrame with one row per comparison, one column per quantile and the share of samples in which the
+             new system never breaks even
+    """
+    distributions = {
+        **DEFAULT_DISTRIBUTIONS,
+        "GCI": ("fixed", GCI_CONSTANTS[country]),
+        "UTILIZATION": ("fixed", utilization),
+        **(distributions or {}),
+    }
+    rng = np.random.default_rng(seed)
+    estimator = StreamingQuantiles(len(new_systems))
+    never_break_even = np.zeros(len(new_systems), dtype=np.int64)
+
+    # OPEX terms that do not depend on any sampled parameter, in kW
+    static_watts = []
+    for systems in (new_systems, old_systems):
+        dram_energy_consumption = ((systems.dram_capacity / 256) * DRAM_WATTS_PER_256GB) / 1000
+        ssd_energy_consumption = np.where(systems.ssd_capacity > 0, SSD_WATTS, 0) / 1000
+        hdd_energy_consumption = np.where(systems.hdd_capacity > 0, HDD_WATTS, 0) / 1000
+        static_watts.append(dram_energy_consumption + ssd_energy_consumption + hdd_energy_consumption)
+    performance_factor = old_systems.performance_indicator / new_systems.performance_indicator
+
+    for start in range(0, n_samples, chunk_size):
+        samples = {parameter: values[:, np.newaxis] for parameter, values in
+                   sample_parameters(distributions, min(chunk_size, n_samples - start), rng).items()}
+
+        # see System.calculate_capex_emissions
+        capex_cpu = ((samples["CI_FAB"] * samples["EPA"] + samples["GPA"] + samples["MPA"])
+                     * new_systems.packaging_size) / samples["FAB_YIELD"]
+        new_system_capex = capex_cpu + new_systems.dram_capacity * samples["E_DRAM"] \
+            + new_systems.ssd_capacity * samples["E_SSD"] + new_systems.hdd_capacity * samples["E_HDD"]
+
+        # see System.calculate_opex_emissions
+        normalized_power_usage = new_systems.generate_normalized_power_usage(samples["UTILIZATION"])
+        opex_factor = HOURS_PER_YEAR * samples["GCI"]
+        new_system_opex_per_year = opex_factor * (
+                (new_systems.cpu_tdp * normalized_power_usage) / 1000 + static_watts[0])
+        old_system_opex_per_year = opex_factor * (
+                (old_systems.cpu_tdp * normalized_power_usage) / 1000 + static_watts[1])
+
+        break_even = compute_break_even(new_system_capex, new_system_opex_per_year, old_system_opex_per_year,
+                                        performance_factor)
+        estimator.update(break_even)
+        never_break_even += np.isinf(break_even).sum(axis=0)
+
+    result = pd.DataFrame({f"p{round(q * 100):g}": estimator.quantile(q) for q in quantiles})
+    result["never_break_even"] = never_break_even / n_samples
+
+    return result
@@ -0,0 +1,70 @@
+import numpy as np
+
+from lifecycle_anslysis.constants import NEW_SYSTEM, OLD_SYSTEM
+from lifecycle_anslysis.system import System, SystemBatch
+
+
+def optimize_upgrade_schedule(current_system: System, candidates: SystemBatch, availability_years, start_year: int,
+                              time_horizon: int, country: str, utilization: int, opex_calculation: str,
+                              current_age: int = 0):
+    """
+    Finds the sequence of replacements with the lowest total CO2 (CAPEX of every bought system plus OPEX of the
+    installed system in every year) over time_horizon years starting at start_year. A system is replaced at the
+    latest when it reaches its lifetime. As in generate_systems_comparison, a candidate's OPEX is scaled by
+    current_system.performance_indicator / candidate.performance_indicator, since it serves the same workload.
+
+    Solved by dynamic programming over (year, installed system): cost[y, k] is the lowest CO2 from year y on after
+    installing candidate k in year y. The cheapest system to install in a year does not depend on the system it
+    replaces, so every year costs O(time_horizon * len(candidates)) instead of O(len(candidates) ** 2).
+
+    :param availability_years: calendar year from which each candidate can be bought
+    :param current_age: age of current_system in years, counted against its lifetime
+    :return: list of (calendar year, candidate index) replacements and the total CO2 in kg
+    """
+    availability = np.asarray(availability_years, dtype=np.float64) - start_year
+    capex = candidates.calculate_capex_emissions()
+    performance_factor = current_system.performance_indicator / candidates.performance_indicator
+    opex = candidates.calculate_opex_per_year(NEW_SYSTEM, country=country, utilization=utilization,
+                                              opex_calculation=opex_calculation) * performance_factor
+    current_opex = current_system.calculate_opex_per_year(OLD_SYSTEM, country=country, utilization=utilization,
+                                                          opex_calculation=opex_calculation)
+
+    # cost of the best purchase in year y (including everything after it) and which candidate that is, "buying" in
+    # the year after the horizon costs nothing
+    best_purchase = np.zeros(time_horizon + 1)
+    best_candidate = np.zeros(time_horizon, dtype=np.int64)
+    cost = np.full((time_horizon, len(candidates)), np.inf)
+    # year of the next replacement after installing candidate k in year y, time_horizon if it is kept until the end
+    next_replacement = np.full((time_horizon, len(candidates)), time_horizon, dtype=np.int64)
+
+    def run_until_next_replacement(year, opex_per_year, lifetime):
+        years_kept = np.arange(1, time_horizon - year + 1)
+        replacement_costs = opex_per_year[:, np.newaxis] * years_kept + best_purchase[year + 1:]
+        replacement_costs[years_kept > lifetime[:, np.newaxis]] = np.inf
+
+        best = np.argmin(replacement_costs, axis=1)
+        return replacement_costs[np.arange(len(opex_per_year)), best], year + 1 + best
+
+    for year in range(time_horizon - 1, -1, -1):
+        cost[year], next_replacement[year] = run_until_next_replacement(year, opex, candidates.lifetime)
+
+        purchase_costs = np.where(availability <= year, capex + cost[year], np.inf)
+        best_candidate[year] = np.argmin(purchase_costs)
+        best_purchase[year] = purchase_costs[best_candidate[year]]
+
+    total_emissions, replacement_year = run_until_next_replacement(
+        0, np.array([current_opex]), np.array([current_system.lifetime - current_age], dtype=np.float64))
+    total_emissions, replacement_year = total_emissions[0], replacement_year[0]
+    # replacing the current system right away
+    if best_purchase[0] < total_emissions:
+        total_emissions, replacement_year = best_purchase[0], 0
+    if not np.isfinite(total_emissions):
+        raise ValueError("No schedule keeps a system running for the whole time horizon")
+
+    schedule = []
+    while replacement_year < time_horizon:
+        candidate = best_candidate[replacement_year]
+        schedule.append((start_year + int(replacement_year), int(candidate)))
+        replacement_year = next_replacement[replacement_year, candidate]
+
+    return schedule, float(total_emissions)
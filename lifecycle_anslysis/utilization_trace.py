@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from lifecycle_anslysis.constants import HOURS_PER_YEAR, GCI_CONSTANTS
+from lifecycle_anslysis.power_curves import GUPTA_POWER_MODEL
+from lifecycle_anslysis.system import System, SystemBatch
+
+
+def iter_trace_chunks(csv_paths, utilization_column="utilization", chunk_size=1_000_000):
+    """
+    Streams the utilization column (in percent) of one or more monitoring exports, chunk_size rows at a time.
+    """
+    if isinstance(csv_paths, str):
+        csv_paths = [csv_paths]
+
+    for csv_path in csv_paths:
+        for chunk in pd.read_csv(csv_path, usecols=[utilization_column], chunksize=chunk_size):
+            yield chunk[utilization_column].to_numpy(dtype=np.float64)
+
+
+def calculate_trace_energy(systems: SystemBatch, utilization_chunks, sample_interval_s=60, performance_factor=1.0):
+    """
+    Energy drawn by every system while running the utilization trace, see System.calculate_opex_emissions. The trace
+    is consumed once and only one chunk is held in memory at a time.
+
+    :param utilization_chunks: iterable of arrays with the utilization in percent, one value per sample interval
+    :param performance_factor: per system, the trace is rescaled to utilization * performance_factor (capped at 100)
+    :return: energy per system in kWh and the duration of the trace in hours
+    """
+    performance_factor = np.broadcast_to(np.asarray(performance_factor, dtype=np.float64), (len(systems),))
+
+    utilization_sum = np.zeros(len(systems))
+    n_samples = 0
+    for utilization in utilization_chunks:
+        utilization = np.clip(np.nan_to_num(utilization), 0, 100)
+        scaled = np.minimum(performance_factor[:, np.newaxis] * utilization[np.newaxis, :], 100)
+        utilization_sum += scaled.sum(axis=1)
+        n_samples += len(utilization)
+
+    trace_hours = n_samples * sample_interval_s / 3600
+    sample_hours = sample_interval_s / 3600
+
+    # power is affine in the utilization, so the sum of the utilization is all that is needed
+    static_power, dynamic_power = GUPTA_POWER_MODEL.affine_coefficients(systems)  #### kW
+
+    energy = static_power * trace_hours + dynamic_power * utilization_sum * sample_hours
+    return energy, trace_hours
+
+
+def calculate_trace_opex_emissions(systems: SystemBatch, utilization_chunks, country: str, sample_interval_s=60,
+                                   performance_factor=1.0):
+    """
+    :return: OPEX per system and year in kg CO2, extrapolated from the trace duration to a year
+    """
+    energy, trace_hours = calculate_trace_energy(systems, utilization_chunks, sample_interval_s, performance_factor)
+    if trace_hours == 0:
+        raise ValueError("The utilization trace is empty")
+
+    return energy * (HOURS_PER_YEAR / trace_hours) * GCI_CONSTANTS[country]
+
+
+def generate_trace_systems_comparison(new_system: System, old_system: System, utilization_chunks, time_horizon: int,
+                                      country: str, sample_interval_s=60):
+    """
+    generate_systems_comparison driven by the utilization trace of the old system instead of one static
+    utilization. The new system runs the same trace rescaled by the performance factor.
+    """
+    performance_factor = old_system.performance_indicator / new_system.performance_indicator
+    new_system_opex_per_year, old_system_opex_per_year = calculate_trace_opex_emissions(
+        SystemBatch.from_systems([new_system, old_system]), utilization_chunks, country,
+        sample_interval_s=sample_interval_s, performance_factor=[performance_factor, 1.0])
+
+    years = np.arange(1, time_horizon + 1)
+    new_system_opex = years * new_system_opex_per_year + new_system.calculate_capex_emissions()
+    old_system_opex = years * old_system_opex_per_year
+
+    abs_savings = new_system_opex - old_system_opex
+    relative_savings = 1 - (old_system_opex / new_system_opex)
+    ratio = new_system_opex / old_system_opex
+
+    return new_system_opex, old_system_opex, abs_savings, relative_savings, ratio
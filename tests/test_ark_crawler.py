@@ -0,0 +1,84 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from lifecycle_anslysis.ark_crawler import read_csv_rows, refresh, serve_saved_pages
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PRODUCTS = "https://ark.intel.com/content/www/us/en/ark/products/"
+SERIES_URL = PRODUCTS + "series/125191/intel-xeon-scalable-processors.html"
+GOLD_6130_URL = PRODUCTS + "120492/intel-xeon-gold-6130-processor-22m-cache-2-10-ghz.html"
+GOLD_5118_URL = PRODUCTS + "120473/intel-xeon-gold-5118-processor-16-5m-cache-2-30-ghz.html"
+
+
+@pytest.fixture
+def saved_ark(tmp_path):
+    # copies, the tests change pages and the CSV
+    pages_dir = tmp_path / "pages"
+    shutil.copytree(os.path.join(FIXTURES, "ark_pages"), pages_dir)
+    csv_path = tmp_path / "intel_cpus.csv"
+    shutil.copy(os.path.join(FIXTURES, "ark_intel_cpus.csv"), csv_path)
+    return pages_dir, str(csv_path), str(tmp_path / "cache")
+
+
+def run_refresh(pages_dir, csv_path, cache_dir, **kwargs):
+    async def main():
+        server = await serve_saved_pages(pages_dir, port=0)
+        host, port = server.sockets[0].getsockname()[:2]
+        try:
+            return await refresh(csv_path, cache_dir=cache_dir, concurrency=2, base_url=f"http://{host}:{port}",
+                                 **kwargs)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(main())
+
+
+def read_records(csv_path):
+    header, rows = read_csv_rows(csv_path)
+    return {row[header.index("URL")]: dict(zip(header, row)) for row in rows}
+
+
+def test_refresh_patches_known_and_appends_discovered_pages(saved_ark):
+    summary = run_refresh(*saved_ark, series_urls=[SERIES_URL])
+
+    assert (summary["patched"], summary["added"], summary["failed"]) == (1, 1, 0)
+    records = read_records(saved_ark[1])
+    assert list(records) == [GOLD_6130_URL, GOLD_5118_URL]
+    # the saved page corrects the TDP of the known row
+    assert records[GOLD_6130_URL]["TDP"] == "125"
+    assert records[GOLD_5118_URL] == {
+        "id": "5118", "name": "Xeon Gold 5118 Processor", "number": "number", "URL": GOLD_5118_URL,
+        "socket": "FCLGA3647", "Lithography": "14", "Total Cores": "12", "Processor Base Frequency": "2300000000",
+        "TDP": "105", "Launch Date": "2017-07-01", "Product Collection": "Xeon Scalable Processors"}
+
+
+def test_unchanged_pages_are_not_modified(saved_ark):
+    run_refresh(*saved_ark, series_urls=[SERIES_URL])
+    with open(saved_ark[1], "rb") as file:
+        before = file.read()
+
+    summary = run_refresh(*saved_ark, series_urls=[SERIES_URL])
+
+    # every page is answered with 304, nothing is parsed and the CSV is not rewritten
+    assert (summary["pages"], summary["changed"], summary["patched"], summary["added"]) == (2, 0, 0, 0)
+    with open(saved_ark[1], "rb") as file:
+        assert file.read() == before
+
+
+def test_changed_page_is_patched(saved_ark):
+    pages_dir, csv_path, _ = saved_ark
+    run_refresh(*saved_ark)
+    page_path = os.path.join(pages_dir, GOLD_6130_URL.split("ark.intel.com/")[1])
+    with open(page_path) as file:
+        page = file.read()
+    with open(page_path, "w") as file:
+        file.write(page.replace("125 W", "140 W"))
+
+    summary = run_refresh(*saved_ark)
+
+    assert (summary["changed"], summary["patched"], summary["added"]) == (1, 1, 0)
+    assert read_records(csv_path)[GOLD_6130_URL]["TDP"] == "140"
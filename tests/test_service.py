@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from lifecycle_anslysis.comparison import compute_systems_break_even
+from lifecycle_anslysis.service import ComparisonService, MAX_BATCH_SIZE, MAX_TIME_HORIZON, SYSTEM_FIELDS, request
+from lifecycle_anslysis.system import System
+
+NEW_SYSTEM = {"die_size": 6.6, "performance_indicator": 746.88, "lifetime": 20, "dram_capacity": 512,
+              "ssd_capacity": 3200, "cpu_tdp": 205}
+OLD_SYSTEM = {"die_size": 4.0, "performance_indicator": 300, "lifetime": 20, "dram_capacity": 256,
+              "ssd_capacity": 3200, "cpu_tdp": 180}
+COMPARISON = {"new_system": NEW_SYSTEM, "old_system": OLD_SYSTEM, "time_horizon": 10, "country": "germany",
+              "utilization": 40}
+
+
+@pytest.fixture(scope="module")
+def service_address():
+    # the service runs on its own event loop in a thread, every test talks to it through the local client
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(ComparisonService().start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield server.sockets[0].getsockname()[:2]
+
+    loop.call_soon_threadsafe(server.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def call(address, method, path, payload=None):
+    return asyncio.run(request(*address, method, path, payload))
+
+
+async def raw_request(host, port, data):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(data)
+        await writer.drain()
+        return int((await reader.readline()).split()[1])
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def test_compare(service_address):
+    status, response = call(service_address, "POST", "/compare", COMPARISON)
+
+    assert status == 200
+    assert len(response["new_system_opex"]) == COMPARISON["time_horizon"]
+    new_system = System(**{field: NEW_SYSTEM.get(field, 0) for field in SYSTEM_FIELDS})
+    old_system = System(**{field: OLD_SYSTEM.get(field, 0) for field in SYSTEM_FIELDS})
+    assert response["break_even"] == pytest.approx(
+        compute_systems_break_even(new_system, old_system, "germany", 40, "gupta_model"))
+
+
+def test_batch_answers_in_order_with_errors_in_place(service_address):
+    comparisons = [COMPARISON, {**COMPARISON, "utilization": 80}, {**COMPARISON, "country": "atlantis"}]
+    status, response = call(service_address, "POST", "/compare/batch", {"comparisons": comparisons})
+
+    assert status == 200
+    results = response["results"]
+    assert len(results) == 3
+    assert results[0] == call(service_address, "POST", "/compare", COMPARISON)[1]
+    assert results[1]["new_system_opex"] != results[0]["new_system_opex"]
+    assert "error" in results[2]
+
+
+def test_health_counts_cache_hits(service_address):
+    call(service_address, "POST", "/compare", COMPARISON)
+    call(service_address, "POST", "/compare", COMPARISON)
+    status, response = call(service_address, "GET", "/health")
+
+    assert status == 200
+    assert response["status"] == "ok"
+    assert response["cache_hits"] >= 1
+
+
+@pytest.mark.parametrize("comparison", [
+    {key: value for key, value in COMPARISON.items() if key != "country"},
+    {**COMPARISON, "time_horizon": 2.5},
+    {**COMPARISON, "time_horizon": 0},
+    {**COMPARISON, "time_horizon": MAX_TIME_HORIZON + 1},
+    {**COMPARISON, "utilization": 101},
+    {**COMPARISON, "new_system": {**NEW_SYSTEM, "performance_indicator": 0}},
+    {**COMPARISON, "old_system": {**OLD_SYSTEM, "cpu_tdp": -1}},
+    {**COMPARISON, "opex_calculation": "unknown"},
+])
+def test_invalid_comparison_is_a_bad_request(service_address, comparison):
+    status, response = call(service_address, "POST", "/compare", comparison)
+
+    assert status == 400
+    assert "error" in response
+
+
+def test_batch_size_is_limited(service_address):
+    status, _ = call(service_address, "POST", "/compare/batch", {"comparisons": [{}] * (MAX_BATCH_SIZE + 1)})
+    assert status == 400
+
+
+def test_wrong_method_and_path(service_address):
+    assert call(service_address, "GET", "/compare")[0] == 405
+    assert call(service_address, "GET", "/unknown")[0] == 404
+
+
+def test_malformed_http(service_address):
+    assert asyncio.run(raw_request(*service_address, b"POST /compare HTTP/1.1\r\nContent-Length: many\r\n\r\n")) \
+        == 400
+    assert asyncio.run(raw_request(*service_address, b"POST /compare HTTP/1.1\r\nContent-Length: 1\r\n\r\n{")) == 400
+
+
+def test_cached_results_are_not_shared():
+    service = ComparisonService()
+    service.compare(COMPARISON)["abs_savings"].clear()
+
+    assert len(service.compare(COMPARISON)["abs_savings"]) == COMPARISON["time_horizon"]